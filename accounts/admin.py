@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, PassengerProfile, CarrierProfile
+from .models import User, PassengerProfile, CarrierProfile, TelegramNotification
 
 class PassengerInline(admin.StackedInline):
     model = PassengerProfile
@@ -14,4 +14,12 @@ class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'is_passenger', 'is_carrier', 'is_staff')
     inlines = (PassengerInline, CarrierInline)
 
-admin.site.register(User, CustomUserAdmin)
\ No newline at end of file
+admin.site.register(User, CustomUserAdmin)
+
+
+@admin.register(TelegramNotification)
+class TelegramNotificationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'chat_id', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('chat_id', 'text')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
@@ -0,0 +1,31 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.telegram import TelegramDispatcher
+
+
+class Command(BaseCommand):
+    help = "Фоновий обробник черги Telegram-сповіщень (TelegramNotification)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Обробити чергу один раз і завершитись")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=2.0, help="Пауза між порціями, якщо черга порожня (сек)")
+        parser.add_argument('--api-url', help="Адреса Bot API (напр. локальний фейковий сервер для тестів)")
+
+    def handle(self, *args, **options):
+        try:
+            dispatcher = TelegramDispatcher(api_url=options['api_url'])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        while True:
+            sent = dispatcher.run_once(batch_size=options['batch_size'])
+            if sent:
+                self.stdout.write(f"Надіслано: {sent}")
+            if options['once']:
+                break
+            if not sent:
+                time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 14:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_carrierprofile_phone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=255, verbose_name='Чат')),
+                ('text', models.TextField(verbose_name='Текст')),
+                ('status', models.CharField(choices=[('pending', 'Очікує відправки'), ('sent', 'Надіслано'), ('failed', 'Помилка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Спроб')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Наступна спроба')),
+                ('last_error', models.TextField(blank=True, verbose_name='Остання помилка')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Надіслано о')),
+            ],
+            options={
+                'verbose_name': 'Telegram-сповіщення',
+                'verbose_name_plural': 'Telegram-сповіщення',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='accounts_tg_due_idx')],
+            },
+        ),
+    ]
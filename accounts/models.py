@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -43,3 +44,34 @@ class CarrierProfile(models.Model):
         """Перевірка, чи достатньо грошей на балансі"""
         return self.balance >= amount
 
+
+class TelegramNotification(models.Model):
+    """
+    Вихідна черга (outbox) Telegram-сповіщень. Запис створюється в тій самій транзакції,
+    що й бронювання, а доставляє його фоновий обробник (manage.py send_notifications).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Очікує відправки'),
+        ('sent', 'Надіслано'),
+        ('failed', 'Помилка'),
+    ]
+
+    chat_id = models.CharField(max_length=255, verbose_name="Чат")
+    text = models.TextField(verbose_name="Текст")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Спроб")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Наступна спроба")
+    last_error = models.TextField(blank=True, verbose_name="Остання помилка")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Надіслано о")
+
+    class Meta:
+        verbose_name = "Telegram-сповіщення"
+        verbose_name_plural = "Telegram-сповіщення"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='accounts_tg_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.chat_id}: {self.get_status_display()}"
@@ -0,0 +1,134 @@
+import logging
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .models import TelegramNotification
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramDispatcher:
+    """
+    Доставляє записи TelegramNotification через спільну HTTP-сесію (пул з'єднань).
+    Повторює невдалі спроби з експоненційною затримкою та дотримується лімітів Telegram:
+    не частіше одного повідомлення на секунду в чат і не більше ~30 повідомлень на секунду загалом.
+    """
+
+    def __init__(self, api_url=None, token=None, session=None, chat_interval=1.0, global_rate=30,
+                 max_attempts=8, base_delay=5, max_delay=3600, lease=60, timeout=10):
+        self.api_url = (api_url or settings.TELEGRAM_API_URL).rstrip('/')
+        self.token = token or settings.TELEGRAM_BOT_TOKEN
+        if not self.token:
+            raise ImproperlyConfigured("TELEGRAM_BOT_TOKEN не задано: вкажіть його у змінній оточення.")
+        self.chat_interval = chat_interval
+        self.global_interval = 1.0 / global_rate if global_rate else 0
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.timeout = timeout
+
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+        self._chat_sent_at = {}
+        self._last_sent_at = 0.0
+
+    def due(self, limit):
+        return list(
+            TelegramNotification.objects.filter(status='pending', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:limit]
+        )
+
+    def claim(self, notification):
+        """Бронює запис на час відправки, щоб паралельний обробник його не взяв."""
+        leased_until = timezone.now() + timedelta(seconds=self.lease)
+        claimed = TelegramNotification.objects.filter(
+            pk=notification.pk, status='pending', next_attempt_at=notification.next_attempt_at
+        ).update(next_attempt_at=leased_until)
+        notification.next_attempt_at = leased_until
+        return claimed == 1
+
+    def defer(self, notification, seconds, error='', count_attempt=False):
+        fields = {'next_attempt_at': timezone.now() + timedelta(seconds=seconds)}
+        if error:
+            fields['last_error'] = error[:1000]
+        if count_attempt:
+            notification.attempts += 1
+            fields['attempts'] = notification.attempts
+            if notification.attempts >= self.max_attempts:
+                fields['status'] = 'failed'
+        TelegramNotification.objects.filter(pk=notification.pk).update(**fields)
+
+    def backoff(self, attempts):
+        return min(self.base_delay * 2 ** attempts, self.max_delay)
+
+    def wait_global(self):
+        pause = self._last_sent_at + self.global_interval - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+    def send(self, notification):
+        """Одна спроба доставки. Повертає True, якщо повідомлення прийняте Telegram."""
+        chat_wait = self._chat_sent_at.get(notification.chat_id, 0) + self.chat_interval - time.monotonic()
+        if chat_wait > 0:
+            # Ліміт чату — переносимо без збільшення лічильника спроб
+            self.defer(notification, chat_wait)
+            return False
+
+        self.wait_global()
+        url = f"{self.api_url}/bot{self.token}/sendMessage"
+        payload = {"chat_id": notification.chat_id, "text": notification.text, "parse_mode": "HTML"}
+        try:
+            response = self.session.post(url, data=payload, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            logger.warning("Telegram error: %s", e)
+            self.defer(notification, self.backoff(notification.attempts), str(e), count_attempt=True)
+            return False
+        finally:
+            now = time.monotonic()
+            self._last_sent_at = now
+            self._chat_sent_at[notification.chat_id] = now
+
+        if response.status_code == 200:
+            TelegramNotification.objects.filter(pk=notification.pk).update(
+                status='sent', sent_at=timezone.now(), attempts=notification.attempts + 1, last_error=''
+            )
+            return True
+
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        error = f"HTTP {response.status_code}: {data.get('description', response.text[:200])}"
+
+        if response.status_code == 429:
+            # Telegram сам каже, скільки чекати
+            retry_after = (data.get('parameters') or {}).get('retry_after', self.base_delay)
+            self._chat_sent_at[notification.chat_id] = time.monotonic() + retry_after
+            self.defer(notification, retry_after, error)
+        elif 400 <= response.status_code < 500:
+            # Чат не знайдено, бота заблоковано тощо — повтор не допоможе
+            TelegramNotification.objects.filter(pk=notification.pk).update(
+                status='failed', attempts=notification.attempts + 1, last_error=error
+            )
+        else:
+            self.defer(notification, self.backoff(notification.attempts), error, count_attempt=True)
+        return False
+
+    def run_once(self, batch_size=100):
+        """Обробляє одну порцію черги. Повертає кількість доставлених повідомлень."""
+        sent = 0
+        for notification in self.due(batch_size):
+            if self.claim(notification) and self.send(notification):
+                sent += 1
+        return sent
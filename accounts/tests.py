@@ -1,3 +1,202 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import date, time, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from booking.models import Booking
+from city.models import City, Country
+from trips.models import Route, RouteStop
+from ukrbus.profiling import assert_query_budget
+
+from .models import CarrierProfile, PassengerProfile, TelegramNotification
+from .telegram import TelegramDispatcher
+
+User = get_user_model()
+
+
+class BotApiStub(BaseHTTPRequestHandler):
+    """Локальний Bot API: відповідає кодами з черги server.replies (за замовчуванням 200)."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        self.server.requests.append((self.path, parse_qs(body)))
+        status = self.server.replies.pop(0) if self.server.replies else 200
+        payload = {'ok': status == 200, 'description': 'stub'}
+        if status == 429:
+            payload['parameters'] = {'retry_after': 30}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='test-token')
+class TelegramDispatcherTests(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), BotApiStub)
+        self.server.requests, self.server.replies = [], []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.api_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def dispatcher(self, **kwargs):
+        return TelegramDispatcher(api_url=self.api_url, chat_interval=0, global_rate=0, timeout=5, **kwargs)
+
+    def make_due(self, notification):
+        TelegramNotification.objects.filter(pk=notification.pk).update(next_attempt_at=timezone.now())
+
+    def test_worker_sends_pending_notifications(self):
+        first = TelegramNotification.objects.create(chat_id='101', text="Перше")
+        second = TelegramNotification.objects.create(chat_id='102', text="Друге")
+
+        out = StringIO()
+        call_command('send_notifications', '--once', f'--api-url={self.api_url}', stdout=out)
+
+        self.assertIn("Надіслано: 2", out.getvalue())
+        for notification in (first, second):
+            notification.refresh_from_db()
+            self.assertEqual(notification.status, 'sent')
+            self.assertEqual(notification.attempts, 1)
+            self.assertIsNotNone(notification.sent_at)
+        path, payload = self.server.requests[0]
+        self.assertEqual(path, '/bottest-token/sendMessage')
+        self.assertEqual(payload['chat_id'], ['101'])
+
+    def test_server_error_is_retried_with_backoff(self):
+        notification = TelegramNotification.objects.create(chat_id='101', text="Текст")
+        self.server.replies = [502, 502]
+        dispatcher = self.dispatcher(base_delay=5)
+
+        started = timezone.now()
+        self.assertEqual(dispatcher.run_once(), 0)
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('pending', 1))
+        self.assertIn("HTTP 502", notification.last_error)
+        self.assertGreaterEqual(notification.next_attempt_at, started + timedelta(seconds=5))
+        # До настання next_attempt_at запис не береться повторно
+        self.assertEqual(dispatcher.run_once(), 0)
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.make_due(notification)
+        dispatcher.run_once()
+        notification.refresh_from_db()
+        self.assertEqual(notification.attempts, 2)
+        # Затримка подвоюється з кожною спробою
+        self.assertGreaterEqual(notification.next_attempt_at, started + timedelta(seconds=10))
+
+        self.make_due(notification)
+        self.assertEqual(dispatcher.run_once(), 1)
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('sent', 3))
+
+    def test_repeated_failures_end_as_failed(self):
+        notification = TelegramNotification.objects.create(chat_id='101', text="Текст")
+        self.server.replies = [500, 500, 500]
+        dispatcher = self.dispatcher(max_attempts=3)
+
+        for _ in range(3):
+            self.make_due(notification)
+            dispatcher.run_once()
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('failed', 3))
+
+        # Невдалий запис більше не відправляється
+        self.make_due(notification)
+        dispatcher.run_once()
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_rate_limit_defers_without_counting_attempt(self):
+        notification = TelegramNotification.objects.create(chat_id='101', text="Текст")
+        self.server.replies = [429]
+
+        started = timezone.now()
+        self.dispatcher().run_once()
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('pending', 0))
+        self.assertGreaterEqual(notification.next_attempt_at, started + timedelta(seconds=30))
+
+    def test_client_error_fails_without_retry(self):
+        notification = TelegramNotification.objects.create(chat_id='101', text="Текст")
+        self.server.replies = [403]
+
+        self.dispatcher().run_once()
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('failed', 1))
+
+    def test_unreachable_api_is_retried(self):
+        notification = TelegramNotification.objects.create(chat_id='101', text="Текст")
+        dispatcher = TelegramDispatcher(api_url='http://127.0.0.1:9', chat_interval=0, global_rate=0, timeout=1)
+
+        with self.assertLogs('accounts.telegram', 'WARNING'):
+            dispatcher.run_once()
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('pending', 1))
+        self.assertTrue(notification.last_error)
+
+
+@override_settings(TELEGRAM_BOT_TOKEN=None)
+class TelegramTokenTests(TestCase):
+    def test_dispatcher_requires_token(self):
+        with self.assertRaises(ImproperlyConfigured):
+            TelegramDispatcher()
+
+    def test_worker_refuses_to_start_without_token(self):
+        notification = TelegramNotification.objects.create(chat_id='101', text="Текст")
+        with self.assertRaises(CommandError):
+            call_command('send_notifications', '--once')
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'pending')
+
+
+class QueryBudgetTests(TestCase):
+    """Бюджети SQL-запитів (settings.QUERY_BUDGETS) кабінету і статистики — незалежно від кількості рядків."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Україна", code="UA")
+        cities = [City.objects.create(name=name, country=country) for name in ("Київ", "Рівне", "Львів")]
+        cls.carrier = User.objects.create_user('carrier', is_carrier=True)
+        CarrierProfile.objects.create(user=cls.carrier, company_name="Автолюкс", contact_person="Іван", phone='-')
+        cls.passenger = User.objects.create_user('passenger', is_passenger=True)
+        PassengerProfile.objects.create(user=cls.passenger, phone='+380501234567')
+
+        trip_date = date.today() + timedelta(days=3)
+        for number in range(5):
+            route = Route.objects.create(carrier=cls.carrier, title=f"Маршрут {number}")
+            for order, city in enumerate(cities, start=1):
+                RouteStop.objects.create(route=route, city=city, order=order, day_of_week=trip_date.isoweekday(),
+                                         departure_time=time(8 + order))
+            for status in ('pending', 'confirmed', 'cancelled'):
+                Booking.objects.create(passenger=cls.passenger, route=route, trip_date=trip_date, status=status,
+                                       departure_point="Київ", arrival_point="Львів", total_price=100)
+
+    def test_carrier_pages(self):
+        self.client.force_login(self.carrier)
+        for name in ('profile', 'statistics'):
+            response = assert_query_budget(self.client, reverse(name))
+            self.assertEqual(response.status_code, 200)
+        response = assert_query_budget(self.client, reverse('statistics') + '?start_date=2000-01-01')
+        self.assertEqual(len(response.context['routes_list']), 5)
+
+    def test_passenger_pages(self):
+        self.client.force_login(self.passenger)
+        for name in ('profile', 'statistics'):
+            response = assert_query_budget(self.client, reverse(name))
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['trips_count'], 15)
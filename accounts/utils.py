@@ -1,23 +1,28 @@
-import requests
+import logging
 
+from django.conf import settings
+from django.db import transaction
+
+from .models import TelegramNotification
+
+logger = logging.getLogger(__name__)
 
-def send_carrier_notification(carrier_profile, message):
-    token = "8163825460:AAFk8wyYGtARQcsM57UCCdHwb4knYAd7WJA"
 
+def send_carrier_notification(carrier_profile, message):
+    """
+    Ставить сповіщення перевізнику в чергу (TelegramNotification).
+    Нічого не відправляє в мережу — доставку виконує фоновий обробник,
+    тому запит пасажира не чекає на api.telegram.org.
+    """
     # Беремо ID з поля telegram_bot, як ви і задумували
     chat_id = carrier_profile.telegram_bot
-    print('==============================',chat_id)
     if not chat_id:
-        print(f"ID не вказано для {carrier_profile.company_name}")
-        return
+        logger.info("Telegram ID не вказано для %s", carrier_profile.company_name)
+        return None
+
+    if not settings.TELEGRAM_BOT_TOKEN:
+        logger.warning("TELEGRAM_BOT_TOKEN не задано: сповіщення для %s чекатиме в черзі", carrier_profile.company_name)
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": message,
-        "parse_mode": "HTML"
-    }
-    try:
-        requests.post(url, data=payload, timeout=5)
-    except Exception as e:
-        print(f"Telegram error: {e}")
\ No newline at end of file
+    # Точка збереження: помилка черги не зламає зовнішню транзакцію бронювання
+    with transaction.atomic():
+        return TelegramNotification.objects.create(chat_id=chat_id, text=message)
@@ -2,11 +2,12 @@ from django.shortcuts import render, redirect
 from django.views.generic import CreateView
 from django.contrib.auth import login, get_user_model
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, Q, F, OuterRef, Subquery
+from django.db.models import Sum, Count
 
 from .forms import PassengerRegistrationForm, CarrierRegistrationForm
 from trips.models import Route
-from booking.models import Booking
+from trips.services import prepare_route_cards, route_card_stops
+from booking.models import Booking, BookingDailyRollup
 
 User = get_user_model()
 
@@ -39,7 +40,8 @@ class CarrierSignUpView(CreateView):
 def ProfileView(request):
     # Перевіряємо, чи є користувач перевізником
     if request.user.is_carrier:
-        routes = Route.objects.filter(carrier=request.user)
+        # Кількість зупинок — одним запитом разом з маршрутами, а не COUNT на кожен рядок таблиці
+        routes = Route.objects.filter(carrier=request.user).annotate(stops_count=Count('stops'))
         incoming_bookings = Booking.objects.filter(route__carrier=request.user).order_by('-trip_date')
         return render(request, 'accounts/profile_carrier.html', {
             'routes': routes,
@@ -68,41 +70,37 @@ def statistics_view(request):
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
 
-        # Базовий фільтр для замовлень цього перевізника
-        booking_filter = Q(route__carrier=user)
+        # Рахуємо з денних підсумків (booking.BookingDailyRollup), а не з усієї таблиці Booking
+        rollups = BookingDailyRollup.objects.filter(carrier=user)
 
         if start_date:
-            booking_filter &= Q(trip_date__gte=start_date)
+            rollups = rollups.filter(trip_date__gte=start_date)
         if end_date:
-            booking_filter &= Q(trip_date__lte=end_date)
+            rollups = rollups.filter(trip_date__lte=end_date)
 
         # 2. Розрахунок загальних показників по всіх маршрутах
-        stats = Booking.objects.filter(booking_filter).aggregate(
-            rev=Sum('total_price'),
-            pax=Sum('seats_count')
+        stats = rollups.aggregate(
+            rev=Sum('revenue'),
+            pax=Sum('seats')
         )
 
         total_revenue = stats['rev'] or 0
         total_pax = stats['pax'] or 0
 
-        # 3. Аналітика по кожному маршруту окремо
-        # Використовуємо Subquery для отримання суми грошей та місць для кожного маршруту
-        routes_list = Route.objects.filter(carrier=user).annotate(
-            # Сума грошей по маршруту
-            route_revenue=Subquery(
-                Booking.objects.filter(booking_filter, route=OuterRef('pk'))
-                .values('route')
-                .annotate(total_money=Sum('total_price'))
-                .values('total_money')
-            ),
-            # Сума місць по маршруту
-            route_pax=Subquery(
-                Booking.objects.filter(booking_filter, route=OuterRef('pk'))
-                .values('route')
-                .annotate(total_seats=Sum('seats_count'))
-                .values('total_seats')
-            )
-        ).order_by('-route_revenue') # Сортуємо: спочатку найприбутковіші
+        # 3. Аналітика по кожному маршруту окремо (один GROUP BY по підсумках)
+        per_route = {
+            row['route']: row
+            for row in rollups.values('route').annotate(revenue_sum=Sum('revenue'), seats_sum=Sum('seats'))
+        }
+        routes_list = prepare_route_cards(list(
+            Route.objects.filter(carrier=user).select_related('carrier__carrier_profile').prefetch_related(route_card_stops())
+        ))
+        for route in routes_list:
+            row = per_route.get(route.pk, {})
+            route.route_revenue = row.get('revenue_sum')
+            route.route_pax = row.get('seats_sum')
+        # Сортуємо: спочатку найприбутковіші
+        routes_list.sort(key=lambda route: route.route_revenue or 0, reverse=True)
 
         context = {
             'total_revenue': total_revenue,
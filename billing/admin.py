@@ -1,7 +1,7 @@
 from django.contrib import admin
-from django.db.models import Sum
 from django.utils.html import format_html
-from .models import Transaction, TopPlan
+from .models import BalanceSnapshot, Transaction, TopPlan
+from .services import LedgerService
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
@@ -19,12 +19,12 @@ class TransactionAdmin(admin.ModelAdmin):
 
     # --- ОБМЕЖЕННЯ ПРАВ (БЕЗПЕКА) ---
     def has_delete_permission(self, request, obj=None):
-        """Забороняє видалення транзакцій усім, крім суперкористувачів"""
-        return request.user.is_superuser
+        """Видалення заборонене всім: під знімками балансу (BalanceSnapshot) журнал розійшовся б із балансом"""
+        return False
 
     def has_change_permission(self, request, obj=None):
-        """Забороняє редагування транзакцій (фінансова цілісність)"""
-        return request.user.is_superuser
+        """Журнал лише доповнюється: виправлення — новою транзакцією (фінансова цілісність)"""
+        return False
 
     # --- ВІДОБРАЖЕННЯ ПОЛІВ ---
     def timestamp_display(self, obj):
@@ -51,13 +51,27 @@ class TransactionAdmin(admin.ModelAdmin):
     type_badge.short_description = "Тип"
 
     # Додаємо підсумок (Total) внизу списку
+    # Підсумок береться з останнього знімка + транзакцій після нього (manage.py snapshot_balances)
     def changelist_view(self, request, extra_context=None):
-        result = Transaction.objects.aggregate(total=Sum('amount'))
         extra_context = extra_context or {}
-        extra_context['total_balance'] = result['total'] or 0
+        extra_context['total_balance'] = LedgerService.balance()
         return super().changelist_view(request, extra_context=extra_context)
 
 
+@admin.register(BalanceSnapshot)
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'user', 'balance', 'last_transaction_id')
+    list_filter = ('created_at',)
+    search_fields = ('user__username',)
+    list_select_related = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(TopPlan)
 class TopPlanAdmin(admin.ModelAdmin):
     # Поля у таблиці
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.services import LedgerService
+
+
+class Command(BaseCommand):
+    help = "Звіряє CarrierProfile.balance з журналом транзакцій і виводить розбіжності"
+
+    def handle(self, *args, **options):
+        drift = LedgerService.reconcile()
+        for profile, ledger in drift:
+            self.stdout.write(
+                f"{profile.user.username} ({profile.company_name}): баланс {profile.balance}, "
+                f"за журналом {ledger}, різниця {profile.balance - ledger}"
+            )
+
+        if drift:
+            # Ненульовий код виходу — щоб cron/моніторинг помітив розбіжність
+            raise CommandError(f"Розбіжностей: {len(drift)}")
+        self.stdout.write(self.style.SUCCESS("Баланси збігаються з журналом."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from billing.services import LedgerService
+
+
+class Command(BaseCommand):
+    help = (
+        "Створює знімки балансів за журналом транзакцій (BalanceSnapshot). "
+        "Запускати періодично (cron), щоб баланси та підсумки рахувались від знімка, а не по всій таблиці."
+    )
+
+    def handle(self, *args, **options):
+        created = LedgerService.take_snapshot()
+        if created:
+            self.stdout.write(self.style.SUCCESS(f"Створено знімків: {created}"))
+        else:
+            self.stdout.write("Нових транзакцій немає — знімок не потрібен.")
@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 14:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_topplan'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_transaction_id', models.PositiveBigIntegerField(verbose_name='Остання врахована транзакція')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Баланс за журналом')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Знімок балансу',
+                'verbose_name_plural': 'Знімки балансу',
+                'ordering': ['-last_transaction_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'id'], name='billing_tx_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'created_at'], name='billing_tx_user_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['user', 'created_at'], name='billing_snapshot_user_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='balancesnapshot',
+            unique_together={('user', 'last_transaction_id')},
+        ),
+    ]
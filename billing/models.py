@@ -21,9 +21,55 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Дельта від знімка та виписки: транзакції користувача після певного id / в межах місяця
+            models.Index(fields=['user', 'id'], name='billing_tx_user_id_idx'),
+            models.Index(fields=['user', 'created_at'], name='billing_tx_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}: {self.amount} ({self.tx_type})"
+
+    def save(self, *args, **kwargs):
+        # Журнал лише доповнюється: виправлення робляться новою транзакцією (refund/deposit)
+        if self.pk and not self._state.adding:
+            raise ValueError("Транзакції не можна змінювати — створіть коригувальну транзакцію.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # Знімки балансу вже містять цю транзакцію — після видалення баланс і журнал розійдуться
+        raise ValueError("Транзакції не можна видаляти — створіть коригувальну транзакцію.")
+
+
+class BalanceSnapshot(models.Model):
+    """
+    Знімок балансу за журналом транзакцій: сума всіх Transaction з id <= last_transaction_id.
+    user = NULL — загальна сума по всіх користувачах (підсумок в адмінці).
+    Баланс на будь-який момент = останній знімок до нього + невелика дельта.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='balance_snapshots'
+    )
+    last_transaction_id = models.PositiveBigIntegerField(verbose_name="Остання врахована транзакція")
+    balance = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Баланс за журналом")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Знімок балансу"
+        verbose_name_plural = "Знімки балансу"
+        ordering = ['-last_transaction_id']
+        unique_together = ('user', 'last_transaction_id')
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='billing_snapshot_user_idx'),
+        ]
+
+    def __str__(self):
+        owner = self.user.username if self.user_id else "Усі"
+        return f"{owner}: {self.balance} (до #{self.last_transaction_id})"
 class TopPlan(models.Model):
     days = models.PositiveIntegerField(unique=True, verbose_name="Кількість днів")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Ціна (грн)")
@@ -1,5 +1,16 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
 from django.db import transaction
-from .models import Transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from accounts.models import CarrierProfile
+from .models import BalanceSnapshot, Transaction
+
+# Транзакції, молодші за цей інтервал, у знімок не потрапляють: транзакція з меншим id
+# може ще не бути зафіксованою, і знімок назавжди її пропустив би
+SNAPSHOT_LAG = timedelta(minutes=1)
 
 
 class BillingService:
@@ -8,13 +19,26 @@ class BillingService:
     def process_payment(user, amount, description, tx_type='withdrawal'):
         """
         Універсальна функція для списання або нарахування коштів.
+        Баланс змінюється одним умовним UPDATE (balance >= amount для списання):
+        паралельні списання не можуть піти в мінус, а рішення приймає кількість
+        змінених рядків, а не значення, прочитане раніше в Python.
         """
-        profile = user.carrier_profile
+        amount = Decimal(str(amount))
+        profiles = CarrierProfile.objects.filter(user=user)
+
+        if tx_type == 'withdrawal':
+            updated = profiles.filter(balance__gte=amount).update(balance=F('balance') - amount)
+        else:
+            updated = profiles.update(balance=F('balance') + amount)
 
-        if tx_type == 'withdrawal' and profile.balance < amount:
+        if not updated:
+            # Рядок не змінено: або профілю немає, або (для списання) не вистачає коштів.
+            # Зайвий запит лише на шляху відмови — успішна оплата так і лишається одним UPDATE
+            if not profiles.exists():
+                return False, "Профіль перевізника не знайдено"
             return False, "Недостатньо коштів"
 
-        # 1. Створюємо транзакцію
+        # Транзакція створюється лише після успішної зміни балансу (в тій самій БД-транзакції)
         Transaction.objects.create(
             user=user,
             amount=-amount if tx_type == 'withdrawal' else amount,
@@ -22,11 +46,121 @@ class BillingService:
             description=description
         )
 
-        # 2. Оновлюємо баланс у профілі
-        if tx_type == 'withdrawal':
-            profile.balance -= amount
-        else:
-            profile.balance += amount
+        # Оновлюємо вже завантажений профіль, щоб шаблони показали актуальний баланс
+        if type(user).carrier_profile.is_cached(user):
+            user.carrier_profile.refresh_from_db(fields=['balance'])
+        return True, "Успішно"
+
+
+class LedgerService:
+    """
+    Баланс за журналом транзакцій: останній BalanceSnapshot + сума транзакцій після нього.
+    Повний Sum() по таблиці Transaction потрібен лише для першого знімка.
+    """
+
+    @staticmethod
+    def _snapshots(user=None):
+        if user is None:
+            return BalanceSnapshot.objects.filter(user__isnull=True)
+        return BalanceSnapshot.objects.filter(user=user)
+
+    @classmethod
+    def balance(cls, user=None, before=None):
+        """Баланс користувача (або загальний, якщо user=None) за журналом; before — момент часу."""
+        snapshots = cls._snapshots(user)
+        if before is not None:
+            snapshots = snapshots.filter(created_at__lte=before)
+        snapshot = snapshots.order_by('-last_transaction_id').first()
+
+        base, watermark = (snapshot.balance, snapshot.last_transaction_id) if snapshot else (Decimal('0'), 0)
+        delta = Transaction.objects.filter(id__gt=watermark)
+        if user is not None:
+            delta = delta.filter(user=user)
+        if before is not None:
+            delta = delta.filter(created_at__lt=before)
+        return base + (delta.aggregate(total=Sum('amount'))['total'] or 0)
+
+    @classmethod
+    def statement(cls, user, year, month):
+        """Місячна виписка: вхідний залишок, транзакції місяця, вихідний залишок."""
+        tz = timezone.get_current_timezone()
+        start = timezone.make_aware(datetime(year, month, 1), tz)
+        next_month = date(year + month // 12, month % 12 + 1, 1)
+        end = timezone.make_aware(datetime(next_month.year, next_month.month, 1), tz)
+
+        opening = cls.balance(user, before=start)
+        transactions = list(
+            Transaction.objects.filter(user=user, created_at__gte=start, created_at__lt=end).order_by('created_at', 'id')
+        )
+        return {
+            'opening': opening,
+            'transactions': transactions,
+            'closing': opening + sum((tx.amount for tx in transactions), Decimal('0')),
+        }
+
+    @staticmethod
+    @transaction.atomic
+    def take_snapshot():
+        """
+        Знімок для всіх користувачів з новими транзакціями та загальний підсумок.
+        Рахує лише дельту від попереднього знімка. Повертає кількість створених записів.
+        """
+        watermark = Transaction.objects.filter(
+            created_at__lte=timezone.now() - SNAPSHOT_LAG
+        ).aggregate(last=Max('id'))['last']
+        previous = BalanceSnapshot.objects.filter(user__isnull=True).order_by('-last_transaction_id').first()
+        previous_watermark = previous.last_transaction_id if previous else 0
+        if not watermark or watermark <= previous_watermark:
+            return 0
+
+        deltas = dict(
+            Transaction.objects.filter(id__gt=previous_watermark, id__lte=watermark)
+            .values('user').annotate(total=Sum('amount')).values_list('user', 'total')
+        )
+        # Попередні знімки тих самих користувачів — база для нових
+        bases = {}
+        for user_id, balance in (
+            BalanceSnapshot.objects.filter(user__in=deltas)
+            .order_by('user', '-last_transaction_id').values_list('user', 'balance')
+        ):
+            bases.setdefault(user_id, balance)
+
+        snapshots = [
+            BalanceSnapshot(user_id=user_id, last_transaction_id=watermark, balance=bases.get(user_id, 0) + total)
+            for user_id, total in deltas.items()
+        ]
+        snapshots.append(BalanceSnapshot(
+            user=None, last_transaction_id=watermark,
+            balance=(previous.balance if previous else 0) + sum(deltas.values(), Decimal('0')),
+        ))
+        BalanceSnapshot.objects.bulk_create(snapshots)
+        return len(snapshots)
+
+    @staticmethod
+    def reconcile():
+        """
+        Розбіжності між CarrierProfile.balance та журналом: [(profile, ledger_balance)].
+        """
+        ledger = {}
+        for user_id, balance in (
+            BalanceSnapshot.objects.filter(user__isnull=False)
+            .order_by('user', '-last_transaction_id').values_list('user', 'balance')
+        ):
+            ledger.setdefault(user_id, balance)
+
+        # Кожен знімок охоплює всі транзакції користувача до загального водяного знака
+        # останнього запуску, тож дельта для всіх — одна агрегація після нього
+        latest = BalanceSnapshot.objects.filter(user__isnull=True).order_by('-last_transaction_id').first()
+        watermark = latest.last_transaction_id if latest else 0
+        for user_id, total in (
+            Transaction.objects.filter(id__gt=watermark)
+            .values('user').annotate(total=Sum('amount')).values_list('user', 'total')
+        ):
+            ledger[user_id] = ledger.get(user_id, 0) + total
 
-        profile.save()
-        return True, "Успішно"
\ No newline at end of file
+        drift = []
+        for profile in CarrierProfile.objects.select_related('user').iterator():
+            expected = ledger.get(profile.user_id, Decimal('0'))
+            if profile.balance != expected:
+                drift.append((profile, expected))
+        return drift
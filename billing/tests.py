@@ -1,3 +1,194 @@
-from django.test import TestCase
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, close_old_connections
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from accounts.models import CarrierProfile
+
+from .models import BalanceSnapshot, Transaction
+from .services import SNAPSHOT_LAG, BillingService, LedgerService
+
+User = get_user_model()
+
+
+def create_carrier(username, balance=Decimal('0')):
+    user = User.objects.create_user(username, is_carrier=True)
+    CarrierProfile.objects.create(user=user, company_name=username, contact_person=username, phone='-',
+                                  balance=balance)
+    return user
+
+
+def ledger_total(user):
+    return Transaction.objects.filter(user=user).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+
+
+class ProcessPaymentTests(TestCase):
+    def setUp(self):
+        self.user = create_carrier('carrier')
+
+    def balance(self):
+        return CarrierProfile.objects.get(user=self.user).balance
+
+    def test_deposit_and_withdrawal_follow_ledger(self):
+        self.assertEqual(BillingService.process_payment(self.user, '100.00', "Поповнення", tx_type='deposit'),
+                         (True, "Успішно"))
+        self.assertEqual(BillingService.process_payment(self.user, 30, "ТОП"), (True, "Успішно"))
+
+        self.assertEqual(self.balance(), Decimal('70.00'))
+        self.assertEqual(ledger_total(self.user), Decimal('70.00'))
+        self.assertEqual(list(Transaction.objects.filter(user=self.user).order_by('id')
+                              .values_list('tx_type', 'amount')),
+                         [('deposit', Decimal('100.00')), ('withdrawal', Decimal('-30.00'))])
+
+    def test_withdrawal_over_balance_changes_nothing(self):
+        BillingService.process_payment(self.user, 20, "Поповнення", tx_type='deposit')
+        self.assertEqual(BillingService.process_payment(self.user, '20.01', "ТОП"), (False, "Недостатньо коштів"))
+        self.assertEqual(self.balance(), Decimal('20.00'))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+    def test_loaded_profile_shows_new_balance(self):
+        self.user.carrier_profile  # профіль уже в пам'яті, як у шаблоні кабінету
+        BillingService.process_payment(self.user, 15, "Поповнення", tx_type='deposit')
+        self.assertEqual(self.user.carrier_profile.balance, Decimal('15.00'))
+
+    def test_user_without_profile(self):
+        passenger = User.objects.create_user('passenger', is_passenger=True)
+        for tx_type in ('deposit', 'withdrawal'):
+            self.assertEqual(BillingService.process_payment(passenger, 10, "Оплата", tx_type=tx_type),
+                             (False, "Профіль перевізника не знайдено"))
+        self.assertFalse(Transaction.objects.filter(user=passenger).exists())
+
+    def test_ledger_is_append_only(self):
+        BillingService.process_payment(self.user, 10, "Поповнення", tx_type='deposit')
+        tx = Transaction.objects.get(user=self.user)
+        tx.amount = Decimal('1000.00')
+        with self.assertRaises(ValueError):
+            tx.save()
+        with self.assertRaises(ValueError):
+            tx.delete()
+        self.assertEqual(ledger_total(self.user), Decimal('10.00'))
+
+        superuser = User.objects.create_user('root', is_staff=True, is_superuser=True)
+        request = RequestFactory().get('/')
+        request.user = superuser
+        model_admin = admin.site._registry[Transaction]
+        self.assertFalse(model_admin.has_delete_permission(request, tx))
+        self.assertFalse(model_admin.has_change_permission(request, tx))
+
+
+class LedgerServiceTests(TestCase):
+    def setUp(self):
+        self.first = create_carrier('first')
+        self.second = create_carrier('second')
+
+    def pay(self, user, amount, tx_type='deposit', at=None):
+        BillingService.process_payment(user, amount, "Оплата", tx_type=tx_type)
+        tx = Transaction.objects.filter(user=user).latest('id')
+        if at is not None:
+            # Журнал не змінюється через save() — час створення виставляємо напряму
+            Transaction.objects.filter(pk=tx.pk).update(created_at=at)
+        return tx
+
+    def test_balance_without_snapshots_sums_ledger(self):
+        self.pay(self.first, 100)
+        self.pay(self.first, 40, tx_type='withdrawal')
+        self.pay(self.second, 7)
+        self.assertEqual(LedgerService.balance(self.first), Decimal('60.00'))
+        self.assertEqual(LedgerService.balance(), Decimal('67.00'))
+
+    def test_snapshot_skips_recent_transactions(self):
+        old = timezone.now() - SNAPSHOT_LAG * 2
+        self.pay(self.first, 100, at=old)
+        self.pay(self.second, 50, at=old)
+        self.pay(self.first, 10)
+
+        self.assertEqual(LedgerService.take_snapshot(), 3)
+        self.assertEqual(
+            dict(BalanceSnapshot.objects.values_list('user', 'balance')),
+            {self.first.pk: Decimal('100.00'), self.second.pk: Decimal('50.00'), None: Decimal('150.00')},
+        )
+        # Свіжа транзакція врахована дельтою після знімка
+        self.assertEqual(LedgerService.balance(self.first), Decimal('110.00'))
+        self.assertEqual(LedgerService.take_snapshot(), 0)
+
+    def test_snapshot_builds_on_previous_one(self):
+        old = timezone.now() - SNAPSHOT_LAG * 2
+        self.pay(self.first, 100, at=old)
+        self.pay(self.second, 50, at=old)
+        LedgerService.take_snapshot()
+
+        self.pay(self.first, 30, tx_type='withdrawal', at=old)
+        self.assertEqual(LedgerService.take_snapshot(), 2)
+        latest = BalanceSnapshot.objects.filter(user=self.first).first()
+        self.assertEqual(latest.balance, Decimal('70.00'))
+        self.assertEqual(BalanceSnapshot.objects.filter(user__isnull=True).first().balance, Decimal('120.00'))
+        self.assertEqual(LedgerService.balance(self.second), Decimal('50.00'))
+
+    def test_monthly_statement(self):
+        tz = timezone.get_current_timezone()
+        self.pay(self.first, 100, at=timezone.make_aware(datetime(2025, 1, 20), tz))
+        self.pay(self.first, 30, tx_type='withdrawal', at=timezone.make_aware(datetime(2025, 2, 3), tz))
+        self.pay(self.first, 5, at=timezone.make_aware(datetime(2025, 2, 28, 23, 59), tz))
+        self.pay(self.first, 1, at=timezone.make_aware(datetime(2025, 3, 1), tz))
+
+        statement = LedgerService.statement(self.first, 2025, 2)
+        self.assertEqual(statement['opening'], Decimal('100.00'))
+        self.assertEqual([tx.amount for tx in statement['transactions']], [Decimal('-30.00'), Decimal('5.00')])
+        self.assertEqual(statement['closing'], Decimal('75.00'))
+        self.assertEqual(LedgerService.statement(self.first, 2025, 12)['opening'], Decimal('76.00'))
+
+    def test_reconcile_reports_drift(self):
+        old = timezone.now() - SNAPSHOT_LAG * 2
+        self.pay(self.first, 100, at=old)
+        self.pay(self.second, 20, at=old)
+        LedgerService.take_snapshot()
+        self.pay(self.first, 15)
+        self.assertEqual(LedgerService.reconcile(), [])
+
+        CarrierProfile.objects.filter(user=self.second).update(balance=Decimal('25.00'))
+        drift = LedgerService.reconcile()
+        self.assertEqual([(profile.user_id, expected) for profile, expected in drift],
+                         [(self.second.pk, Decimal('20.00'))])
+
+
+class ConcurrentWithdrawalTests(TransactionTestCase):
+    """Сотні паралельних списань з одного балансу: без перевитрати, баланс дорівнює журналу."""
+
+    threads = 16
+    withdrawals = 300
+    amount = Decimal('50.00')
+    deposit = Decimal('5000.00')
+
+    def test_parallel_withdrawals_never_overdraw(self):
+        user = create_carrier('stress')
+        BillingService.process_payment(user, self.deposit, "Стартовий баланс", tx_type='deposit')
+
+        def withdraw(index):
+            try:
+                while True:
+                    try:
+                        return BillingService.process_payment(user, self.amount, f"Списання #{index}")[0]
+                    except OperationalError:
+                        # SQLite блокує базу на запис (для PostgreSQL такого не буває) — повторюємо
+                        time.sleep(0.001)
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            results = list(executor.map(withdraw, range(self.withdrawals)))
+
+        affordable = int(self.deposit / self.amount)
+        self.assertEqual(results.count(True), affordable)
+        self.assertEqual(results.count(False), self.withdrawals - affordable)
+
+        balance = CarrierProfile.objects.get(user=user).balance
+        self.assertEqual(balance, Decimal('0.00'))
+        self.assertEqual(balance, ledger_total(user))
+        self.assertEqual(Transaction.objects.filter(user=user, tx_type='withdrawal').count(), affordable)
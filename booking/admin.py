@@ -1,6 +1,6 @@
 # booking/admin.py
 from django.contrib import admin
-from .models import Booking
+from .models import Booking, SeatInventory
 
 
 @admin.register(Booking)
@@ -14,4 +14,11 @@ class BookingAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
-        return qs.filter(route__carrier=request.user)
\ No newline at end of file
+        return qs.filter(route__carrier=request.user)
+
+@admin.register(SeatInventory)
+class SeatInventoryAdmin(admin.ModelAdmin):
+    list_display = ('route', 'trip_date', 'segment', 'reserved', 'capacity')
+    list_filter = ('trip_date',)
+    search_fields = ('route__title',)
+    list_select_related = ('route',)
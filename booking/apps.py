@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class BookingConfig(AppConfig):
     name = 'booking'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .pdf import register_fonts
+
+        # Шрифт для PDF-відомостей реєструється один раз на процес, а не на кожен запит
+        register_fonts()
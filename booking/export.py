@@ -0,0 +1,108 @@
+import csv
+import io
+import zipfile
+from itertools import groupby
+from tempfile import SpooledTemporaryFile
+
+from .pdf import SPOOL_MAX_SIZE, build_manifest_pdf
+from .services import ManifestService
+
+# Після скількох рядків CSV віддавати накопичені байти клієнту
+CSV_FLUSH_ROWS = 500
+# Розмір блоку, яким PDF копіюється в архів
+COPY_CHUNK_SIZE = 64 * 1024
+# Розмір пакета для серверного курсора (QuerySet.iterator)
+ITERATOR_CHUNK_SIZE = 2000
+
+CSV_HEADER = [
+    'Дата', 'Маршрут', 'Назва маршруту', '№ замовлення', 'Пасажир', 'Телефон',
+    'Місця', 'Посадка', 'Висадка', 'Статус', 'Сума',
+]
+
+
+class _ZipSink:
+    """
+    Приймач для ZipFile без seek(): zipfile пише локальні заголовки з data descriptor,
+    а записані байти ми забираємо частинами (drain) і віддаємо у відповідь.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _drain(sink):
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def _csv_row(row):
+    return [
+        row['trip_date'].isoformat(), row['route_id'], row['route_title'], row['id'],
+        row['passenger'], row['phone'], row['seats_count'], row['departure_point'], row['arrival_point'],
+        row['status_display'], row['total_price'],
+    ]
+
+
+def manifest_zip_chunks(carrier, date_from, date_to, route_id=None, formats=('csv', 'pdf')):
+    """
+    ZIP з відомостями за діапазон дат: manifest_YYYY-MM-DD.csv / .pdf на кожен день з бронюваннями.
+    Рядки бронювань читаються одним серверним ітератором по всьому діапазону; у пам'яті
+    одночасно лише бронювання одного дня (для PDF) і ще не відданий шматок архіву.
+    """
+    sink = _ZipSink()
+    rows = ManifestService.rows(ManifestService.route_ids(carrier, route_id), date_from, date_to,
+                                chunk_size=ITERATOR_CHUNK_SIZE)
+
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for trip_date, day in groupby(rows, key=lambda row: row['trip_date']):
+            day_bookings = [] if 'pdf' in formats else None
+
+            if 'csv' in formats:
+                with archive.open(f"manifest_{trip_date:%Y-%m-%d}.csv", 'w', force_zip64=True) as entry:
+                    # utf-8-sig — щоб Excel коректно відкривав кирилицю
+                    text = io.TextIOWrapper(entry, encoding='utf-8-sig', newline='')
+                    writer = csv.writer(text)
+                    writer.writerow(CSV_HEADER)
+                    for number, booking in enumerate(day, start=1):
+                        writer.writerow(_csv_row(booking))
+                        if day_bookings is not None:
+                            day_bookings.append(booking)
+                        if number % CSV_FLUSH_ROWS == 0:
+                            text.flush()
+                            yield from _drain(sink)
+                    text.flush()
+                    text.detach()
+                yield from _drain(sink)
+            elif day_bookings is not None:
+                day_bookings.extend(day)
+
+            if day_bookings:
+                with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+                    build_manifest_pdf(ManifestService.group(day_bookings)['grouped'], trip_date, spool)
+                    spool.seek(0)
+                    with archive.open(f"manifest_{trip_date:%Y-%m-%d}.pdf", 'w', force_zip64=True) as entry:
+                        while chunk := spool.read(COPY_CHUNK_SIZE):
+                            entry.write(chunk)
+                            yield from _drain(sink)
+                yield from _drain(sink)
+
+    # Центральний каталог архіву
+    yield from _drain(sink)
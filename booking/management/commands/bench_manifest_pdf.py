@@ -0,0 +1,63 @@
+import time
+import tracemalloc
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import PassengerProfile
+from booking.models import Booking
+from booking.pdf import manifest_pdf_chunks, register_fonts
+from trips.models import Route
+
+
+class Command(BaseCommand):
+    help = (
+        "Вимірює генерацію PDF-відомості на синтетичних даних (без запитів до БД): "
+        "час, розмір, (за --trace-memory) пікове споживання пам'яті."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--passengers', type=int, default=2000, help="Кількість бронювань у відомості")
+        parser.add_argument('--routes', type=int, default=10, help="Кількість рейсів")
+        parser.add_argument('--trace-memory', action='store_true',
+                            help="Виміряти пік пам'яті (tracemalloc сповільнює генерацію в кілька разів)")
+
+    def handle(self, *args, **options):
+        if not register_fonts():
+            raise CommandError("Шрифт для PDF не знайдено.")
+
+        User = get_user_model()
+        routes = [Route(pk=i, title=f"Рейс №{i} Київ — Львів") for i in range(1, options['routes'] + 1)]
+        grouped = {route: {'list': [], 'total_seats': 0, 'total_bookings': 0} for route in routes}
+        for i in range(options['passengers']):
+            passenger = User(pk=i + 1, username=f"passenger{i}", first_name="Іван", last_name=f"Петренко-{i}")
+            passenger.passenger_profile = PassengerProfile(user=passenger, phone=f"+38050{i:07d}")
+            route = routes[i % len(routes)]
+            booking = Booking(pk=i + 1, route=route, passenger=passenger, seats_count=1 + i % 3,
+                              departure_point="Житомир", total_price=Decimal('850.00'))
+            group = grouped[route]
+            group['list'].append(booking)
+            group['total_seats'] += booking.seats_count
+            group['total_bookings'] += 1
+
+        if options['trace_memory']:
+            tracemalloc.start()
+        started = time.perf_counter()
+        first_chunk_at = None
+        size = 0
+        for chunk in manifest_pdf_chunks(grouped, date.today()):
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter() - started
+            size += len(chunk)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Бронювань: {options['passengers']}, рейсів: {options['routes']}; "
+            f"час: {elapsed:.2f} с (перший блок через {first_chunk_at:.2f} с), розмір: {size / 1024:.0f} КБ"
+        )
+        if options['trace_memory']:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(f"Пік пам'яті: {peak / 1024 / 1024:.1f} МБ")
@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time as dt_time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+from django.utils import timezone
+
+from booking.models import Booking, SeatInventory
+from booking.services import SeatInventoryService
+from city.models import City
+from trips.models import Route, RouteStop
+from trips.services import rebuild_route_segments
+
+
+class Command(BaseCommand):
+    help = (
+        "Навантажувальна перевірка SeatInventoryService: паралельні бронювання на тимчасовому "
+        "маршруті. Перевіряє, що жодна ділянка не перебронована, та показує пропускну здатність. "
+        "Тимчасові дані видаляються після запуску."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Кількість паралельних потоків")
+        parser.add_argument('--attempts', type=int, default=400, help="Загальна кількість спроб бронювання")
+        parser.add_argument('--capacity', type=int, default=20, help="Місткість тимчасового маршруту")
+        parser.add_argument('--max-seats', type=int, default=3, help="Максимум місць в одній спробі")
+        parser.add_argument('--keep', action='store_true', help="Не видаляти тимчасовий маршрут")
+
+    def handle(self, *args, **options):
+        cities = list(City.objects.order_by('id')[:4])
+        if len(cities) < 4:
+            raise CommandError("Потрібно щонайменше 4 міста в довіднику.")
+
+        carrier = get_user_model().objects.create(username=f"bench-seats-{uuid.uuid4().hex[:8]}")
+        route = Route.objects.create(carrier=carrier, title="bench seat reservations", is_active=False,
+                                     capacity=options['capacity'])
+        trip_date = timezone.now().date() + timedelta(days=7)
+        day = trip_date.isoweekday()
+        RouteStop.objects.bulk_create([
+            RouteStop(route=route, city=city, order=index, day_of_week=day, departure_time=dt_time(8 + index))
+            for index, city in enumerate(cities, start=1)
+        ])
+        rebuild_route_segments(route)
+
+        pairs = [(a, b) for i, a in enumerate(cities) for b in cities[i + 1:]]
+        stats = {'ok': 0, 'full': 0, 'locked': 0}
+        booked = {}
+        lock = threading.Lock()
+
+        def attempt(_):
+            departure, arrival = random.choice(pairs)
+            booking = Booking(route=route, trip_date=trip_date, departure_city=departure, arrival_city=arrival,
+                              seats_count=random.randint(1, options['max_seats']))
+            try:
+                ok = SeatInventoryService.reserve(booking)
+            except OperationalError:
+                # SQLite блокує базу на запис; для PostgreSQL такого не буває
+                ok = None
+            finally:
+                close_old_connections()
+            with lock:
+                if ok is None:
+                    stats['locked'] += 1
+                elif ok:
+                    stats['ok'] += 1
+                    for leg in range(cities.index(departure) + 1, cities.index(arrival) + 1):
+                        booked[leg] = booked.get(leg, 0) + booking.seats_count
+                else:
+                    stats['full'] += 1
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                list(executor.map(attempt, range(options['attempts'])))
+            elapsed = time.perf_counter() - started
+
+            rows = dict(SeatInventory.objects.filter(route=route, trip_date=trip_date)
+                        .values_list('segment', 'reserved'))
+            overbooked = {leg: reserved for leg, reserved in rows.items() if reserved > options['capacity']}
+            mismatched = {leg: (rows.get(leg, 0), seats) for leg, seats in booked.items() if rows.get(leg, 0) != seats}
+
+            self.stdout.write(
+                f"Спроб: {options['attempts']}, успішно: {stats['ok']}, немає місць: {stats['full']}, "
+                f"блокувань БД: {stats['locked']}; {options['attempts'] / elapsed:.0f} спроб/с"
+            )
+            self.stdout.write(f"Заброньовано по ділянках: {dict(sorted(rows.items()))} (місткість {options['capacity']})")
+            if overbooked or mismatched:
+                raise CommandError(f"Порушено облік місць: перебронювання {overbooked}, розбіжності {mismatched}")
+            self.stdout.write(self.style.SUCCESS("Перебронювань немає, облік збігається з успішними бронюваннями."))
+        finally:
+            if not options['keep']:
+                route.delete()
+                carrier.delete()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking.services import BookingRollupService
+
+
+class Command(BaseCommand):
+    help = "Перераховує денні підсумки бронювань (BookingDailyRollup) для всіх або вказаних маршрутів"
+
+    def add_arguments(self, parser):
+        parser.add_argument('route_ids', nargs='*', type=int, help="id маршрутів (за замовчуванням — усі)")
+
+    def handle(self, *args, **options):
+        count = BookingRollupService.rebuild(options['route_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Підсумків перераховано: {count}"))
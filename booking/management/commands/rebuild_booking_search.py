@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking.search import BookingSearchService
+
+
+class Command(BaseCommand):
+    help = "Перебудовує пошуковий індекс бронювань (BookingSearchIndex) для всіх або вказаних перевізників"
+
+    def add_arguments(self, parser):
+        parser.add_argument('carrier_ids', nargs='*', type=int, help="id перевізників (за замовчуванням — усі)")
+
+    def handle(self, *args, **options):
+        count = BookingSearchService.rebuild(options['carrier_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Проіндексовано бронювань: {count}"))
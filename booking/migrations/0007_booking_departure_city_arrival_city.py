@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_cities(apps, schema_editor):
+    # Прив'язуємо існуючі бронювання до міст за точною назвою (без урахування регістру)
+    City = apps.get_model('city', 'City')
+    Booking = apps.get_model('booking', 'Booking')
+
+    by_name = {}
+    for city_id, name in City.objects.order_by('id').values_list('id', 'name'):
+        by_name.setdefault(name.casefold().strip(), city_id)
+
+    for booking in Booking.objects.all():
+        booking.departure_city_id = by_name.get((booking.departure_point or '').casefold().strip())
+        booking.arrival_city_id = by_name.get((booking.arrival_point or '').casefold().strip())
+        booking.save(update_fields=['departure_city', 'arrival_city'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_alter_routedistancecache_unique_together_and_more'),
+        ('city', '0002_city_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='arrival_city',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='arrival_bookings', to='city.city', verbose_name='Місто висадки'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='departure_city',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='departure_bookings', to='city.city', verbose_name='Місто посадки'),
+        ),
+        migrations.RunPython(link_cities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 6.0 on 2026-10-18 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_inventory(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    RouteStop = apps.get_model('trips', 'RouteStop')
+    RouteSegment = apps.get_model('trips', 'RouteSegment')
+    SeatInventory = apps.get_model('booking', 'SeatInventory')
+
+    orders_by_route = {}
+    reserved = {}
+    bookings = Booking.objects.exclude(status='cancelled').select_related('route')
+    for booking in bookings.iterator():
+        route_id = booking.route_id
+        if route_id not in orders_by_route:
+            rows = RouteStop.objects.filter(route_id=route_id).order_by('order', 'id').values_list('order', flat=True)
+            orders_by_route[route_id] = [order or index for index, order in enumerate(rows, start=1)]
+        orders = orders_by_route[route_id]
+        if len(orders) < 2:
+            continue
+
+        pair = RouteSegment.objects.filter(
+            route_id=route_id, from_city_id=booking.departure_city_id, to_city_id=booking.arrival_city_id,
+        ).order_by('from_order').values_list('from_order', 'to_order').first()
+        start, end = pair or (orders[0], orders[-1])
+        for order in orders:
+            if start <= order < end:
+                key = (route_id, booking.trip_date, order)
+                reserved[key] = reserved.get(key, 0) + booking.seats_count
+
+    capacities = dict(apps.get_model('trips', 'Route').objects.values_list('id', 'capacity'))
+    SeatInventory.objects.bulk_create(
+        [
+            # Історичні перебронювання не повинні ламати обмеження reserved <= capacity
+            SeatInventory(route_id=route_id, trip_date=trip_date, segment=segment,
+                          capacity=max(capacities[route_id], seats), reserved=seats)
+            for (route_id, trip_date, segment), seats in reserved.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_booking_departure_city_arrival_city'),
+        ('trips', '0012_route_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trip_date', models.DateField(verbose_name='Дата поїздки')),
+                ('segment', models.PositiveIntegerField(verbose_name='Ділянка (порядок зупинки)')),
+                ('capacity', models.PositiveIntegerField(verbose_name='Місткість')),
+                ('reserved', models.PositiveIntegerField(default=0, verbose_name='Заброньовано')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_inventory', to='trips.route')),
+            ],
+            options={
+                'verbose_name': 'Залишок місць',
+                'verbose_name_plural': 'Залишки місць',
+                'constraints': [models.CheckConstraint(condition=models.Q(('reserved__lte', models.F('capacity'))), name='booking_seatinventory_not_overbooked')],
+                'unique_together': {('route', 'trip_date', 'segment')},
+            },
+        ),
+        migrations.RunPython(fill_inventory, migrations.RunPython.noop),
+    ]
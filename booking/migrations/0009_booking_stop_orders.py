@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 14:14
+
+from django.db import migrations, models
+
+
+def fill_orders(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    RouteSegment = apps.get_model('trips', 'RouteSegment')
+
+    bookings = Booking.objects.filter(departure_city__isnull=False, arrival_city__isnull=False)
+    for booking in bookings.iterator():
+        pair = RouteSegment.objects.filter(
+            route_id=booking.route_id, from_city_id=booking.departure_city_id, to_city_id=booking.arrival_city_id,
+        ).order_by('from_order').values_list('from_order', 'to_order').first()
+        if pair:
+            Booking.objects.filter(pk=booking.pk).update(departure_order=pair[0], arrival_order=pair[1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_seatinventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='arrival_order',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Порядок зупинки висадки'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='departure_order',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Порядок зупинки посадки'),
+        ),
+        migrations.RunPython(fill_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-18 14:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_rollups(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    BookingDailyRollup = apps.get_model('booking', 'BookingDailyRollup')
+
+    rows = Booking.objects.order_by().values('route', 'route__carrier', 'trip_date', 'status').annotate(
+        revenue=models.Sum('total_price'), seats=models.Sum('seats_count'), bookings=models.Count('id'),
+    )
+    BookingDailyRollup.objects.bulk_create(
+        [
+            BookingDailyRollup(
+                route_id=row['route'], carrier_id=row['route__carrier'], trip_date=row['trip_date'],
+                status=row['status'], revenue=row['revenue'] or 0, seats=row['seats'] or 0, bookings=row['bookings'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_booking_stop_orders'),
+        ('trips', '0012_route_capacity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trip_date', models.DateField(verbose_name='Дата поїздки')),
+                ('status', models.CharField(choices=[('pending', 'Очікує підтвердження'), ('confirmed', 'Підтверджено'), ('cancelled', 'Скасовано')], max_length=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Виручка')),
+                ('seats', models.IntegerField(default=0, verbose_name='Місць')),
+                ('bookings', models.IntegerField(default=0, verbose_name='Бронювань')),
+                ('carrier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_rollups', to=settings.AUTH_USER_MODEL)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_rollups', to='trips.route')),
+            ],
+            options={
+                'verbose_name': 'Підсумок бронювань за день',
+                'verbose_name_plural': 'Підсумки бронювань за день',
+                'indexes': [models.Index(fields=['carrier', 'trip_date'], name='booking_rollup_carrier_idx')],
+                'unique_together': {('route', 'trip_date', 'status')},
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 14:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_carriers(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    Route = apps.get_model('trips', 'Route')
+    Booking.objects.update(
+        carrier_id=models.Subquery(Route.objects.filter(pk=models.OuterRef('route_id')).values('carrier_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_bookingdailyrollup'),
+        ('trips', '0013_route_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='carrier',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='carrier_bookings', to=settings.AUTH_USER_MODEL, verbose_name='Перевізник'),
+        ),
+        migrations.RunPython(fill_carriers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['carrier', 'created_at', 'id'], name='booking_carrier_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['carrier', 'status', 'created_at', 'id'], name='booking_carrier_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['route', 'created_at', 'id'], name='booking_route_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['carrier', 'trip_date'], name='booking_carrier_trip_date_idx'),
+        ),
+    ]
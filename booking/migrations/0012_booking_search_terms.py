@@ -0,0 +1,84 @@
+# Generated by Django 6.0 on 2026-10-18 14:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_search_terms(apps, schema_editor):
+    from booking.search import TRIGRAM, booking_terms
+    from city.resolver import ngrams
+
+    Booking = apps.get_model('booking', 'Booking')
+    SearchTerm = apps.get_model('booking', 'SearchTerm')
+    SearchTermTrigram = apps.get_model('booking', 'SearchTermTrigram')
+    BookingSearchTerm = apps.get_model('booking', 'BookingSearchTerm')
+
+    rows = Booking.objects.order_by('pk').values_list(
+        'pk', 'carrier_id', 'passenger__username', 'passenger__first_name', 'passenger__last_name',
+        'passenger__passenger_profile__phone', 'departure_point', 'arrival_point',
+    )
+    entries = [
+        (pk, carrier_id, booking_terms(*fields)) for pk, carrier_id, *fields in rows.iterator(chunk_size=1000)
+    ]
+    values = sorted(set().union(*(terms for _, _, terms in entries)))
+    SearchTerm.objects.bulk_create([SearchTerm(value=value) for value in values], batch_size=1000)
+    term_ids = dict(SearchTerm.objects.values_list('value', 'id'))
+    SearchTermTrigram.objects.bulk_create(
+        [SearchTermTrigram(term_id=term_ids[value], trigram=trigram)
+         for value in values for trigram in ngrams(value, TRIGRAM)],
+        batch_size=1000,
+    )
+    BookingSearchTerm.objects.bulk_create(
+        [BookingSearchTerm(booking_id=pk, carrier_id=carrier_id, term_id=term_ids[value])
+         for pk, carrier_id, terms in entries for value in terms],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_booking_carrier'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=255, unique=True, verbose_name='Значення')),
+            ],
+            options={
+                'verbose_name': 'Пошуковий термін',
+                'verbose_name_plural': 'Пошукові терміни',
+            },
+        ),
+        migrations.CreateModel(
+            name='BookingSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='booking.booking')),
+                ('carrier', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_links', to='booking.searchterm')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['carrier', 'term', 'booking'], name='booking_search_term_idx')],
+                'unique_together': {('booking', 'term')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTermTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='booking.searchterm')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'term'], name='booking_term_trigram_idx')],
+                'unique_together': {('term', 'trigram')},
+            },
+        ),
+        migrations.RunPython(fill_search_terms, migrations.RunPython.noop),
+    ]
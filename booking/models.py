@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from city.models import City
 from trips.models import Route
 
 class Booking(models.Model):
@@ -11,12 +12,23 @@ class Booking(models.Model):
 
     passenger = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bookings')
     route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='bookings')
+    # Перевізник маршруту (копія route.carrier): список бронювань перевізника читається за індексом без JOIN
+    carrier = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                                editable=False, related_name='carrier_bookings', verbose_name="Перевізник")
     trip_date = models.DateField(verbose_name="Дата поїздки")
     seats_count = models.PositiveIntegerField(default=1, verbose_name="Кількість місць")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     departure_point = models.CharField(max_length=100, verbose_name="Місце посадки")
     arrival_point = models.CharField(max_length=100, verbose_name="Місце висадки")
+    # Канонічні міста посадки/висадки (визначаються через city.resolver при бронюванні)
+    departure_city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='departure_bookings', verbose_name="Місто посадки")
+    arrival_city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='arrival_bookings', verbose_name="Місто висадки")
+    # Порядкові номери зупинок (RouteStop.order) посадки та висадки — визначають зайняті ділянки
+    departure_order = models.PositiveIntegerField(null=True, blank=True, verbose_name="Порядок зупинки посадки")
+    arrival_order = models.PositiveIntegerField(null=True, blank=True, verbose_name="Порядок зупинки висадки")
     total_price = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -24,5 +36,116 @@ class Booking(models.Model):
         verbose_name="Загальна вартість"
     )
 
+    class Meta:
+        indexes = [
+            # Список бронювань перевізника: сторінки за (created_at, id) і фільтри статусу, маршруту, дати поїздки
+            models.Index(fields=['carrier', 'created_at', 'id'], name='booking_carrier_created_idx'),
+            models.Index(fields=['carrier', 'status', 'created_at', 'id'], name='booking_carrier_status_idx'),
+            models.Index(fields=['route', 'created_at', 'id'], name='booking_route_created_idx'),
+            models.Index(fields=['carrier', 'trip_date'], name='booking_carrier_trip_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.passenger.username} - {self.route.title} ({self.trip_date})"
+
+    def save(self, *args, **kwargs):
+        if self.route_id and (self.carrier_id is None or Booking.route.is_cached(self)):
+            self.carrier_id = self.route.carrier_id
+        # Сигнали підсумків читають старий рядок під блокуванням (booking/signals.py) — до кінця збереження
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class SeatInventory(models.Model):
+    """
+    Залишок місць на одній ділянці маршруту в конкретну дату.
+    segment — порядок (RouteStop.order) зупинки, з якої починається ділянка.
+    Змінюється лише умовними UPDATE через SeatInventoryService.
+    """
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='seat_inventory')
+    trip_date = models.DateField(verbose_name="Дата поїздки")
+    segment = models.PositiveIntegerField(verbose_name="Ділянка (порядок зупинки)")
+    capacity = models.PositiveIntegerField(verbose_name="Місткість")
+    reserved = models.PositiveIntegerField(default=0, verbose_name="Заброньовано")
+
+    class Meta:
+        verbose_name = "Залишок місць"
+        verbose_name_plural = "Залишки місць"
+        unique_together = ('route', 'trip_date', 'segment')
+        constraints = [
+            models.CheckConstraint(condition=models.Q(reserved__lte=models.F('capacity')),
+                                   name='booking_seatinventory_not_overbooked'),
+        ]
+
+    def __str__(self):
+        return f"{self.route_id} {self.trip_date} #{self.segment}: {self.reserved}/{self.capacity}"
+
+
+class BookingDailyRollup(models.Model):
+    """
+    Щоденні підсумки бронювань: (перевізник, маршрут, дата поїздки, статус).
+    Оновлюються інкрементно сигналами Booking (booking/signals.py),
+    повністю перераховуються командою rebuild_booking_rollups.
+    """
+    carrier = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='booking_rollups')
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='booking_rollups')
+    trip_date = models.DateField(verbose_name="Дата поїздки")
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Виручка")
+    seats = models.IntegerField(default=0, verbose_name="Місць")
+    bookings = models.IntegerField(default=0, verbose_name="Бронювань")
+
+    class Meta:
+        verbose_name = "Підсумок бронювань за день"
+        verbose_name_plural = "Підсумки бронювань за день"
+        unique_together = ('route', 'trip_date', 'status')
+        indexes = [
+            models.Index(fields=['carrier', 'trip_date'], name='booking_rollup_carrier_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.route_id} {self.trip_date} {self.status}: {self.bookings} / {self.revenue}"
+
+
+
+class SearchTerm(models.Model):
+    """
+    Нормалізоване значення поля бронювання (логін, ім'я пасажира, цифри телефону, місце посадки/висадки):
+    casefold, без апострофів. Спільне для всіх бронювань, тож триграми зберігаються один раз на значення.
+    """
+    value = models.CharField(max_length=255, unique=True, verbose_name="Значення")
+
+    class Meta:
+        verbose_name = "Пошуковий термін"
+        verbose_name_plural = "Пошукові терміни"
+
     def __str__(self):
-        return f"{self.passenger.username} - {self.route.title} ({self.trip_date})"
\ No newline at end of file
+        return self.value
+
+
+class SearchTermTrigram(models.Model):
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ('term', 'trigram')
+        indexes = [
+            models.Index(fields=['trigram', 'term'], name='booking_term_trigram_idx'),
+        ]
+
+
+class BookingSearchTerm(models.Model):
+    """
+    Зв'язок бронювання з його термінами для пошуку в списку перевізника (booking/search.py).
+    Оновлюється сигналами (booking/signals.py), повністю — командою rebuild_booking_search.
+    """
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='booking_links')
+    # Копія booking.carrier: пошук обмежується бронюваннями перевізника за індексом
+    carrier = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, related_name='+')
+
+    class Meta:
+        unique_together = ('booking', 'term')
+        indexes = [
+            models.Index(fields=['carrier', 'term', 'booking'], name='booking_search_term_idx'),
+        ]
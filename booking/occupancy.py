@@ -0,0 +1,73 @@
+from bisect import bisect_left
+from math import inf
+
+
+class LegOccupancy:
+    """
+    Завантаженість ділянок одного рейсу (маршрут + дата).
+    Ділянка — відрізок між сусідніми зупинками, позначається порядком (RouteStop.order)
+    зупинки, з якої починається. Бронювання [start_order, end_order) займає всі ділянки
+    від зупинки посадки до зупинки висадки, не включаючи останню.
+
+    Дерево відрізків з відкладеним додаванням: і додавання бронювання, і запит
+    «максимальне завантаження на [start_order, end_order)» виконуються за O(log n).
+    """
+
+    def __init__(self, orders, loads=None):
+        # Остання зупинка ділянки не починає
+        self.legs = sorted(orders)[:-1]
+        self.size = len(self.legs)
+        self._max = [0] * (4 * max(self.size, 1))
+        self._add = [0] * (4 * max(self.size, 1))
+        if loads and self.size:
+            self._build(1, 0, self.size - 1, [loads.get(leg, 0) for leg in self.legs])
+
+    def _build(self, node, lo, hi, values):
+        if lo == hi:
+            self._max[node] = values[lo]
+            return
+        mid = (lo + hi) // 2
+        self._build(2 * node, lo, mid, values)
+        self._build(2 * node + 1, mid + 1, hi, values)
+        self._max[node] = max(self._max[2 * node], self._max[2 * node + 1])
+
+    def _bounds(self, start_order, end_order):
+        """Індекси ділянок [i, j] для інтервалу зупинок [start_order, end_order)."""
+        return bisect_left(self.legs, start_order), bisect_left(self.legs, end_order) - 1
+
+    def _update(self, node, lo, hi, i, j, seats):
+        if j < lo or hi < i:
+            return
+        if i <= lo and hi <= j:
+            self._max[node] += seats
+            self._add[node] += seats
+            return
+        mid = (lo + hi) // 2
+        self._update(2 * node, lo, mid, i, j, seats)
+        self._update(2 * node + 1, mid + 1, hi, i, j, seats)
+        self._max[node] = max(self._max[2 * node], self._max[2 * node + 1]) + self._add[node]
+
+    def _query(self, node, lo, hi, i, j):
+        if j < lo or hi < i:
+            return -inf
+        if i <= lo and hi <= j:
+            return self._max[node]
+        mid = (lo + hi) // 2
+        return max(self._query(2 * node, lo, mid, i, j),
+                   self._query(2 * node + 1, mid + 1, hi, i, j)) + self._add[node]
+
+    def add(self, start_order, end_order, seats):
+        """Додає (або знімає, якщо seats < 0) місця на ділянках [start_order, end_order)."""
+        i, j = self._bounds(start_order, end_order)
+        if self.size and i <= j:
+            self._update(1, 0, self.size - 1, i, j, seats)
+
+    def max_load(self, start_order, end_order):
+        """Найбільша кількість зайнятих місць на будь-якій ділянці [start_order, end_order)."""
+        i, j = self._bounds(start_order, end_order)
+        if not self.size or i > j:
+            return 0
+        return self._query(1, 0, self.size - 1, i, j)
+
+    def free_seats(self, capacity, start_order, end_order):
+        return max(capacity - self.max_load(start_order, end_order), 0)
@@ -0,0 +1,125 @@
+import logging
+import os
+from tempfile import SpooledTemporaryFile
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer, TableStyle
+
+logger = logging.getLogger(__name__)
+
+FONT_NAME = 'DejaVuSans'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'static', 'fonts', 'DejaVuSans.ttf')
+
+# Готовий PDF до цього розміру тримається в пам'яті, більший — у тимчасовому файлі
+SPOOL_MAX_SIZE = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Ширини колонок як у попередньому HTML-шаблоні: №, пасажир, телефон, місця, посадка, сума
+COLUMN_WIDTHS = (0.05, 0.30, 0.20, 0.10, 0.20, 0.15)
+
+
+def register_fonts():
+    """Реєструє кириличний шрифт один раз на процес (викликається з BookingConfig.ready)."""
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return True
+    if not os.path.exists(FONT_PATH):
+        logger.warning("Шрифт для PDF не знайдено: %s", FONT_PATH)
+        return False
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    return True
+
+
+STYLES = {
+    'title': ParagraphStyle('title', fontName=FONT_NAME, fontSize=16, leading=20, alignment=1, spaceAfter=6),
+    'info': ParagraphStyle('info', fontName=FONT_NAME, fontSize=9, leading=12),
+    'route': ParagraphStyle('route', fontName=FONT_NAME, fontSize=11, leading=14, backColor=colors.HexColor('#f0f0f0'),
+                            borderColor=colors.black, borderWidth=0.5, borderPadding=4, spaceBefore=12, spaceAfter=6),
+    'cell': ParagraphStyle('cell', fontName=FONT_NAME, fontSize=9, leading=11),
+}
+
+TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+    ('FONTSIZE', (0, 0), (-1, 0), 8),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#eeeeee')),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+    ('ALIGN', (3, 0), (3, -1), 'CENTER'),
+    ('ALIGN', (5, 0), (5, -1), 'RIGHT'),
+])
+
+
+def _route_table(bookings, width):
+    """bookings — рядки відомості ManifestService (словники)."""
+    rows = [['№', 'Пасажир', 'Телефон', 'Місця', 'Посадка', 'Сума']]
+    for number, booking in enumerate(bookings, start=1):
+        rows.append([
+            number,
+            Paragraph(escape(booking['passenger']), STYLES['cell']),
+            booking['phone'],
+            booking['seats_count'],
+            Paragraph(escape(booking['departure_point'] or ''), STYLES['cell']),
+            f"{booking['total_price']} грн",
+        ])
+    # LongTable + repeatRows: шапка повторюється на кожній сторінці довгого рейсу
+    return LongTable(rows, colWidths=[width * w for w in COLUMN_WIDTHS], repeatRows=1, style=TABLE_STYLE)
+
+
+def _number_page(canvas, doc):
+    canvas.saveState()
+    canvas.setFont(FONT_NAME, 7)
+    canvas.drawRightString(A4[0] - doc.rightMargin, 0.5 * cm, f"Сторінка {doc.page}")
+    canvas.restoreState()
+
+
+def build_manifest_pdf(grouped, target_date, output):
+    """Записує відомість пасажирів (структура ManifestService) у файловий об'єкт output."""
+    doc = SimpleDocTemplate(
+        output, pagesize=A4, leftMargin=cm, rightMargin=cm, topMargin=cm, bottomMargin=cm,
+        title=f"Відомість пасажирів {target_date}",
+    )
+    story = [
+        Paragraph("Відомість пасажирів", STYLES['title']),
+        Paragraph(f"Дата: {target_date:%d.%m.%Y} &nbsp;&nbsp;&nbsp; UkrBus / LogiTrans", STYLES['info']),
+        Spacer(1, 0.3 * cm),
+    ]
+    for route, data in grouped.items():
+        story.append(Paragraph(
+            f"РЕЙС: {escape(route.title)} — замовлень: {data['total_bookings']}, місць: {data['total_seats']}",
+            STYLES['route'],
+        ))
+        story.append(_route_table(data['list'], doc.width))
+
+    doc.build(story, onFirstPage=_number_page, onLaterPages=_number_page)
+    return doc.page
+
+
+def manifest_pdf_chunks(grouped, target_date):
+    """
+    Будує PDF у SpooledTemporaryFile (великі відомості йдуть на диск, а не в пам'ять)
+    і віддає його частинами для StreamingHttpResponse.
+    """
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        build_manifest_pdf(grouped, target_date, spool)
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+
+    def chunks():
+        try:
+            while chunk := spool.read(CHUNK_SIZE):
+                yield chunk
+        finally:
+            spool.close()
+
+    return chunks()
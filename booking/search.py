@@ -0,0 +1,177 @@
+"""
+Пошук у списку бронювань перевізника за нормалізованою таблицею триграм.
+Значення полів (логін, ім'я, цифри телефону, місця посадки/висадки) зберігаються один раз
+у SearchTerm з триграмами, бронювання лише посилаються на свої терміни (BookingSearchTerm).
+Регістр знімається в Python (casefold — і для кирилиці), а не в LIKE бази,
+тож «ОЛЕНА», «олена» й «Олена» однаково знаходять і на SQLite, і на PostgreSQL.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Count
+
+from city.resolver import ngrams, normalize
+
+from .models import Booking, BookingSearchTerm, SearchTerm, SearchTermTrigram
+
+TRIGRAM = 3
+BATCH_SIZE = 1000
+MAX_TERM_LENGTH = SearchTerm._meta.get_field('value').max_length
+
+# Термін із цифр і телефонних розділювачів шукається як номер: лише цифри («+38 (050)» -> «38», «050»)
+_PHONE_TERM_RE = re.compile(r"^[\d+()\-.]*\d[\d+()\-.]*$")
+_NON_DIGITS_RE = re.compile(r"\D+")
+
+
+def normalize_term(term):
+    if _PHONE_TERM_RE.match(term):
+        return _NON_DIGITS_RE.sub('', term)
+    return normalize(term)
+
+
+def search_terms(query):
+    """Терміни запиту (через пробіл); бронювання має містити кожен хоча б в одному полі."""
+    return [term for term in (normalize_term(part) for part in (query or '').split()) if term]
+
+
+def booking_terms(username, first_name, last_name, phone, departure_point, arrival_point):
+    """Нормалізовані значення полів бронювання, за якими його можна знайти."""
+    values = {
+        normalize(username),
+        normalize(f"{first_name or ''} {last_name or ''}"),
+        _NON_DIGITS_RE.sub('', phone or ''),
+        normalize(departure_point),
+        normalize(arrival_point),
+    }
+    return {value[:MAX_TERM_LENGTH] for value in values if value}
+
+
+class BookingSearchService:
+    @staticmethod
+    def _rows(bookings):
+        return bookings.order_by('pk').values_list(
+            'pk', 'carrier_id', 'passenger__username', 'passenger__first_name', 'passenger__last_name',
+            'passenger__passenger_profile__phone', 'departure_point', 'arrival_point',
+        )
+
+    @staticmethod
+    def _term_ids(values):
+        """{значення: id SearchTerm}; відсутні терміни створюються разом із триграмами."""
+        ids = dict(SearchTerm.objects.filter(value__in=values).values_list('value', 'id'))
+        missing = values - ids.keys()
+        if missing:
+            # ignore_conflicts: той самий термін може паралельно створювати інший запит
+            SearchTerm.objects.bulk_create([SearchTerm(value=value) for value in missing],
+                                           batch_size=BATCH_SIZE, ignore_conflicts=True)
+            created = dict(SearchTerm.objects.filter(value__in=missing).values_list('value', 'id'))
+            SearchTermTrigram.objects.bulk_create(
+                [SearchTermTrigram(term_id=term_id, trigram=trigram)
+                 for value, term_id in created.items() for trigram in ngrams(value, TRIGRAM)],
+                batch_size=BATCH_SIZE, ignore_conflicts=True,
+            )
+            ids.update(created)
+        return ids
+
+    @staticmethod
+    def _prune(term_ids):
+        """Видаляє з term_ids терміни, на які більше не посилається жодне бронювання."""
+        if term_ids:
+            SearchTerm.objects.filter(pk__in=term_ids, booking_links__isnull=True).delete()
+
+    @classmethod
+    def _write(cls, entries, replace=True):
+        """
+        entries — {booking_id: (carrier_id, {значення})}; replace=False — зв'язків ще немає.
+        Старі терміни, що після заміни лишилися без бронювань (перейменування, зміна телефону), видаляються.
+        """
+        replaced = set()
+        if replace:
+            links = BookingSearchTerm.objects.filter(booking_id__in=list(entries))
+            replaced = set(links.values_list('term_id', flat=True))
+            links.delete()
+        term_ids = cls._term_ids(set().union(*(values for _, values in entries.values())))
+        BookingSearchTerm.objects.bulk_create(
+            [BookingSearchTerm(booking_id=pk, carrier_id=carrier_id, term_id=term_ids[value])
+             for pk, (carrier_id, values) in entries.items() for value in values],
+            batch_size=BATCH_SIZE,
+        )
+        cls._prune(replaced - set(term_ids.values()))
+
+    @classmethod
+    @transaction.atomic
+    def index(cls, bookings):
+        """
+        Оновлює терміни бронювань із queryset. Бронювання, у яких нічого не змінилося
+        (наприклад, при зміні статусу чи імені іншого пасажира), не переписуються. Повертає кількість оновлених.
+        """
+        rows = list(cls._rows(bookings))
+        updated = 0
+        for start in range(0, len(rows), BATCH_SIZE):
+            chunk = rows[start:start + BATCH_SIZE]
+            existing = {}
+            for pk, carrier_id, value in BookingSearchTerm.objects.filter(
+                booking_id__in=[row[0] for row in chunk]
+            ).values_list('booking_id', 'carrier_id', 'term__value'):
+                existing.setdefault(pk, (carrier_id, set()))[1].add(value)
+
+            changed = {}
+            for pk, carrier_id, *fields in chunk:
+                entry = (carrier_id, booking_terms(*fields))
+                if existing.get(pk, (None, set())) != entry:
+                    changed[pk] = entry
+            if changed:
+                cls._write(changed, replace=bool(existing))
+                updated += len(changed)
+        return updated
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls, carrier_ids=None):
+        """
+        Повна перебудова зв'язків (усіх або вказаних перевізників) з видаленням термінів,
+        на які більше ніщо не посилається. Повертає кількість проіндексованих бронювань.
+        """
+        bookings = Booking.objects.all()
+        links = BookingSearchTerm.objects.all()
+        replaced = set()
+        if carrier_ids:
+            bookings = bookings.filter(carrier_id__in=carrier_ids)
+            links = links.filter(booking_id__in=bookings.values('pk'))
+            replaced = set(links.values_list('term_id', flat=True))
+        links.delete()
+
+        count, batch = 0, {}
+        for pk, carrier_id, *fields in cls._rows(bookings).iterator(chunk_size=BATCH_SIZE):
+            batch[pk] = (carrier_id, booking_terms(*fields))
+            if len(batch) >= BATCH_SIZE:
+                cls._write(batch, replace=False)
+                count += len(batch)
+                batch = {}
+        if batch:
+            cls._write(batch, replace=False)
+
+        if carrier_ids:
+            cls._prune(replaced)
+        else:
+            SearchTerm.objects.filter(booking_links__isnull=True).delete()
+        return count + len(batch)
+
+    @staticmethod
+    def filter(queryset, carrier, query):
+        """
+        Звужує queryset бронювань до тих, що містять кожен термін query хоча б в одному полі.
+        Терміни від трьох символів відбираються за триграмами (індекс trigram, term) і перевіряються
+        підрядком; коротші — підрядком по довіднику термінів. Далі — лише зв'язки цього перевізника.
+        """
+        for term in search_terms(query):
+            terms = SearchTerm.objects.filter(value__contains=term)
+            grams = ngrams(term, TRIGRAM)
+            if grams:
+                terms = terms.filter(pk__in=(
+                    SearchTermTrigram.objects.filter(trigram__in=grams)
+                    .values('term').annotate(found=Count('id')).filter(found=len(grams)).values('term')
+                ))
+            queryset = queryset.filter(pk__in=(
+                BookingSearchTerm.objects.filter(carrier=carrier, term__in=terms).values('booking')
+            ))
+        return queryset
@@ -0,0 +1,483 @@
+from collections import namedtuple
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from trips.context_processors import invalidate_popular_directions
+from trips.models import Route, RouteSegment, RouteStop
+from trips.search_cache import invalidate_search_route
+from .models import Booking, BookingDailyRollup, SeatInventory
+from .occupancy import LegOccupancy
+
+
+class StopEditError(ValueError):
+    """Зміна зупинок маршруту несумісна з майбутніми бронюваннями — текст показується перевізнику."""
+
+
+class SeatInventoryService:
+    """
+    Облік вільних місць по ділянках маршруту (SeatInventory).
+    Усі зміни — умовні UPDATE з F-виразами, без читання залишку в Python,
+    тому паралельні бронювання не можуть продати більше місць, ніж є.
+    """
+
+    @staticmethod
+    def route_orders(route_id):
+        """Порядкові номери зупинок маршруту (як у RouteSegment: порожній order — позиція)."""
+        rows = RouteStop.objects.filter(route_id=route_id).order_by('order', 'id').values_list('order', flat=True)
+        return [order or index for index, order in enumerate(rows, start=1)]
+
+    @staticmethod
+    def stop_orders(route_id, from_city_id, to_city_id, trip_date=None):
+        """
+        (порядок посадки, порядок висадки) пари міст на маршруті або None.
+        Якщо місто зустрічається на маршруті кілька разів — перевага зупинці,
+        що відправляється в день поїздки, далі найранішій.
+        """
+        if not from_city_id or not to_city_id:
+            return None
+        rows = RouteSegment.objects.filter(
+            route_id=route_id, from_city_id=from_city_id, to_city_id=to_city_id,
+        ).values_list('day_of_week', 'from_order', 'to_order')
+        day = trip_date.isoweekday() if trip_date else None
+        best = min(rows, key=lambda row: (row[0] != day, row[1]), default=None)
+        return best[1:] if best else None
+
+    @staticmethod
+    def stop_positions(route_id):
+        """{порядок зупинки: id RouteStop} — знімок маршруту до редагування зупинок (див. remap_stops)."""
+        rows = RouteStop.objects.filter(route_id=route_id).order_by('order', 'id').values_list('id', 'order')
+        return {order or index: stop_id for index, (stop_id, order) in enumerate(rows, start=1)}
+
+    @classmethod
+    def legs(cls, booking, orders=None):
+        """
+        Ділянки (segment), які займає бронювання: від зупинки посадки до зупинки висадки.
+        orders — порядки зупинок маршруту (route_orders), якщо вже прочитані.
+        """
+        if orders is None:
+            orders = cls.route_orders(booking.route_id)
+        if len(orders) < 2:
+            return []
+
+        if booking.departure_order and booking.arrival_order:
+            pair = (booking.departure_order, booking.arrival_order)
+        else:
+            pair = cls.stop_orders(booking.route_id, booking.departure_city_id, booking.arrival_city_id,
+                                   booking.trip_date)
+        # Якщо зупинки не визначено (старі бронювання з довільним текстом) — займаємо весь маршрут
+        start, end = pair or (orders[0], orders[-1])
+        return [order for order in orders if start <= order < end]
+
+    @classmethod
+    def reserve(cls, booking):
+        """Займає місця бронювання на всіх його ділянках. Повертає False, якщо місць не вистачає."""
+        legs = cls.legs(booking)
+        if not legs:
+            return True
+
+        seats = booking.seats_count
+        with transaction.atomic():
+            SeatInventory.objects.bulk_create(
+                [
+                    SeatInventory(route_id=booking.route_id, trip_date=booking.trip_date, segment=leg,
+                                  capacity=booking.route.capacity)
+                    for leg in legs
+                ],
+                ignore_conflicts=True,
+            )
+            updated = SeatInventory.objects.filter(
+                route_id=booking.route_id,
+                trip_date=booking.trip_date,
+                segment__in=legs,
+                reserved__lte=F('capacity') - seats,
+            ).update(reserved=F('reserved') + seats)
+
+            if updated != len(legs):
+                # Хоча б одна ділянка заповнена — відкочуємо вже зроблені збільшення
+                transaction.set_rollback(True)
+                return False
+        return True
+
+    @classmethod
+    def release(cls, booking):
+        """Повертає місця бронювання (скасування)."""
+        legs = cls.legs(booking)
+        if not legs:
+            return
+
+        seats = booking.seats_count
+        SeatInventory.objects.filter(
+            route_id=booking.route_id,
+            trip_date=booking.trip_date,
+            segment__in=legs,
+            reserved__gte=seats,
+        ).update(reserved=F('reserved') - seats)
+
+    @staticmethod
+    def sync_capacity(route):
+        """Переносить нову місткість маршруту на майбутні дати (не нижче вже заброньованого)."""
+        SeatInventory.objects.filter(route=route, trip_date__gte=timezone.now().date()).update(
+            capacity=Greatest(F('reserved'), Value(route.capacity))
+        )
+
+    @classmethod
+    def remap_stops(cls, route, previous):
+        """
+        Переносить майбутні бронювання і SeatInventory на нові порядки зупинок: ділянки
+        й Booking.departure_order/arrival_order прив'язані до RouteStop.order, а редагування
+        маршруту нумерує зупинки заново. previous — stop_positions до редагування.
+        Викликається в транзакції збереження зупинок. Якщо бронювання втрачає зупинку посадки
+        чи висадки (видалена або переставлена після висадки) чи ділянка переповнюється —
+        StopEditError, і транзакція відкочується.
+        """
+        current = cls.stop_positions(route.pk)
+        if current == previous:
+            return
+        positions = {stop_id: order for order, stop_id in current.items()}
+        today = timezone.now().date()
+        bookings = list(
+            Booking.objects.select_for_update().filter(route=route, trip_date__gte=today)
+            .exclude(status='cancelled')
+            .only('route', 'trip_date', 'seats_count', 'departure_order', 'arrival_order',
+                  'departure_city', 'arrival_city')
+        )
+
+        moved = []
+        for booking in bookings:
+            # Старі бронювання без порядків зупинок визначаються за містами (RouteSegment уже перебудовано)
+            if not (booking.departure_order and booking.arrival_order):
+                continue
+            start = positions.get(previous.get(booking.departure_order))
+            end = positions.get(previous.get(booking.arrival_order))
+            if start is None or end is None or start >= end:
+                raise StopEditError(
+                    f"Зупинки не можна змінити так: замовлення №{booking.pk} на {booking.trip_date:%d.%m.%Y} "
+                    f"втратило б місце посадки чи висадки. Спершу скасуйте його."
+                )
+            if (start, end) != (booking.departure_order, booking.arrival_order):
+                booking.departure_order, booking.arrival_order = start, end
+                moved.append(booking)
+        Booking.objects.bulk_update(moved, ['departure_order', 'arrival_order'])
+
+        # Ділянки після вставки чи видалення зупинок інші — залишки рахуються з бронювань заново
+        orders = sorted(current)
+        loads = {}
+        for booking in bookings:
+            for leg in cls.legs(booking, orders):
+                loads[(booking.trip_date, leg)] = loads.get((booking.trip_date, leg), 0) + booking.seats_count
+        # Вже продане понад місткість (після її зменшення) лишається допустимим, нове переповнення — ні
+        peaks = dict(
+            SeatInventory.objects.filter(route=route, trip_date__gte=today)
+            .values_list('trip_date').annotate(peak=Max('reserved'))
+        )
+        for (trip_date, leg), load in sorted(loads.items()):
+            if load > max(route.capacity, peaks.get(trip_date, 0)):
+                raise StopEditError(
+                    f"Зупинки не можна змінити так: на {trip_date:%d.%m.%Y} ділянка маршруту "
+                    f"мала б {load} пасажирів при місткості {route.capacity}."
+                )
+
+        SeatInventory.objects.filter(route=route, trip_date__gte=today).delete()
+        SeatInventory.objects.bulk_create([
+            SeatInventory(route=route, trip_date=trip_date, segment=leg, capacity=max(route.capacity, load),
+                          reserved=load)
+            for (trip_date, leg), load in loads.items()
+        ])
+        for trip_date in {booking.trip_date for booking in bookings}:
+            ManifestService.invalidate(route.pk, trip_date)
+
+    @staticmethod
+    def occupancy(routes, trip_date):
+        """
+        LegOccupancy кожного маршруту на дату — один запит до SeatInventory.
+        Зупинки беруться з route.stops.all(), тож їх варто попередньо завантажити.
+        Місткість ділянки на дату (SeatInventory.capacity) може відрізнятися від route.capacity
+        (після зменшення вона не нижча за продане), тому завантаження ділянки —
+        reserved + (route.capacity − capacity): route.capacity − max_load дорівнює тому,
+        що справді прийме reserve(). Ділянка без рядка має route.capacity вільних місць.
+        """
+        capacities = {route.pk: route.capacity for route in routes}
+        loads = {}
+        rows = SeatInventory.objects.filter(route__in=routes, trip_date=trip_date).values_list(
+            'route_id', 'segment', 'reserved', 'capacity'
+        )
+        for route_id, segment, reserved, capacity in rows:
+            loads.setdefault(route_id, {})[segment] = reserved + capacities[route_id] - capacity
+
+        result = {}
+        for route in routes:
+            stops = sorted(route.stops.all(), key=lambda stop: (stop.order or 0, stop.id))
+            orders = [stop.order or index for index, stop in enumerate(stops, start=1)]
+            result[route.pk] = LegOccupancy(orders, loads.get(route.pk))
+        return result
+
+    @classmethod
+    def free_seats(cls, routes, trip_date, from_city_id, to_city_id):
+        """Вільні місця між двома містами на кожному маршруті: {route_id: кількість}."""
+        segments = RouteSegment.objects.filter(
+            route__in=routes, from_city_id=from_city_id, to_city_id=to_city_id,
+            day_of_week=trip_date.isoweekday(),
+        ).order_by('-from_order').values_list('route_id', 'from_order', 'to_order')
+        # Сортування за спаданням: у словнику лишається найраніша посадка
+        pairs = {route_id: (start, end) for route_id, start, end in segments}
+
+        occupancy = cls.occupancy([route for route in routes if route.pk in pairs], trip_date)
+        return {
+            route.pk: occupancy[route.pk].free_seats(route.capacity, *pairs[route.pk])
+            for route in routes if route.pk in pairs
+        }
+
+
+class BookingRollupService:
+    """
+    Підтримка BookingDailyRollup. Стан бронювання для підсумків —
+    (route_id, trip_date, status, total_price, seats_count); при зміні
+    старий стан віднімається, новий додається умовними F-оновленнями.
+    """
+
+    @staticmethod
+    def state(booking):
+        if booking.pk is None or booking.get_deferred_fields() & {'route_id', 'trip_date', 'status',
+                                                                  'total_price', 'seats_count'}:
+            return None
+        return booking.route_id, booking.trip_date, booking.status, booking.total_price, booking.seats_count
+
+    @staticmethod
+    def apply(state, sign, carrier_id=None):
+        """Додає (sign=1) або віднімає (sign=-1) бронювання у відповідному денному підсумку."""
+        route_id, trip_date, status, total_price, seats_count = state
+        changes = {
+            'revenue': F('revenue') + sign * (total_price or 0),
+            'seats': F('seats') + sign * seats_count,
+            'bookings': F('bookings') + sign,
+        }
+        rollups = BookingDailyRollup.objects.filter(route_id=route_id, trip_date=trip_date, status=status)
+        if rollups.update(**changes) or sign < 0:
+            return
+
+        if carrier_id is None:
+            carrier_id = Route.objects.filter(pk=route_id).values_list('carrier_id', flat=True).first()
+        try:
+            with transaction.atomic():
+                BookingDailyRollup.objects.create(
+                    carrier_id=carrier_id, route_id=route_id, trip_date=trip_date, status=status,
+                    revenue=total_price or 0, seats=seats_count, bookings=1,
+                )
+        except IntegrityError:
+            # Рядок щойно створив паралельний запит — додаємо до нього
+            rollups.update(**changes)
+
+    @classmethod
+    def changed(cls, previous, current, carrier_id=None):
+        """Переносить бронювання зі стану previous у current (None — бронювання не було / більше немає)."""
+        if current == previous:
+            return
+        if previous is not None:
+            cls.apply(previous, -1)
+        if current is not None:
+            cls.apply(current, 1, carrier_id=carrier_id)
+
+    @staticmethod
+    def carrier_totals(carrier, **filters):
+        """
+        Виручка, місця і кількість бронювань перевізника з денних підсумків одним запитом.
+        filters — ті самі, що й для Booking: status, route_id, trip_date__gte/__lte.
+        """
+        return BookingDailyRollup.objects.filter(carrier=carrier, **filters).aggregate(
+            total_money=Sum('revenue'), total_seats=Sum('seats'), total_bookings=Sum('bookings'),
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(route_ids=None):
+        """Повний перерахунок підсумків (усіх або вказаних маршрутів). Повертає кількість рядків."""
+        bookings = Booking.objects.order_by()
+        rollups = BookingDailyRollup.objects.all()
+        if route_ids:
+            bookings = bookings.filter(route_id__in=route_ids)
+            rollups = rollups.filter(route_id__in=route_ids)
+        rollups.delete()
+
+        rows = bookings.values('route', 'route__carrier', 'trip_date', 'status').annotate(
+            total_revenue=Sum('total_price'), total_seats=Sum('seats_count'), total_bookings=Count('id'),
+        )
+        created = BookingDailyRollup.objects.bulk_create(
+            [
+                BookingDailyRollup(
+                    route_id=row['route'], carrier_id=row['route__carrier'], trip_date=row['trip_date'],
+                    status=row['status'], revenue=row['total_revenue'] or 0, seats=row['total_seats'] or 0,
+                    bookings=row['total_bookings'],
+                )
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+        return len(created)
+
+
+class BookingStatusService:
+    """
+    Зміна статусу бронювання з поверненням або повторним заняттям місць.
+    Сам перехід — умовний UPDATE зі старим статусом у WHERE: з двох паралельних
+    скасувань рядок змінить лише одне, і лише воно поверне місця в SeatInventory.
+    """
+
+    @classmethod
+    def change(cls, booking, status):
+        """
+        Повертає (змінено, помилка). (False, None) — бронювання вже має цей статус;
+        відновлення скасованого без вільних місць не змінює нічого і повертає помилку.
+        """
+        while True:
+            with transaction.atomic():
+                # Стан із БД, а не з пам'яті: об'єкт міг застаріти, поки користувач дивився на сторінку
+                booking.refresh_from_db(fields=['route', 'trip_date', 'status', 'total_price', 'seats_count',
+                                                'departure_order', 'arrival_order'])
+                previous = BookingRollupService.state(booking)
+                if booking.status == status:
+                    return False, None
+
+                if not Booking.objects.filter(pk=booking.pk, status=booking.status).update(status=status):
+                    # Статус щойно змінив паралельний запит — перечитуємо і пробуємо ще раз
+                    continue
+
+                if status == 'cancelled':
+                    SeatInventoryService.release(booking)
+                elif booking.status == 'cancelled' and not SeatInventoryService.reserve(booking):
+                    transaction.set_rollback(True)
+                    return False, f"Недостатньо вільних місць, щоб відновити замовлення №{booking.pk}."
+
+                booking.status = status
+                BookingRollupService.changed(previous, BookingRollupService.state(booking))
+            break
+
+        ManifestService.invalidate(booking.route_id, booking.trip_date)
+        invalidate_popular_directions()
+        invalidate_search_route(booking.route_id)
+        return True, None
+
+
+# Скільки секунд зберігати готовий маніфест; зміни бронювань скидають його раніше
+MANIFEST_CACHE_TTL = getattr(settings, 'MANIFEST_CACHE_TTL', 600)
+
+# Маршрут у відомості — ключ групи (атрибути id і title, як у Route в шаблоні)
+ManifestRoute = namedtuple('ManifestRoute', 'id title')
+STATUS_DISPLAY = dict(Booking.STATUS_CHOICES)
+
+
+class ManifestService:
+    """
+    Маніфест пасажирів перевізника на дату: бронювання, згруповані за маршрутом
+    і впорядковані за зупинкою посадки (Booking.departure_order).
+    Будується одним запитом і кешується (прості словники, без моделей) до зміни будь-якого бронювання
+    цього маршруту на цю дату чи імені/телефону його пасажира (версія на пару маршрут+дата,
+    див. booking/signals.py).
+    Версія живе в кеші Django, тож коректність між воркерами залежить від спільного кешу
+    (REDIS_URL, див. CACHES у config/settings.py): з LocMemCache інші процеси віддаватимуть
+    старий маніфест до MANIFEST_CACHE_TTL.
+    """
+
+    @staticmethod
+    def _version_key(route_id, trip_date):
+        return f"manifest_version:{route_id}:{trip_date}"
+
+    @classmethod
+    def invalidate(cls, route_id, trip_date):
+        key = cls._version_key(route_id, trip_date)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    @staticmethod
+    def route_ids(carrier, route_id=None):
+        route_ids = Route.objects.filter(carrier=carrier).values_list('id', flat=True)
+        if route_id is not None:
+            route_ids = route_ids.filter(pk=route_id)
+        return list(route_ids)
+
+    @classmethod
+    def invalidate_passenger(cls, passenger_id):
+        """Ім'я і телефон пасажира є в маніфестах усіх рейсів, на які він бронював."""
+        pairs = Booking.objects.filter(passenger_id=passenger_id).values_list('route_id', 'trip_date').distinct()
+        for route_id, trip_date in pairs:
+            cls.invalidate(route_id, trip_date)
+
+    @classmethod
+    def build(cls, carrier, trip_date, route_id=None):
+        """
+        {'grouped': {ManifestRoute: {'list': [рядок], 'total_seats', 'total_bookings'}},
+         'total_seats', 'total_bookings', 'total_money'}; рядок — словник (див. row)
+        """
+        route_ids = cls.route_ids(carrier, route_id)
+        versions = cache.get_many([cls._version_key(pk, trip_date) for pk in route_ids])
+        signature = ','.join(f"{pk}.{versions.get(cls._version_key(pk, trip_date), 0)}" for pk in route_ids)
+        key = f"manifest:{carrier.pk}:{trip_date}:{route_id or 'all'}:{md5(signature.encode()).hexdigest()}"
+
+        manifest = cache.get(key)
+        if manifest is None:
+            manifest = cls._collect(route_ids, trip_date)
+            cache.set(key, manifest, MANIFEST_CACHE_TTL)
+        return manifest
+
+    @staticmethod
+    def bookings(route_ids, date_from, date_to=None):
+        """
+        Значення бронювань маніфесту за дату (або діапазон дат) у порядку дата → маршрут → зупинка посадки.
+        Лише поля відомості, без моделей: у кеш потрапляють прості словники, а не Booking із пасажиром.
+        """
+        return Booking.objects.filter(
+            trip_date__gte=date_from,
+            trip_date__lte=date_to or date_from,
+            route_id__in=route_ids,
+        ).exclude(status='cancelled').order_by(
+            'trip_date', 'route_id', F('departure_order').asc(nulls_last=True), 'departure_point', 'id'
+        ).values(
+            'id', 'trip_date', 'route_id', 'seats_count', 'departure_point', 'arrival_point', 'status',
+            'total_price', route_title=F('route__title'), username=F('passenger__username'),
+            first_name=F('passenger__first_name'), last_name=F('passenger__last_name'),
+            phone=F('passenger__passenger_profile__phone'),
+        )
+
+    @staticmethod
+    def row(values):
+        """Рядок відомості: значення з bookings() плюс ім'я пасажира й назва статусу для показу."""
+        full_name = f"{values['first_name'] or ''} {values['last_name'] or ''}".strip()
+        values['passenger'] = full_name or values['username']
+        values['phone'] = values['phone'] or ''
+        values['status_display'] = STATUS_DISPLAY.get(values['status'], values['status'])
+        return values
+
+    @classmethod
+    def rows(cls, route_ids, date_from, date_to=None, chunk_size=None):
+        """Рядки відомості; chunk_size — читати серверним курсором (великі діапазони дат)."""
+        bookings = cls.bookings(route_ids, date_from, date_to)
+        for values in (bookings.iterator(chunk_size=chunk_size) if chunk_size else bookings):
+            yield cls.row(values)
+
+    @staticmethod
+    def group(rows):
+        manifest = {'grouped': {}, 'total_seats': 0, 'total_bookings': 0, 'total_money': 0}
+        for row in rows:
+            group = manifest['grouped'].setdefault(
+                ManifestRoute(row['route_id'], row['route_title']),
+                {'list': [], 'total_seats': 0, 'total_bookings': 0},
+            )
+            group['list'].append(row)
+            group['total_seats'] += row['seats_count']
+            group['total_bookings'] += 1
+
+            manifest['total_seats'] += row['seats_count']
+            manifest['total_bookings'] += 1
+            manifest['total_money'] += row['total_price']
+        return manifest
+
+    @classmethod
+    def _collect(cls, route_ids, trip_date):
+        return cls.group(cls.rows(route_ids, trip_date))
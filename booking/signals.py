@@ -0,0 +1,148 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from accounts.models import PassengerProfile
+from trips.context_processors import invalidate_popular_directions
+from trips.models import DistanceCache, Route
+from trips.search_cache import invalidate_search_route
+
+from .models import Booking, BookingDailyRollup, BookingSearchTerm
+from .search import BookingSearchService
+from .services import BookingRollupService, ManifestService
+from .utils import forget_distance, invalidate_distances
+
+
+@receiver([post_save, post_delete], sender=DistanceCache)
+def forget_cached_distance(sender, instance, created=False, **kwargs):
+    forget_distance(instance.city_from_id, instance.city_to_id)
+    if not created:
+        # Стару відстань могли запам'ятати й інші процеси; нову пару ще ніхто не бачив
+        invalidate_distances()
+
+
+# --- Денні підсумки, кеші й пошуковий індекс при збереженні бронювання ---
+
+# Поля стану для BookingDailyRollup (порядок — як у BookingRollupService.state) і для пошукового документа
+ROLLUP_FIELDS = ('route', 'trip_date', 'status', 'total_price', 'seats_count')
+SEARCH_BOOKING_FIELDS = ('passenger', 'carrier', 'departure_point', 'arrival_point')
+SEARCH_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=Booking)
+def remember_saved_state(sender, instance, **kwargs):
+    # Старий стан — з рядка під блокуванням (Booking.save виконується в транзакції), а не з пам'яті:
+    # об'єкт міг бути прочитаний до паралельної зміни, і підсумки розійшлися б із бронюваннями
+    instance._saved_row = None if instance.pk is None else Booking.objects.select_for_update().filter(
+        pk=instance.pk
+    ).values(*ROLLUP_FIELDS, *SEARCH_BOOKING_FIELDS).first()
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_state(sender, instance, created, update_fields=None, **kwargs):
+    previous_row = instance._saved_row
+    # Новий стан — старий рядок із записаними полями (update_fields пише лише частину)
+    row = dict(previous_row or {})
+    for name in (*ROLLUP_FIELDS, *SEARCH_BOOKING_FIELDS):
+        if previous_row is None or update_fields is None or name in update_fields:
+            row[name] = getattr(instance, Booking._meta.get_field(name).attname)
+
+    previous = tuple(previous_row[name] for name in ROLLUP_FIELDS) if previous_row else None
+    current = tuple(row[name] for name in ROLLUP_FIELDS)
+    carrier_id = instance.route.carrier_id if Booking.route.is_cached(instance) else None
+    BookingRollupService.changed(previous, current, carrier_id=carrier_id)
+
+    route_id, trip_date, status = current[:3]
+    if previous is None or previous[2] != status:
+        invalidate_popular_directions()
+
+    # Маніфест залежить від маршруту й дати — скидаємо і старі, і нові
+    ManifestService.invalidate(route_id, trip_date)
+    if previous is not None and previous[:2] != (route_id, trip_date):
+        ManifestService.invalidate(*previous[:2])
+
+    # Вільні місця у видачі пошуку
+    invalidate_search_route(route_id)
+    if previous is not None and previous[0] != route_id:
+        invalidate_search_route(previous[0])
+
+    # Зміна статусу (найчастіше збереження) документа не змінює — індекс не чіпаємо
+    if created or any(previous_row[name] != row[name] for name in SEARCH_BOOKING_FIELDS):
+        BookingSearchService.index(Booking.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_delete, sender=Booking)
+def remember_deleted_state(sender, instance, **kwargs):
+    # Об'єкт у пам'яті може бути застарілим — віднімаємо те, що справді лежить у БД
+    instance._rollup_state = Booking.objects.select_for_update().filter(pk=instance.pk).values_list(
+        *ROLLUP_FIELDS
+    ).first()
+
+
+@receiver(post_delete, sender=Booking)
+def remove_booking_rollup(sender, instance, **kwargs):
+    if instance._rollup_state is not None:
+        BookingRollupService.apply(instance._rollup_state, -1)
+        ManifestService.invalidate(*instance._rollup_state[:2])
+        invalidate_popular_directions()
+        invalidate_search_route(instance._rollup_state[0])
+
+
+# --- Копії Route.carrier у бронюваннях, пошуковому індексі й денних підсумках ---
+
+@receiver(pre_save, sender=Route)
+def remember_route_carrier(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and 'carrier' not in update_fields):
+        instance._saved_carrier_id = None
+    else:
+        instance._saved_carrier_id = sender.objects.filter(pk=instance.pk).values_list(
+            'carrier_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Route)
+def move_route_to_carrier(sender, instance, **kwargs):
+    # Маршрут передали іншому перевізнику (RouteAdmin): його бронювання, підсумки й зв'язки пошуку
+    # мають зникнути зі списку старого перевізника і з'явитися в новому
+    previous = getattr(instance, '_saved_carrier_id', None)
+    if previous is None or previous == instance.carrier_id:
+        return
+    with transaction.atomic():
+        Booking.objects.filter(route=instance).update(carrier_id=instance.carrier_id)
+        BookingSearchTerm.objects.filter(booking__route=instance).update(carrier_id=instance.carrier_id)
+        BookingDailyRollup.objects.filter(route=instance).update(carrier_id=instance.carrier_id)
+
+
+# --- Пошуковий індекс списку перевізника (booking/search.py) і маніфести з іменем/телефоном ---
+
+@receiver(pre_save, sender=get_user_model())
+def remember_passenger_names(sender, instance, update_fields=None, **kwargs):
+    # Вхід у систему зберігає лише last_login — тоді старі значення навіть не читаємо
+    if instance.pk is None or (update_fields is not None and not SEARCH_USER_FIELDS & set(update_fields)):
+        instance._saved_names = None
+    else:
+        instance._saved_names = sender.objects.filter(pk=instance.pk).values(*SEARCH_USER_FIELDS).first()
+
+
+@receiver(post_save, sender=get_user_model())
+def update_passenger_search(sender, instance, **kwargs):
+    # Документи залежать лише від логіну й імені: збереження без їх зміни бронювання не переіндексовує
+    previous = getattr(instance, '_saved_names', None)
+    if previous and any(previous[name] != getattr(instance, name) for name in SEARCH_USER_FIELDS):
+        BookingSearchService.index(Booking.objects.filter(passenger=instance))
+        ManifestService.invalidate_passenger(instance.pk)
+
+
+@receiver(pre_save, sender=PassengerProfile)
+def remember_passenger_phone(sender, instance, **kwargs):
+    instance._saved_phone = None if instance.pk is None else sender.objects.filter(
+        pk=instance.pk
+    ).values_list('phone', flat=True).first()
+
+
+@receiver(post_save, sender=PassengerProfile)
+def update_passenger_phone_search(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_saved_phone', None) != instance.phone:
+        BookingSearchService.index(Booking.objects.filter(passenger_id=instance.user_id))
+        ManifestService.invalidate_passenger(instance.user_id)
@@ -1,3 +1,660 @@
-from django.test import TestCase
+import csv
+import io
+import random
+import time as time_module
+import zipfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import CarrierProfile, PassengerProfile, TelegramNotification
+from city.models import City, Country
+from trips.models import DistanceCache, Route, RouteStop
+from trips.services import rebuild_route_segments
+
+from .models import Booking, BookingDailyRollup, SearchTerm, SeatInventory
+from .occupancy import LegOccupancy
+from .search import BookingSearchService
+from .services import BookingRollupService, BookingStatusService, ManifestService, SeatInventoryService
+from .utils import (
+    DISTANCE_VERSION_KEY, NEGATIVE_TTL, POSITIVE_TTL, distance_lru, get_cached_distance, get_stored_distances,
+)
+
+User = get_user_model()
+
+
+class BookingFixtureMixin:
+    """Маршрут Київ → Житомир → Рівне → Львів (ділянки 1, 2, 3) на найближчу середу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Україна", code="UA")
+        cls.cities = [
+            City.objects.create(name=name, country=country) for name in ("Київ", "Житомир", "Рівне", "Львів")
+        ]
+        cls.carrier = User.objects.create_user('carrier', is_carrier=True)
+        CarrierProfile.objects.create(user=cls.carrier, company_name="Автолюкс", contact_person="Іван",
+                                      phone='+380501234567', telegram_bot='555')
+        cls.passenger = User.objects.create_user('passenger', is_passenger=True,
+                                                 first_name="Олена", last_name="Коваль")
+        cls.route = Route.objects.create(carrier=cls.carrier, title="Київ — Львів", capacity=3)
+        for order, city in enumerate(cls.cities, start=1):
+            RouteStop.objects.create(route=cls.route, city=city, order=order, day_of_week=3,
+                                     departure_time=time(8 + order))
+        rebuild_route_segments(cls.route)
+
+        today = date.today()
+        cls.trip_date = today + timedelta(days=(2 - today.weekday()) % 7 or 7)
+
+    def book(self, start=0, end=3, seats=1, status='confirmed'):
+        """Бронювання між містами cities[start] і cities[end] — так, як його створює MakeBookingView."""
+        booking = Booking(
+            passenger=self.passenger, route=self.route, trip_date=self.trip_date, seats_count=seats,
+            status=status, departure_point=self.cities[start].name, arrival_point=self.cities[end].name,
+            departure_city=self.cities[start], arrival_city=self.cities[end], total_price=Decimal('100.00') * seats,
+        )
+        booking.departure_order, booking.arrival_order = SeatInventoryService.stop_orders(
+            self.route.pk, self.cities[start].pk, self.cities[end].pk, self.trip_date
+        )
+        self.assertTrue(SeatInventoryService.reserve(booking))
+        booking.save()
+        return booking
+
+    def reserved(self):
+        return dict(SeatInventory.objects.filter(route=self.route, trip_date=self.trip_date)
+                    .values_list('segment', 'reserved'))
+
+
+class LegOccupancyTests(SimpleTestCase):
+    def test_partial_trips_share_a_seat(self):
+        occupancy = LegOccupancy([1, 2, 3, 4])
+        occupancy.add(1, 2, 1)
+        occupancy.add(2, 4, 1)
+        self.assertEqual(occupancy.max_load(1, 4), 1)
+        self.assertEqual(occupancy.free_seats(1, 1, 2), 0)
+        self.assertEqual(occupancy.free_seats(2, 1, 4), 1)
+
+    def test_initial_loads_and_gaps_in_orders(self):
+        # Порядки зупинок не обов'язково йдуть підряд; ділянка останньої зупинки не існує
+        occupancy = LegOccupancy([10, 30, 20, 40], {10: 2, 20: 5, 30: 1, 40: 9})
+        self.assertEqual(occupancy.max_load(10, 20), 2)
+        self.assertEqual(occupancy.max_load(20, 40), 5)
+        self.assertEqual(occupancy.max_load(30, 40), 1)
+        self.assertEqual(occupancy.free_seats(4, 10, 40), 0)
+
+    def test_release_and_empty_ranges(self):
+        occupancy = LegOccupancy([1, 2, 3])
+        occupancy.add(1, 3, 2)
+        occupancy.add(1, 3, -2)
+        self.assertEqual(occupancy.max_load(1, 3), 0)
+        self.assertEqual(occupancy.max_load(2, 2), 0)
+        self.assertEqual(LegOccupancy([1]).max_load(1, 2), 0)
+
+    def test_matches_per_leg_counting(self):
+        rng = random.Random(7)
+        orders = sorted(rng.sample(range(1, 200), 40))
+        loads = {order: rng.randint(0, 5) for order in orders}
+        occupancy = LegOccupancy(orders, loads)
+        expected = {order: loads[order] for order in orders[:-1]}
+
+        for _ in range(500):
+            start, end = sorted(rng.sample(orders, 2))
+            if rng.random() < 0.5:
+                seats = rng.randint(-2, 3)
+                occupancy.add(start, end, seats)
+                for order in expected:
+                    if start <= order < end:
+                        expected[order] += seats
+            else:
+                self.assertEqual(occupancy.max_load(start, end),
+                                 max(load for order, load in expected.items() if start <= order < end))
+
+
+class SeatInventoryServiceTests(BookingFixtureMixin, TestCase):
+    def test_reserve_takes_only_travelled_legs(self):
+        self.book(start=1, end=3, seats=2)
+        self.assertEqual(self.reserved(), {2: 2, 3: 2})
+
+    def test_reserve_refuses_when_any_leg_is_full(self):
+        self.book(start=0, end=2, seats=3)
+        booking = Booking(route=self.route, trip_date=self.trip_date, seats_count=1,
+                          departure_order=2, arrival_order=4)
+        self.assertFalse(SeatInventoryService.reserve(booking))
+        # Невдала спроба відкочується повністю — і рядок, і збільшення на вільній ділянці 3
+        self.assertEqual(self.reserved(), {1: 3, 2: 3})
+
+    def test_non_overlapping_legs_share_seats(self):
+        self.book(start=0, end=1, seats=3)
+        self.book(start=1, end=3, seats=3)
+        self.assertEqual(self.reserved(), {1: 3, 2: 3, 3: 3})
+
+    def test_free_seats_between_cities(self):
+        self.book(start=1, end=2, seats=2)
+        free = SeatInventoryService.free_seats([self.route], self.trip_date, self.cities[0].pk, self.cities[3].pk)
+        self.assertEqual(free, {self.route.pk: 1})
+        free = SeatInventoryService.free_seats([self.route], self.trip_date, self.cities[2].pk, self.cities[3].pk)
+        self.assertEqual(free, {self.route.pk: 3})
+
+    def test_free_seats_follow_capacity_of_the_date(self):
+        self.book(start=1, end=2, seats=2)
+        single = self.book(start=1, end=2, seats=1)
+        # Місткість зменшили нижче проданого: на цю дату ділянка 2 лишається на 3 місця
+        self.route.capacity = 1
+        self.route.save()
+        SeatInventoryService.sync_capacity(self.route)
+        BookingStatusService.change(single, 'cancelled')
+
+        def free(start, end):
+            return SeatInventoryService.free_seats([self.route], self.trip_date, self.cities[start].pk,
+                                                   self.cities[end].pk)[self.route.pk]
+
+        self.assertEqual((free(1, 2), free(0, 1), free(0, 3)), (1, 1, 1))
+        self.book(start=0, end=2, seats=1)
+        self.assertEqual((free(1, 2), free(0, 1), free(2, 3)), (0, 0, 1))
+        booking = Booking(route=self.route, trip_date=self.trip_date, seats_count=1,
+                          departure_order=2, arrival_order=3)
+        self.assertFalse(SeatInventoryService.reserve(booking))
+
+
+class BookingStatusServiceTests(BookingFixtureMixin, TestCase):
+    def rollup(self, status):
+        return BookingDailyRollup.objects.filter(route=self.route, trip_date=self.trip_date, status=status) \
+            .values_list('bookings', 'seats').first()
+
+    def test_concurrent_cancels_release_seats_once(self):
+        self.book(seats=1)
+        self.book(seats=2)
+        # Два запити прочитали бронювання ще до скасування
+        first = Booking.objects.get(seats_count=1)
+        second = Booking.objects.get(pk=first.pk)
+
+        self.assertEqual(BookingStatusService.change(first, 'cancelled'), (True, None))
+        self.assertEqual(BookingStatusService.change(second, 'cancelled'), (False, None))
+
+        # Повторне повернення місця звільнило б чуже місце бронювання на 2 пасажири
+        self.assertEqual(self.reserved(), {1: 2, 2: 2, 3: 2})
+        self.assertEqual(self.rollup('cancelled'), (1, 1))
+        self.assertEqual(self.rollup('confirmed'), (1, 2))
+
+    def test_cancel_view_twice_releases_once(self):
+        booking = self.book(seats=2)
+        self.client.force_login(self.passenger)
+        url = reverse('cancel-booking', args=[booking.pk])
+        self.client.post(url)
+        self.client.post(url)
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'cancelled')
+        self.assertEqual(self.reserved(), {1: 0, 2: 0, 3: 0})
+
+    def test_restore_reserves_seats_again(self):
+        booking = self.book(seats=2)
+        BookingStatusService.change(booking, 'cancelled')
+        self.assertEqual(BookingStatusService.change(booking, 'pending'), (True, None))
+        self.assertEqual(self.reserved(), {1: 2, 2: 2, 3: 2})
+        self.assertEqual(self.rollup('pending'), (1, 2))
+        self.assertEqual(self.rollup('cancelled'), (0, 0))
+
+    def test_restore_without_free_seats_keeps_cancelled(self):
+        booking = self.book(seats=2)
+        BookingStatusService.change(booking, 'cancelled')
+        self.book(start=1, end=2, seats=2)
+
+        changed, error = BookingStatusService.change(booking, 'confirmed')
+        self.assertFalse(changed)
+        self.assertIn(str(booking.pk), error)
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'cancelled')
+        self.assertEqual(self.reserved(), {1: 0, 2: 2, 3: 0})
+
+    def test_carrier_status_change_between_active_statuses_keeps_seats(self):
+        booking = self.book(seats=1, status='pending')
+        self.client.force_login(self.carrier)
+        self.client.post(reverse('carrier-bookings'), {'booking_id': booking.pk, 'status': 'confirmed'})
+
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'confirmed')
+        self.assertEqual(self.reserved(), {1: 1, 2: 1, 3: 1})
+
+
+class BookingRollupTests(BookingFixtureMixin, TestCase):
+    def assertRollupsMatchBookings(self):
+        def rollups():
+            return {
+                row[:3]: row[3:] for row in BookingDailyRollup.objects.filter(bookings__gt=0).values_list(
+                    'route_id', 'trip_date', 'status', 'revenue', 'seats', 'bookings'
+                )
+            }
+        incremental = rollups()
+        BookingRollupService.rebuild()
+        self.assertEqual(incremental, rollups())
+
+    def test_stale_instances_do_not_drift_rollups(self):
+        booking = self.book(seats=2)
+        first = Booking.objects.get(pk=booking.pk)
+        second = Booking.objects.get(pk=booking.pk)
+
+        first.status = 'pending'
+        first.save()
+        # Другий об'єкт досі вважає бронювання підтвердженим і записує це разом із новою ціною
+        second.total_price = Decimal('150.00')
+        second.save()
+        self.assertRollupsMatchBookings()
+
+    def test_update_fields_keep_unsaved_values_out_of_rollups(self):
+        booking = self.book(seats=2)
+        booking.status = 'pending'
+        booking.seats_count = 3
+        booking.save(update_fields=['status'])
+        self.assertRollupsMatchBookings()
+
+    def test_delete_subtracts_stored_state(self):
+        booking = self.book(seats=2)
+        stale = Booking.objects.get(pk=booking.pk)
+        BookingStatusService.change(booking, 'cancelled')
+        stale.delete()
+        self.assertFalse(BookingDailyRollup.objects.filter(bookings__gt=0).exists())
+
+    def test_route_moved_to_another_carrier(self):
+        self.book(0, 3)
+        self.book(1, 2, status='pending')
+        other = User.objects.create_user('other', is_carrier=True)
+        self.route.carrier = other
+        self.route.save()
+
+        self.assertEqual(set(Booking.objects.values_list('carrier', flat=True)), {other.pk})
+        self.assertEqual(set(BookingDailyRollup.objects.values_list('carrier', flat=True)), {other.pk})
+        self.assertEqual(BookingRollupService.carrier_totals(self.carrier)['total_bookings'], None)
+        self.assertEqual(BookingRollupService.carrier_totals(other)['total_bookings'], 2)
+        self.assertEqual(BookingSearchService.filter(Booking.objects.all(), self.carrier, "олена").count(), 0)
+        self.assertEqual(BookingSearchService.filter(Booking.objects.all(), other, "олена").count(), 2)
+        self.assertRollupsMatchBookings()
+
+
+@override_settings(OSRM_URL='http://127.0.0.1:9')
+class MakeBookingViewTests(BookingFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for start, end, km in ((0, 3, 540), (1, 3, 400)):
+            DistanceCache.objects.create(city_from=cls.cities[start], city_to=cls.cities[end], distance_km=km)
+
+    def setUp(self):
+        self.client.force_login(self.passenger)
+        # Посилання з видачі пошуку Київ → Львів
+        self.url = reverse('make_booking', args=[self.route.pk]) + '?' + urlencode({
+            'start_city': "Київ", 'start_city_slug': self.cities[0].slug,
+            'end_city': "Львів", 'end_city_slug': self.cities[3].slug, 'date': self.trip_date.isoformat(),
+        })
+
+    def post(self, departure, arrival):
+        return self.client.post(self.url, {
+            'departure_point': departure, 'arrival_point': arrival,
+            'trip_date': self.trip_date.isoformat(), 'seats_count': 1,
+        })
+
+    def test_booking_from_search_link(self):
+        self.assertRedirects(self.post("Київ", "Львів"), reverse('passenger-bookings'))
+        booking = Booking.objects.get()
+        self.assertEqual((booking.departure_city, booking.arrival_city), (self.cities[0], self.cities[3]))
+        self.assertEqual(self.reserved(), {1: 1, 2: 1, 3: 1})
+        # Сповіщення перевізнику — у черзі, доставить send_notifications
+        self.assertEqual(TelegramNotification.objects.get().chat_id, '555')
+
+    def test_posted_point_wins_over_link(self):
+        self.assertRedirects(self.post("Житомир", "Львів"), reverse('passenger-bookings'))
+        booking = Booking.objects.get()
+        self.assertEqual((booking.departure_point, booking.departure_order), ("Житомир", 2))
+        self.assertEqual(self.reserved(), {2: 1, 3: 1})
+
+    def test_unknown_city_is_a_form_error(self):
+        response = self.post("Житомирська", "Львів")
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'departure_point',
+                             "Місто не знайдено — оберіть його з підказок пошуку.")
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(self.reserved(), {})
+
+
+class BookingSearchTests(BookingFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.profile = PassengerProfile.objects.create(user=cls.passenger, phone='+38 (050) 123-45-67')
+
+    def setUp(self):
+        self.booking = self.book(0, 3)
+
+    def found(self, query, carrier=None):
+        return list(BookingSearchService.filter(Booking.objects.all(), carrier or self.carrier, query))
+
+    def terms(self):
+        return set(SearchTerm.objects.values_list('value', flat=True))
+
+    def test_filter_by_each_field(self):
+        for query in ("passenger", "Олена", "КОВАЛЬ", "олена коваль", "050 123", "380501234567", "львів",
+                      "Київ", "ки"):
+            self.assertEqual(self.found(query), [self.booking], query)
+        for query in ("Марія", "050 999", "рівне", "коваль рівне"):
+            self.assertEqual(self.found(query), [], query)
+        # Зв'язки — лише бронювань цього перевізника
+        self.assertEqual(self.found("олена", carrier=self.passenger), [])
+
+    def test_rename_reindexes_and_prunes_old_term(self):
+        self.passenger.first_name = "Марія"
+        self.passenger.save()
+        self.assertEqual(self.found("марія"), [self.booking])
+        self.assertEqual(self.found("олена"), [])
+        self.assertNotIn("олена коваль", self.terms())
+
+    def test_unrelated_user_saves_do_not_reindex(self):
+        with mock.patch.object(BookingSearchService, 'index') as index:
+            self.passenger.save(update_fields=['last_login'])
+            self.passenger.email = 'olena@example.com'
+            self.passenger.save()
+            self.profile.save()
+        index.assert_not_called()
+
+    def test_phone_change_reindexes(self):
+        self.profile.phone = '+380679998877'
+        self.profile.save()
+        self.assertEqual(self.found("0679998877"), [self.booking])
+        self.assertEqual(self.found("0501234567"), [])
+        self.assertNotIn("380501234567", self.terms())
+
+    def test_term_shared_with_another_booking_is_kept(self):
+        other = self.book(1, 3)
+        self.booking.departure_point = "Бориспіль"
+        self.booking.save()
+        self.assertEqual(self.found("київ"), [])
+        self.assertEqual(self.found("бориспіль"), [self.booking])
+        # «житомир» — терміну іншого бронювання ця зміна не торкнулася, «київ» більше нікому не потрібен
+        self.assertEqual(self.found("житомир"), [other])
+        self.assertNotIn("київ", self.terms())
+
+    def test_rebuild_matches_incremental_index(self):
+        self.book(1, 2)
+        self.passenger.last_name = "Шевченко"
+        self.passenger.save()
+        expected = self.terms(), self.found("шевченко")
+        self.assertEqual(BookingSearchService.rebuild([self.carrier.pk]), 2)
+        self.assertEqual((self.terms(), self.found("шевченко")), expected)
+
+
+@override_settings(DISTANCE_CACHE_ALIAS='default')
+class DistanceCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Україна", code="UA")
+        cls.kyiv = City.objects.create(name="Київ", country=country, latitude=50.45, longitude=30.52)
+        cls.lviv = City.objects.create(name="Львів", country=country, latitude=49.84, longitude=24.03)
+
+    def setUp(self):
+        # LRU живе в процесі між тестами, а id міст після відкату транзакції можуть повторитися
+        cache.clear()
+        distance_lru.clear()
+        osrm = mock.patch('booking.utils.get_osm_road_distance', return_value=None)
+        self.osrm = osrm.start()
+        self.addCleanup(osrm.stop)
+
+    def later(self, seconds):
+        return mock.patch('booking.utils.time.monotonic', return_value=time_module.monotonic() + seconds)
+
+    def test_stored_distance_is_read_once(self):
+        DistanceCache.objects.create(city_from=self.kyiv, city_to=self.lviv, distance_km=Decimal('540.30'))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('540.30'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('540.30'))
+            self.assertEqual(get_stored_distances([(self.kyiv.pk, self.lviv.pk)]),
+                             {(self.kyiv.pk, self.lviv.pk): Decimal('540.30')})
+        # Другий рівень (кеш Django) переживає очищення LRU процесу
+        distance_lru.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('540.30'))
+        self.osrm.assert_not_called()
+
+    def test_symmetric_uses_reverse_pair(self):
+        DistanceCache.objects.create(city_from=self.lviv, city_to=self.kyiv, distance_km=Decimal('541.00'))
+        self.assertEqual(get_cached_distance(self.kyiv, self.lviv, symmetric=True), Decimal('541.00'))
+        self.assertIsNone(get_cached_distance(self.kyiv, self.lviv))
+        self.osrm.assert_called_once()
+
+    def test_osrm_result_is_stored(self):
+        self.osrm.return_value = 538.7
+        self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('538.7'))
+        self.assertEqual(DistanceCache.objects.get(city_from=self.kyiv, city_to=self.lviv).distance_km,
+                         Decimal('538.7'))
+        self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('538.7'))
+        self.osrm.assert_called_once()
+
+    def test_negative_result_expires(self):
+        self.assertIsNone(get_cached_distance(self.kyiv, self.lviv))
+        self.assertIsNone(get_cached_distance(self.kyiv, self.lviv))
+        self.assertEqual(self.osrm.call_count, 1)
+
+        self.osrm.return_value = 538.7
+        cache.clear()  # запис другого рівня теж живе NEGATIVE_TTL — тут лише LRU рахує час
+        with self.later(NEGATIVE_TTL + 1):
+            self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('538.7'))
+        self.assertEqual(self.osrm.call_count, 2)
+
+    def test_row_change_in_this_process_is_seen_at_once(self):
+        row = DistanceCache.objects.create(city_from=self.kyiv, city_to=self.lviv, distance_km=Decimal('600.00'))
+        get_cached_distance(self.kyiv, self.lviv)
+        row.distance_km = Decimal('540.30')
+        row.save()
+        self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('540.30'))
+        row.delete()
+        self.assertIsNone(get_cached_distance(self.kyiv, self.lviv))
+
+    def test_bulk_change_from_another_process_is_picked_up(self):
+        DistanceCache.objects.create(city_from=self.kyiv, city_to=self.lviv, distance_km=Decimal('600.00'),
+                                     is_estimate=True)
+        get_cached_distance(self.kyiv, self.lviv)
+        # Як build_distance_cache в іншому процесі: запис без сигналів і підняття версії в спільному кеші
+        DistanceCache.objects.filter(city_from=self.kyiv).update(distance_km=Decimal('540.30'), is_estimate=False)
+        cache.incr(DISTANCE_VERSION_KEY) if cache.get(DISTANCE_VERSION_KEY) else cache.set(DISTANCE_VERSION_KEY, 1)
+
+        self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('600.00'))
+        with mock.patch('booking.utils.VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('540.30'))
+
+    def test_positive_entry_expires_without_version_bump(self):
+        DistanceCache.objects.create(city_from=self.kyiv, city_to=self.lviv, distance_km=Decimal('600.00'))
+        get_cached_distance(self.kyiv, self.lviv)
+        DistanceCache.objects.filter(city_from=self.kyiv).update(distance_km=Decimal('540.30'))
+        cache.clear()
+        with self.later(POSITIVE_TTL + 1):
+            self.assertEqual(get_cached_distance(self.kyiv, self.lviv), Decimal('540.30'))
+
+
+class RouteStopEditTests(BookingFixtureMixin, TestCase):
+    """Редагування зупинок маршруту з майбутніми бронюваннями (форма маршруту перевізника)."""
+
+    def setUp(self):
+        self.client.force_login(self.carrier)
+        self.stops = list(self.route.stops.order_by('order'))
+
+    def edit_stops(self, rows, deleted=()):
+        """rows — новий порядок на сторінці: RouteStop або місто (нова зупинка); deleted — зупинки на видалення."""
+        existing = [row for row in rows if isinstance(row, RouteStop)] + list(deleted)
+        added = [row for row in rows if isinstance(row, City)]
+        data = {
+            'title': self.route.title, 'is_active': 'on', 'is_passenger': 'on', 'capacity': self.route.capacity,
+            'min_trip_price': '0', 'price_per_km': '0', 'min_parcel_price': '0', 'price_per_kg': '0',
+            'boost_days': '0', 'stops-TOTAL_FORMS': len(existing) + len(added),
+            'stops-INITIAL_FORMS': len(existing), 'stops-MIN_NUM_FORMS': 0, 'stops-MAX_NUM_FORMS': 1000,
+        }
+        for index, row in enumerate(existing + added):
+            stop = row if isinstance(row, RouteStop) else None
+            prefix = f'stops-{index}-'
+            data.update({
+                prefix + 'city': (stop.city_id if stop else row.pk), prefix + 'day_of_week': 3,
+                prefix + 'departure_time': '12:00' if stop is None else stop.departure_time.strftime('%H:%M'),
+                prefix + 'order': rows.index(row) + 1 if row in rows else '',
+            })
+            if stop:
+                data[prefix + 'id'] = stop.pk
+            if row in deleted:
+                data[prefix + 'DELETE'] = 'on'
+        return self.client.post(reverse('route_edit', args=[self.route.pk]), data)
+
+    def orders(self, booking):
+        booking.refresh_from_db()
+        return booking.departure_order, booking.arrival_order
+
+    def test_inserted_stop_shifts_bookings_and_legs(self):
+        first, second = self.book(0, 2), self.book(2, 3, seats=2)
+        novograd = City.objects.create(name="Новоград", country=self.cities[0].country)
+        kyiv, zhytomyr, rivne, lviv = self.stops
+
+        self.assertRedirects(self.edit_stops([kyiv, zhytomyr, novograd, rivne, lviv]), reverse('profile'),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.orders(first), (1, 4))
+        self.assertEqual(self.orders(second), (4, 5))
+        self.assertEqual(self.reserved(), {1: 1, 2: 1, 3: 1, 4: 2})
+        self.assertEqual(SeatInventoryService.free_seats([self.route], self.trip_date, novograd.pk, self.cities[3].pk),
+                         {self.route.pk: 1})
+
+    def test_deleting_unused_stop_merges_legs(self):
+        first, second = self.book(0, 2), self.book(2, 3)
+        kyiv, zhytomyr, rivne, lviv = self.stops
+
+        self.edit_stops([kyiv, rivne, lviv], deleted=[zhytomyr])
+        self.assertEqual((self.orders(first), self.orders(second)), ((1, 2), (2, 3)))
+        self.assertEqual(self.reserved(), {1: 1, 2: 1})
+
+    def test_deleting_booked_stop_is_refused(self):
+        booking = self.book(1, 3)
+        kyiv, zhytomyr, rivne, lviv = self.stops
+
+        response = self.edit_stops([kyiv, rivne, lviv], deleted=[zhytomyr])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f"замовлення №{booking.pk}", str(list(response.context['messages'])[0]))
+        self.assertEqual(self.route.stops.count(), 4)
+        self.assertEqual(self.orders(booking), (2, 4))
+        self.assertEqual(self.reserved(), {2: 1, 3: 1})
+
+    def test_reorder_behind_arrival_is_refused(self):
+        booking = self.book(0, 1)
+        kyiv, zhytomyr, rivne, lviv = self.stops
+
+        response = self.edit_stops([zhytomyr, kyiv, rivne, lviv])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.orders(booking), (1, 2))
+        self.assertEqual(list(self.route.stops.order_by('order')), self.stops)
+
+    def test_cancelled_booking_does_not_block(self):
+        BookingStatusService.change(self.book(1, 3), 'cancelled')
+        kyiv, zhytomyr, rivne, lviv = self.stops
+
+        self.edit_stops([kyiv, rivne, lviv], deleted=[zhytomyr])
+        self.assertEqual(self.route.stops.count(), 3)
+        self.assertEqual(self.reserved(), {})
+
+
+class ManifestTests(BookingFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.short_route = Route.objects.create(carrier=cls.carrier, title="Київ — Рівне", capacity=3)
+        for order, city in enumerate(cls.cities[:3], start=1):
+            RouteStop.objects.create(route=cls.short_route, city=city, order=order, day_of_week=3,
+                                     departure_time=time(8 + order))
+        cls.other = User.objects.create_user('other', is_passenger=True)
+        PassengerProfile.objects.create(user=cls.passenger, phone='+380671112233')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.carrier)
+
+    def build(self, route_id=None):
+        return ManifestService.build(self.carrier, self.trip_date, route_id)
+
+    def test_grouped_by_route_and_boarding_stop(self):
+        lviv = self.book(2, 3)
+        kyiv = self.book(0, 3, seats=2)
+        short = Booking.objects.create(
+            passenger=self.other, route=self.short_route, trip_date=self.trip_date, seats_count=1,
+            departure_point="Житомир", arrival_point="Рівне", departure_order=2, arrival_order=3,
+            total_price=Decimal('80.00'),
+        )
+        self.book(1, 2, status='cancelled')
+
+        manifest = self.build()
+        grouped = {route.title: [row['id'] for row in data['list']] for route, data in manifest['grouped'].items()}
+        self.assertEqual(grouped, {"Київ — Львів": [kyiv.pk, lviv.pk], "Київ — Рівне": [short.pk]})
+        self.assertEqual((manifest['total_bookings'], manifest['total_seats'], manifest['total_money']),
+                         (3, 4, Decimal('380.00')))
+
+        row = manifest['grouped'][(self.route.pk, self.route.title)]['list'][0]
+        self.assertEqual((row['passenger'], row['phone'], row['status_display']),
+                         ("Олена Коваль", '+380671112233', "Підтверджено"))
+        # Пасажир без профілю й імені — логін і порожній телефон
+        row = manifest['grouped'][(self.short_route.pk, self.short_route.title)]['list'][0]
+        self.assertEqual((row['passenger'], row['phone']), ('other', ''))
+        self.assertEqual(list(self.build(self.short_route.pk)['grouped']), [(self.short_route.pk, "Київ — Рівне")])
+
+    def test_cached_manifest_follows_bookings_and_passenger_edits(self):
+        booking = self.book()
+        self.build()
+        with self.assertNumQueries(1):
+            # Лише id маршрутів перевізника; сам маніфест — з кешу
+            self.build()
+
+        self.passenger.first_name = "Ольга"
+        self.passenger.save()
+        self.passenger.passenger_profile.phone = '+380500000000'
+        self.passenger.passenger_profile.save()
+        row = next(iter(self.build()['grouped'].values()))['list'][0]
+        self.assertEqual((row['passenger'], row['phone']), ("Ольга Коваль", '+380500000000'))
+
+        BookingStatusService.change(booking, 'cancelled')
+        self.assertEqual(self.build()['grouped'], {})
+
+    def test_page_and_pdf(self):
+        self.book()
+        params = {'date': f"{self.trip_date:%Y-%m-%d}"}
+        response = self.client.get(reverse('passenger_manifest'), params)
+        self.assertContains(response, "Олена Коваль")
+        self.assertContains(response, "+380671112233")
+
+        response = self.client.get(reverse('passenger_manifest_pdf'), params)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_zip_export_has_csv_and_pdf_per_day(self):
+        self.book()
+        self.book(1, 2, status='cancelled')
+        next_week = self.trip_date + timedelta(days=7)
+        Booking.objects.create(
+            passenger=self.other, route=self.route, trip_date=next_week, seats_count=2,
+            departure_point="Київ", arrival_point="Рівне", total_price=Decimal('200.00'),
+        )
+
+        response = self.client.get(reverse('passenger_manifest_export'), {
+            'date_from': f"{self.trip_date:%Y-%m-%d}", 'date_to': f"{next_week:%Y-%m-%d}",
+        })
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        names = [f"manifest_{day:%Y-%m-%d}.{ext}" for day in (self.trip_date, next_week) for ext in ('csv', 'pdf')]
+        self.assertEqual(archive.namelist(), names)
+        self.assertTrue(archive.read(names[1]).startswith(b'%PDF'))
+
+        rows = list(csv.reader(io.StringIO(archive.read(names[0]).decode('utf-8-sig'))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][2:], ["Київ — Львів", str(Booking.objects.filter(status='confirmed').get().pk),
+                                       "Олена Коваль", '+380671112233', '1', "Київ", "Львів", "Підтверджено",
+                                       '100.00'])
+        rows = list(csv.reader(io.StringIO(archive.read(names[2]).decode('utf-8-sig'))))
+        self.assertEqual(rows[1][4:7], ['other', '', '2'])
+
+        response = self.client.get(reverse('passenger_manifest_export'), {
+            'date_from': f"{self.trip_date:%Y-%m-%d}", 'date_to': f"{self.trip_date:%Y-%m-%d}", 'format': 'csv',
+        })
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), names[:1])
@@ -9,10 +9,13 @@ from .views import (
     CancelBookingView,
     PassengerManifestView,
     ExportPassengerPDFView,
+    ExportManifestArchiveView,
+    search_cache_stats_view,
 )
 
 urlpatterns = [
     path('', BookingRouteListView.as_view(), name='booking_route_list'),
+    path('search-cache/stats/', search_cache_stats_view, name='search_cache_stats'),
     path('reserve/<int:route_id>/', MakeBookingView.as_view(), name='make_booking'),
     path('bookings/', CarrierBookingListView.as_view(), name='carrier-bookings'),
     path('my-bookings/', PassengerBookingListView.as_view(), name='passenger-bookings'),
@@ -20,6 +23,8 @@ urlpatterns = [
 
     # Новий шлях для відомості (маніфесту)
     path('manifest/', PassengerManifestView.as_view(), name='passenger_manifest'),
+    path('manifest/pdf/', ExportPassengerPDFView.as_view(), name='passenger_manifest_pdf'),
+    path('manifest/export/', ExportManifestArchiveView.as_view(), name='passenger_manifest_export'),
 
     path('api/get-route-data/',utils.get_osm_road_distance, name='get_route_data'),
 
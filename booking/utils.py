@@ -1,10 +1,65 @@
 import requests
 import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models import Q
 
 from trips.models import DistanceCache
 
 logger = logging.getLogger(__name__)
 
+OSRM_HEADERS = {'User-Agent': 'UkrBusApp/1.0 (admin@ukrbus.pp.ua)'}
+
+# Середній коефіцієнт "дорога / пряма" для оцінки відстані без маршрутизатора
+ROAD_FACTOR = 1.25
+
+
+def haversine_km(city_a, city_b, road_factor=ROAD_FACTOR):
+    """Оцінка відстані по дорогах: відстань по великому колу, помножена на road_factor"""
+    if None in (city_a.latitude, city_a.longitude, city_b.latitude, city_b.longitude):
+        return None
+
+    lat1, lon1, lat2, lon2 = map(math.radians, (city_a.latitude, city_a.longitude, city_b.latitude, city_b.longitude))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return round(2 * 6371.0 * math.asin(math.sqrt(h)) * road_factor, 1)
+
+
+def get_osrm_table(sources, destinations, base_url=None, session=None, timeout=30):
+    """
+    Матриця відстаней (км) через OSRM table endpoint за один HTTP-запит.
+    sources / destinations — списки міст з координатами.
+    Повертає {(source.id, destination.id): km}; None у матриці означає, що маршруту немає.
+    Помилки мережі та формату відповіді прокидаються далі — їх обробляє викликач.
+    """
+    coords_cities = list({c.id: c for c in list(sources) + list(destinations)}.values())
+    position = {c.id: i for i, c in enumerate(coords_cities)}
+    coords = ";".join(f"{c.longitude},{c.latitude}" for c in coords_cities)
+
+    url = f"{(base_url or settings.OSRM_URL).rstrip('/')}/table/v1/driving/{coords}"
+    params = {
+        'annotations': 'distance',
+        'sources': ";".join(str(position[c.id]) for c in sources),
+        'destinations': ";".join(str(position[c.id]) for c in destinations),
+    }
+
+    response = (session or requests).get(url, params=params, timeout=timeout, headers=OSRM_HEADERS)
+    response.raise_for_status()
+    data = response.json()
+    if data.get('code') != 'Ok':
+        raise ValueError(f"OSRM table error: {data.get('code')} {data.get('message', '')}")
+
+    result = {}
+    for source, row in zip(sources, data['distances']):
+        for destination, meters in zip(destinations, row):
+            result[(source.id, destination.id)] = round(meters / 1000, 1) if meters is not None else None
+    return result
+
 def get_osm_road_distance(city_a, city_b):
     """Отримує реальну відстань по дорогах через OSRM API з обробкою помилок"""
     if not (city_a.latitude and city_a.longitude and city_b.latitude and city_b.longitude):
@@ -12,12 +67,10 @@ def get_osm_road_distance(city_a, city_b):
 
     # OSRM використовує формат (longitude, latitude)
     coords = f"{city_a.longitude},{city_a.latitude};{city_b.longitude},{city_b.latitude}"
-    url = f"http://router.project-osrm.org/route/v1/driving/{coords}?overview=false"
-
-    headers = {'User-Agent': 'UkrBusApp/1.0 (admin@ukrbus.pp.ua)'}
+    url = f"{settings.OSRM_URL.rstrip('/')}/route/v1/driving/{coords}?overview=false"
 
     try:
-        response = requests.get(url, timeout=5, headers=headers)
+        response = requests.get(url, timeout=5, headers=OSRM_HEADERS)
         response.raise_for_status()  # Перевірка на помилки HTTP (4xx, 5xx)
         data = response.json()
 
@@ -34,17 +87,210 @@ def get_osm_road_distance(city_a, city_b):
     return None
 
 
-def get_cached_distance(city_a, city_b):
-    # Шукаємо в базі
-    cached = DistanceCache.objects.filter(city_from=city_a, city_to=city_b).first()
-    if cached:
-        return cached.distance_km
+class DistanceLRU:
+    """
+    Обмежений LRU-кеш відстаней у пам'яті процесу, ключ — (city_from_id, city_to_id).
+    Значення None — негативний результат (OSRM не відповів), зберігається з коротким TTL.
+    version — версія відстаней зі спільного кешу, для якої зібрано вміст (див. check_version).
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.version = None
+        self._checked_at = None
+
+    def check_version(self, interval):
+        """
+        Звіряє версію зі спільним кешем не частіше ніж раз на interval секунд: DistanceCache
+        переписують і інші процеси (build_distance_cache пише через bulk_create, без сигналів).
+        Якщо версія змінилася — вміст очищується. Повертає актуальну версію.
+        """
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= interval:
+            version = cache.get(DISTANCE_VERSION_KEY, 0)
+            if version != self.version:
+                self.clear()
+                self.version = version
+            self._checked_at = now
+        return self.version
+
+    def get(self, key):
+        """Повертає (знайдено, значення)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+distance_lru = DistanceLRU(maxsize=getattr(settings, 'DISTANCE_LRU_SIZE', 4096))
+
+# Як довго не повторювати невдалий запит до OSRM для тієї ж пари (секунди)
+NEGATIVE_TTL = getattr(settings, 'DISTANCE_NEGATIVE_TTL', 300)
+# Скільки живе відома відстань у кешах: межа застарівання, якщо версію ніхто не підняв
+POSITIVE_TTL = getattr(settings, 'DISTANCE_POSITIVE_TTL', 3600)
+NEGATIVE = 'none'
+
+# Версія відстаней у кеші за замовчуванням (спільному для процесів); входить у ключі другого рівня
+DISTANCE_VERSION_KEY = 'distance_cache_version'
+# Як часто (секунд) процес звіряє свою версію з кешем
+VERSION_CHECK_INTERVAL = getattr(settings, 'DISTANCE_VERSION_CHECK_INTERVAL', 5)
+
+
+def _shared_cache():
+    """Другий рівень — кеш Django (settings.DISTANCE_CACHE_ALIAS), якщо налаштований."""
+    alias = getattr(settings, 'DISTANCE_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _cache_key(key):
+    return f"distance:{distance_lru.version}:{key[0]}:{key[1]}"
+
+
+def _ttl(value):
+    return NEGATIVE_TTL if value is None else POSITIVE_TTL
+
+
+def _lookup(key, shared):
+    found, value = distance_lru.get(key)
+    if found or shared is None:
+        return found, value
+
+    value = shared.get(_cache_key(key))
+    if value is None:
+        return False, None
+    value = None if value == NEGATIVE else Decimal(value)
+    distance_lru.set(key, value, ttl=_ttl(value))
+    return True, value
+
+
+def _remember(key, value, shared):
+    distance_lru.set(key, value, ttl=_ttl(value))
+    if shared is not None:
+        shared.set(_cache_key(key), NEGATIVE if value is None else str(value), _ttl(value))
+
+
+def forget_distance(city_from_id, city_to_id):
+    """Скидає пару з обох рівнів кешу цього процесу (після зміни запису DistanceCache)."""
+    key = (city_from_id, city_to_id)
+    distance_lru.discard(key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_cache_key(key))
+
+
+def invalidate_distances():
+    """
+    Скидає відстані в усіх процесах: піднімає версію в кеші (старі ключі другого рівня стають недосяжними,
+    LRU інших процесів очищуються при наступній звірці). Для масових змін DistanceCache без сигналів.
+    """
+    try:
+        cache.incr(DISTANCE_VERSION_KEY)
+    except ValueError:
+        cache.set(DISTANCE_VERSION_KEY, 1, None)
+    distance_lru.check_version(0)
+
+
+def get_cached_distance(city_a, city_b, symmetric=False):
+    """
+    Відстань між містами: LRU у пам'яті -> кеш Django -> DistanceCache -> OSRM.
+    symmetric=True дозволяє використати відстань у зворотному напрямку
+    (якщо перевізник вказав, що вона однакова — Route.symmetric_distance).
+    """
+    key = (city_a.pk, city_b.pk)
+    reverse_key = (city_b.pk, city_a.pk)
+    shared = _shared_cache()
+    distance_lru.check_version(VERSION_CHECK_INTERVAL)
+
+    found, value = _lookup(key, shared)
+    if value is not None:
+        return value
+    if symmetric:
+        found_reverse, reverse_value = _lookup(reverse_key, shared)
+        if reverse_value is not None:
+            return reverse_value
+        if found and found_reverse:
+            return None
+    elif found:
+        return None
+
+    # Шукаємо в базі (для симетричних маршрутів — в обидва боки одним запитом)
+    pairs = Q(city_from=city_a, city_to=city_b)
+    if symmetric:
+        pairs |= Q(city_from=city_b, city_to=city_a)
+    cached = {
+        (row.city_from_id, row.city_to_id): row.distance_km
+        for row in DistanceCache.objects.filter(pairs).only('city_from_id', 'city_to_id', 'distance_km')
+    }
+    if key in cached:
+        _remember(key, cached[key], shared)
+        return cached[key]
+    if reverse_key in cached:
+        _remember(reverse_key, cached[reverse_key], shared)
+        return cached[reverse_key]
+    if found:
+        # OSRM для цієї пари нещодавно не відповів — чекаємо завершення негативного TTL
+        return None
 
     # Якщо немає — запитуємо OSRM
     distance = get_osm_road_distance(city_a, city_b)  # Ваша стара функція
 
     if distance:
         # Зберігаємо в базу для наступного разу
-        DistanceCache.objects.create(city_from=city_a, city_to=city_b, distance_km=distance)
+        distance = Decimal(str(distance))
+        DistanceCache.objects.get_or_create(city_from=city_a, city_to=city_b, defaults={'distance_km': distance})
+    else:
+        distance = None
+
+    # Невдачу теж запам'ятовуємо (з коротким TTL), щоб не звертатися до OSRM на кожному запиті
+    _remember(key, distance, shared)
+    return distance
+
+
+def get_stored_distances(pairs):
+    """
+    Відстані для багатьох пар (city_from_id, city_to_id) лише з кешів і DistanceCache — без OSRM.
+    Пари, яких немає в пам'яті чи кеші Django, дочитуються з бази одним запитом.
+    Повертає {пара: Decimal} тільки для відомих відстаней.
+    """
+    shared = _shared_cache()
+    distance_lru.check_version(VERSION_CHECK_INTERVAL)
+    result, missing = {}, []
+    for key in set(pairs):
+        found, value = _lookup(key, shared)
+        if value is not None:
+            result[key] = value
+        elif not found:
+            missing.append(key)
 
-    return distance
\ No newline at end of file
+    if missing:
+        condition = Q()
+        for city_from, city_to in missing:
+            condition |= Q(city_from_id=city_from, city_to_id=city_to)
+        for row in DistanceCache.objects.filter(condition).only('city_from_id', 'city_to_id', 'distance_km'):
+            key = (row.city_from_id, row.city_to_id)
+            _remember(key, row.distance_km, shared)
+            result[key] = row.distance_km
+    return result
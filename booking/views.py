@@ -1,28 +1,40 @@
-import os
+import logging
 from datetime import datetime
+from urllib.parse import urlencode
+
 from accounts.utils import send_carrier_notification
-from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
 from django.db.models import (
-    Case, Exists, F, IntegerField, OuterRef,
-    Q, Subquery, Sum, Value, When
+    Case, Count, IntegerField,
+    Q, Sum, Value, When
 )
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
-from django.template.loader import get_template
-from django.urls import reverse_lazy
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.views import View
 from django.views.generic import CreateView, ListView
 
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
 from booking.forms import BookingForm, MakeBookingForm
+from booking.export import manifest_zip_chunks
 from booking.models import Booking
+from booking.pdf import FONT_PATH, manifest_pdf_chunks, register_fonts
+from booking.search import BookingSearchService
+from booking.services import BookingRollupService, BookingStatusService, ManifestService, SeatInventoryService
 from booking.utils import get_cached_distance
-from trips.models import City, Route, RouteStop
+from city.resolver import city_resolver
+from trips import pricing
+from trips.models import Route
+from trips.search_cache import SearchResultCache, search_cache_stats
+from trips.services import find_route_ids, prepare_route_cards, route_card_stops
+from ukrbus.pagination import KeysetPaginator
+
+logger = logging.getLogger(__name__)
 
 
 class BookingRouteListView(ListView):
@@ -38,29 +50,43 @@ class BookingRouteListView(ListView):
         if not start_city or not end_city:
             return Route.objects.none()
 
+        # Канонічні міста: slug з автодоповнення, інакше нормалізована назва
+        city_a = city_resolver.resolve(self.request.GET.get('start_city_slug'), start_city)
+        city_b = city_resolver.resolve(self.request.GET.get('end_city_slug'), end_city)
+        self.start_city_obj, self.end_city_obj = city_a, city_b
+
+        if not city_a or not city_b:
+            return Route.objects.none()
+
+        target_day = None
+        self.search_date = None
+        if date_str:
+            try:
+                self.search_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+                target_day = self.search_date.isoweekday()
+            except ValueError:
+                pass
+
+        # Готова видача за цим напрямком і датою. Кнопка бронювання відрізняється для перевізника,
+        # а розмітка schema.org містить абсолютну адресу — тому роль і хост теж у ключі
+        role = 'carrier' if getattr(self.request.user, 'is_carrier', False) else 'passenger'
+        self.search_cache = SearchResultCache(
+            city_a.pk, city_b.pk, self.search_date, variant=f"{role}:{self.request.get_host()}",
+        )
+        self.cached_results = self.search_cache.get()
+        if self.cached_results is not None:
+            self.is_nearby_dates = self.cached_results['is_nearby_dates']
+            # Картки вже відрендерені — маршрути з БД не потрібні
+            return Route.objects.none()
+
         now = timezone.now()
 
-        # Функція-помічник для виконання пошуку
+        # Функція-помічник для виконання пошуку по індексу сегментів (trips.RouteSegment)
         def perform_search(day=None):
-            queryset = Route.objects.filter(is_active=True).select_related('carrier').prefetch_related('stops__city')
-
-            # Фільтри для підзапитів
-            start_stop_filter = {'route': OuterRef('pk'), 'city__name__icontains': start_city}
-            if day:
-                start_stop_filter['day_of_week'] = day
-
-            start_stop_subquery = RouteStop.objects.filter(**start_stop_filter)
-            end_stop_subquery = RouteStop.objects.filter(route=OuterRef('pk'), city__name__icontains=end_city)
-
-            queryset = queryset.filter(
-                Exists(start_stop_subquery),
-                Exists(end_stop_subquery)
-            ).annotate(
-                start_order=Subquery(start_stop_subquery.values('order')[:1]),
-                end_order=Subquery(end_stop_subquery.values('order')[:1])
-            ).filter(
-                start_order__lt=F('end_order')
-            )
+            queryset = Route.objects.filter(
+                is_active=True,
+                pk__in=find_route_ids(city_a.pk, city_b.pk, day=day)
+            ).select_related('carrier__carrier_profile').prefetch_related(route_card_stops())
 
             return queryset.annotate(
                 is_active_top=Case(
@@ -68,51 +94,78 @@ class BookingRouteListView(ListView):
                     default=Value(0),
                     output_field=IntegerField(),
                 )
-            ).distinct().order_by('-is_active_top', '-top_until', '-id')
+            ).order_by('-is_active_top', '-top_until', '-id')
 
         # --- КРОК 1: Пошук на точну дату ---
-        target_day = None
-        if date_str:
-            try:
-                search_date = datetime.strptime(date_str, '%Y-%m-%d')
-                target_day = search_date.weekday() + 1
-            except ValueError:
-                pass
-
-        final_queryset = perform_search(day=target_day)
+        routes_list = list(perform_search(day=target_day))
         self.is_nearby_dates = False
 
         # --- КРОК 2: "М'який пошук", якщо на точну дату порожньо ---
-        if target_day and not final_queryset.exists():
-            final_queryset = perform_search(day=None)  # Шукаємо на будь-який день
-            if final_queryset.exists():
-                self.is_nearby_dates = True
+        if target_day and not routes_list:
+            routes_list = list(perform_search(day=None))  # Шукаємо на будь-який день
+            self.is_nearby_dates = bool(routes_list)
+        self.route_versions = self.search_cache.route_versions(routes_list)
 
         # --- РОЗРАХУНОК ВІДСТАНІ ТА ЦІНИ ---
-        city_a = City.objects.filter(name__icontains=start_city).first()
-        city_b = City.objects.filter(name__icontains=end_city).first()
-        distance = get_cached_distance(city_a, city_b) if city_a and city_b else None
-
-        routes_list = list(final_queryset)
+        # Не більше двох звернень до кешу: з урахуванням симетрії і без (Route.symmetric_distance)
+        distances = {}
         for route in routes_list:
-            route.calculated_distance = distance
-            # Логіка ціни (як у вас була)
-            p_km = float(route.price_per_km or 0)
-            m_trip = float(route.min_trip_price or 0)
-            if distance and p_km > 0:
-                route.final_price = max(float(distance) * p_km, m_trip)
-            else:
-                route.final_price = m_trip
+            if route.symmetric_distance not in distances:
+                distances[route.symmetric_distance] = get_cached_distance(
+                    city_a, city_b, symmetric=route.symmetric_distance
+                )
+            route.calculated_distance = distances[route.symmetric_distance]
 
-        return routes_list
+        # Ціни всієї видачі — одним пакетним розрахунком у копійках (trips/pricing.py)
+        prices = pricing.quote(routes_list, [route.calculated_distance for route in routes_list])
+        for route, price in zip(routes_list, prices):
+            route.final_price = price
+
+        # --- ВІЛЬНІ МІСЦЯ (лише для точної дати): два запити на всю видачу ---
+        if target_day and not self.is_nearby_dates:
+            free = SeatInventoryService.free_seats(routes_list, self.search_date, city_a.pk, city_b.pk)
+            for route in routes_list:
+                route.free_seats = free.get(route.pk)
+
+        # Дані для картки рахуються тут один раз, а не в шаблоні для кожного маршруту
+        return prepare_route_cards(routes_list)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['available_cities'] = City.objects.values_list('name', flat=True).distinct().order_by('name')
+        context['available_cities'] = city_resolver.choices()
+        context['start_city_obj'] = getattr(self, 'start_city_obj', None)
+        context['end_city_obj'] = getattr(self, 'end_city_obj', None)
         # Передаємо прапор у шаблон
         context['is_nearby_dates'] = getattr(self, 'is_nearby_dates', False)
+        context['search_date'] = getattr(self, 'search_date', None)
+
+        search_cache = getattr(self, 'search_cache', None)
+        if search_cache is not None and self.cached_results is not None:
+            context['results_html'] = mark_safe(self.cached_results['html'])
+            return context
+
+        start_city_obj, end_city_obj = context['start_city_obj'], context['end_city_obj']
+        if start_city_obj and end_city_obj:
+            # Канонічна адреса пошуку — однакова для всіх варіантів написання запиту
+            query = {'start_city': start_city_obj.name, 'end_city': end_city_obj.name}
+            if context['search_date']:
+                query['date'] = context['search_date'].isoformat()
+            context['search_url'] = self.request.build_absolute_uri(f"{reverse('booking_route_list')}?{urlencode(query)}")
+
+        html = render_to_string('booking/_route_results.html', context, request=self.request)
+        if search_cache is not None:
+            search_cache.set(
+                context['routes'], self.route_versions, html, is_nearby_dates=context['is_nearby_dates']
+            )
+        context['results_html'] = mark_safe(html)
         return context
 
+@staff_member_required
+def search_cache_stats_view(request):
+    """Лічильники влучань і промахів кешу видачі пошуку (для персоналу)."""
+    return JsonResponse(search_cache_stats())
+
+
 # --- СТВОРЕННЯ БРОНЮВАННЯ (ДЛЯ ПАСАЖИРА) ---
 class MakeBookingView(LoginRequiredMixin, CreateView):
     model = Booking
@@ -131,25 +184,32 @@ class MakeBookingView(LoginRequiredMixin, CreateView):
         })
         return initial
 
+    def resolve_city(self, slug_param, name_param, field):
+        """
+        Місто посадки/висадки. Значення, надіслане формою, важливіше за параметри посилання з пошуку;
+        якщо форма лише повторює назву з посилання, точнішим лишається slug з автодоповнення.
+        """
+        params = self.request.GET
+        posted = (self.request.POST.get(field) or '').strip()
+        if posted and posted != (params.get(name_param) or '').strip():
+            return city_resolver.resolve(posted)
+        return city_resolver.resolve(params.get(slug_param), params.get(name_param), posted)
+
     def get_calculated_data(self):
         route = get_object_or_404(Route, id=self.kwargs.get('route_id'))
-        start_city_name = self.request.GET.get('start_city') or self.request.POST.get('departure_point')
-        end_city_name = self.request.GET.get('end_city') or self.request.POST.get('arrival_point')
-
-        city_a = City.objects.filter(name__icontains=start_city_name).first() if start_city_name else None
-        city_b = City.objects.filter(name__icontains=end_city_name).first() if end_city_name else None
+        city_a = self.resolve_city('start_city_slug', 'start_city', 'departure_point')
+        city_b = self.resolve_city('end_city_slug', 'end_city', 'arrival_point')
 
-        distance = get_cached_distance(city_a, city_b) if city_a and city_b else None
-        final_price_per_ticket = float(route.min_trip_price)
-
-        if distance and route.price_per_km:
-            calculated_price = float(distance) * float(route.price_per_km)
-            final_price_per_ticket = max(calculated_price, float(route.min_trip_price))
+        distance = get_cached_distance(city_a, city_b, symmetric=route.symmetric_distance) if city_a and city_b else None
+        # Та сама формула, що й у видачі пошуку
+        final_price_per_ticket = pricing.quote([route], distance)[0]
 
         return {
             'route': route,
             'distance': distance,
-            'final_price': final_price_per_ticket
+            'final_price': final_price_per_ticket,
+            'departure_city': city_a,
+            'arrival_city': city_b,
         }
 
     def get_context_data(self, **kwargs):
@@ -173,38 +233,60 @@ class MakeBookingView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         # Використовуємо той самий метод для отримання ціни при збереженні
         data = self.get_calculated_data()
+        for field, city in (('departure_point', data['departure_city']), ('arrival_point', data['arrival_city'])):
+            if city is None:
+                form.add_error(field, "Місто не знайдено — оберіть його з підказок пошуку.")
+        if form.errors:
+            return self.form_invalid(form)
 
         booking = form.save(commit=False)
         booking.passenger = self.request.user
         booking.route = data['route']
+        booking.departure_city = data['departure_city']
+        booking.arrival_city = data['arrival_city']
+        # Зберігаємо канонічні назви замість довільного тексту з URL
+        booking.departure_point = booking.departure_city.name
+        booking.arrival_point = booking.arrival_city.name
+        # Зупинки посадки/висадки визначають, які ділянки маршруту займе бронювання
+        orders = SeatInventoryService.stop_orders(
+            booking.route_id, booking.departure_city_id, booking.arrival_city_id, booking.trip_date
+        )
+        if orders:
+            booking.departure_order, booking.arrival_order = orders
         seats = form.cleaned_data.get('seats_count', 1)
         booking.total_price = data['final_price'] * seats
-        booking.save()
+        with transaction.atomic():
+            # Місця займаються умовним UPDATE — паралельні замовлення не перевищать місткість
+            if not SeatInventoryService.reserve(booking):
+                form.add_error('seats_count', "Недостатньо вільних місць на цю дату.")
+                return self.form_invalid(form)
+            booking.save()
 
-        # Логіка Telegram сповіщення (залишається без змін)
-        try:
-            carrier_prof = booking.route.carrier.carrier_profile
+            # Telegram-сповіщення ставиться в чергу в тій самій транзакції,
+            # доставляє його фоновий обробник (manage.py send_notifications)
             try:
-                p_phone = booking.passenger.passenger_profile.phone
-            except Exception:
-                p_phone = form.cleaned_data.get('passenger_phone') or "не вказано"
-
-            full_name = f"{booking.passenger.first_name} {booking.passenger.last_name}".strip() or booking.passenger.username
-
-            text = (
-                f"🆕 <b>Нове замовлення </b>\n\n"
-                f"🚌 <b>Рейс:</b> {booking.route.title}\n"
-                f"📍 <b>Маршрут:</b> {booking.departure_point} — {booking.arrival_point}\n"
-                f"📅 <b>Дата:</b> {booking.trip_date}\n"
-                f"👥 <b>Місць:</b> {booking.seats_count}\n"
-                f"💰 <b>Сума:</b> {booking.total_price} грн\n\n"
-                f"👤 <b>Пасажир:</b> {full_name}\n"
-                f"📞 <b>Телефон:</b> <code>{p_phone}</code>\n"
+                carrier_prof = booking.route.carrier.carrier_profile
+                try:
+                    p_phone = booking.passenger.passenger_profile.phone
+                except Exception:
+                    p_phone = form.cleaned_data.get('passenger_phone') or "не вказано"
+
+                full_name = f"{booking.passenger.first_name} {booking.passenger.last_name}".strip() or booking.passenger.username
+
+                text = (
+                    f"🆕 <b>Нове замовлення </b>\n\n"
+                    f"🚌 <b>Рейс:</b> {booking.route.title}\n"
+                    f"📍 <b>Маршрут:</b> {booking.departure_point} — {booking.arrival_point}\n"
+                    f"📅 <b>Дата:</b> {booking.trip_date}\n"
+                    f"👥 <b>Місць:</b> {booking.seats_count}\n"
+                    f"💰 <b>Сума:</b> {booking.total_price} грн\n\n"
+                    f"👤 <b>Пасажир:</b> {full_name}\n"
+                    f"📞 <b>Телефон:</b> <code>{p_phone}</code>\n"
 
-            )
-            send_carrier_notification(carrier_prof, text)
-        except Exception as e:
-            print(f"Помилка відправки сповіщення: {e}")
+                )
+                send_carrier_notification(carrier_prof, text)
+            except Exception:
+                logger.exception("Помилка постановки сповіщення в чергу (бронювання %s)", booking.pk)
 
         messages.success(self.request, f"Бронювання на суму ₴{booking.total_price} успішно створено!")
         return super().form_valid(form)
@@ -215,37 +297,53 @@ class CarrierBookingListView(LoginRequiredMixin, ListView):
     model = Booking
     template_name = 'booking/carrier_bookings.html'
     context_object_name = 'bookings'
+    # Не paginate_by: стандартний Paginator рахує COUNT і читає через OFFSET
+    per_page = 50
+
+    def get_filters(self):
+        """Фільтри з GET (некоректні значення ігноруються): status, route, date_from, date_to — за датою поїздки."""
+        params = self.request.GET
+        filters = {}
+        if params.get('status') in dict(Booking.STATUS_CHOICES):
+            filters['status'] = params['status']
+        if params.get('route', '').isdigit():
+            filters['route_id'] = int(params['route'])
+        for name, lookup in (('date_from', 'trip_date__gte'), ('date_to', 'trip_date__lte')):
+            try:
+                filters[lookup] = datetime.strptime(params.get(name, ''), '%Y-%m-%d').date()
+            except ValueError:
+                pass
+        return filters
 
     def get_queryset(self):
         queryset = Booking.objects.filter(
-            route__carrier=self.request.user
-        ).select_related('passenger', 'passenger__passenger_profile', 'route').order_by('-created_at')
+            carrier=self.request.user, **self.get_filters()
+        ).select_related('passenger', 'passenger__passenger_profile', 'route')
 
-        # Фільтрація (search, status, route, dates)
         search_query = self.request.GET.get('search', '')
         if search_query:
-            queryset = queryset.filter(
-                Q(passenger__username__icontains=search_query) |
-                Q(passenger__passenger_profile__phone__icontains=search_query) |
-                Q(departure_point__icontains=search_query) |
-                Q(arrival_point__icontains=search_query)
-            )
-
-        status = self.request.GET.get('status')
-        if status: queryset = queryset.filter(status=status)
-
-        route_id = self.request.GET.get('route')
-        if route_id: queryset = queryset.filter(route_id=route_id)
+            # Пасажир, телефон, місця посадки/висадки — за триграмним індексом (booking/search.py)
+            queryset = BookingSearchService.filter(queryset, self.request.user, search_query)
 
         return queryset
 
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['my_routes'] = Route.objects.filter(carrier=self.request.user)
+        page = KeysetPaginator(self.per_page).page(self.object_list, self.request.GET)
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context['page'] = page
+        context['my_routes'] = Route.objects.filter(carrier=self.request.user).only('id', 'title')
         context['status_choices'] = Booking.STATUS_CHOICES
-        stats = self.get_queryset().aggregate(total_money=Sum('total_price'), total_seats=Sum('seats_count'))
+
+        if self.request.GET.get('search'):
+            # Текстовий пошук у денних підсумках не врахований — рахуємо по самих бронюваннях
+            stats = self.object_list.order_by().aggregate(
+                total_money=Sum('total_price'), total_seats=Sum('seats_count'), total_bookings=Count('id'),
+            )
+        else:
+            stats = BookingRollupService.carrier_totals(self.request.user, **self.get_filters())
         context['total_money'] = stats['total_money'] or 0
         context['total_seats'] = stats['total_seats'] or 0
+        context['total_bookings'] = stats['total_bookings'] or 0
         return context
 
     def post(self, request, *args, **kwargs):
@@ -253,9 +351,11 @@ class CarrierBookingListView(LoginRequiredMixin, ListView):
         new_status = request.POST.get('status')
         booking = get_object_or_404(Booking, id=booking_id, route__carrier=request.user)
         if new_status in dict(Booking.STATUS_CHOICES):
-            booking.status = new_status
-            booking.save()
-            messages.success(request, f"Статус замовлення №{booking.id} змінено.")
+            _, error = BookingStatusService.change(booking, new_status)
+            if error:
+                messages.error(request, error)
+            else:
+                messages.success(request, f"Статус замовлення №{booking.id} змінено.")
         return redirect(request.META.get('HTTP_REFERER', 'carrier-bookings'))
 
 
@@ -293,9 +393,9 @@ class CancelBookingView(LoginRequiredMixin, View):
             return redirect('passenger-bookings')
 
         # Якщо дата актуальна, скасовуємо
-        if booking.status != 'cancelled':
-            booking.status = 'cancelled'
-            booking.save()
+        # Місця повертає лише той запит, що справді змінив статус (повторне натискання — ні)
+        changed, _ = BookingStatusService.change(booking, 'cancelled')
+        if changed:
             messages.warning(request, "Ваше бронювання успішно скасовано.")
         else:
             messages.info(request, "Це бронювання вже було скасовано.")
@@ -309,76 +409,33 @@ class PassengerManifestView(LoginRequiredMixin, ListView):
     context_object_name = 'bookings'
 
     def get_queryset(self):
+        # Маніфест будується один раз (ManifestService) і використовується і для списку, і для групування
+        self.manifest = None
         date_str = self.request.GET.get('date')
         route_id = self.request.GET.get('route')
 
         if not date_str:
-            return Booking.objects.none()
+            return []
 
         try:
             target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-
-            # Базовий запит з усіма зв'язками
-            queryset = Booking.objects.filter(
-                trip_date=target_date,
-                route__carrier=self.request.user
-            ).exclude(status='cancelled').select_related(
-                'passenger', 'route', 'passenger__passenger_profile'
-            )
-
-            # Фільтр по конкретному маршруту
-            if route_id and route_id.strip():
-                queryset = queryset.filter(route_id=int(route_id))
-
-            # --- ЛОГІКА СОРТУВАННЯ ЗА МІСЦЕМ ПОСАДКИ ---
-            # Шукаємо порядковий номер (order) для зупинки, назва якої збігається з містом посадки
-            dep_order_subquery = RouteStop.objects.filter(
-                route=OuterRef('route'),
-                city__name__icontains=OuterRef('departure_point')
-            ).values('order')[:1]
-
-            return queryset.annotate(
-                dep_order=Subquery(dep_order_subquery)
-            ).order_by('route__id', 'dep_order', 'departure_point')
-            # Сортуємо: спочатку по маршруту, потім по черзі зупинок, потім за назвою (якщо order однаковий)
-
+            route_id = int(route_id) if route_id and route_id.strip() else None
         except (ValueError, TypeError):
-            return Booking.objects.none()
+            return []
+
+        self.manifest = ManifestService.build(self.request.user, target_date, route_id)
+        return [b for data in self.manifest['grouped'].values() for b in data['list']]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['my_routes'] = Route.objects.filter(carrier=self.request.user)
         context['selected_date'] = self.request.GET.get('date', '')
 
-        qs = self.get_queryset()
-        grouped = {}
-        total_seats_sum = 0
-        total_bookings_sum = 0
-        total_money_sum = 0
-
-        for b in qs:
-            if b.route not in grouped:
-                grouped[b.route] = {
-                    'list': [],
-                    'total_seats': 0,
-                    'total_bookings': 0  # Кількість замовлень для кожного маршруту окремо
-                }
-
-            grouped[b.route]['list'].append(b)
-            # Сумуємо кількість місць
-            grouped[b.route]['total_seats'] += b.seats_count
-            # Рахуємо кількість бронювань
-            grouped[b.route]['total_bookings'] += 1
-
-            # Загальна статистика для всієї сторінки
-            total_seats_sum += b.seats_count
-            total_bookings_sum += 1
-            total_money_sum += b.total_price
-
-        context['grouped_manifest'] = grouped
-        context['total_seats'] = total_seats_sum
-        context['total_bookings'] = total_bookings_sum
-        context['total_money'] = total_money_sum
+        manifest = self.manifest or {'grouped': {}, 'total_seats': 0, 'total_bookings': 0, 'total_money': 0}
+        context['grouped_manifest'] = manifest['grouped']
+        context['total_seats'] = manifest['total_seats']
+        context['total_bookings'] = manifest['total_bookings']
+        context['total_money'] = manifest['total_money']
         return context
 
 
@@ -397,62 +454,54 @@ class ExportPassengerPDFView(LoginRequiredMixin, View):
             except (ValueError, TypeError):
                 return HttpResponse("Invalid 'date' format, expected YYYY-MM-DD", status=400)
 
-            # Build base queryset (mirrors PassengerManifestView)
-            queryset = Booking.objects.filter(
-                trip_date=target_date,
-                route__carrier=request.user
-            ).exclude(status='cancelled').select_related(
-                'passenger', 'route', 'passenger__passenger_profile'
-            )
+            try:
+                route_id = int(route_id) if route_id and route_id.strip() else None
+            except ValueError:
+                return HttpResponse("Invalid 'route' parameter", status=400)
 
-            if route_id and route_id.strip():
-                try:
-                    queryset = queryset.filter(route_id=int(route_id))
-                except ValueError:
-                    return HttpResponse("Invalid 'route' parameter", status=400)
-
-            dep_order_subquery = RouteStop.objects.filter(
-                route=OuterRef('route'),
-                city__name__icontains=OuterRef('departure_point')
-            ).values('order')[:1]
-
-            qs = queryset.annotate(
-                dep_order=Subquery(dep_order_subquery)
-            ).order_by('route__id', 'dep_order', 'departure_point')
-
-            # Grouping (same structure as PassengerManifestView)
-            grouped = {}
-            for b in qs:
-                if b.route not in grouped:
-                    grouped[b.route] = {
-                        'list': [],
-                        'total_seats': 0,
-                        'total_bookings': 0
-                    }
-                grouped[b.route]['list'].append(b)
-                grouped[b.route]['total_seats'] += b.seats_count
-                grouped[b.route]['total_bookings'] += 1
-
-        # --- FONT registration (kept as earlier) ---
-        font_path = os.path.join(settings.BASE_DIR, 'static', 'fonts', 'DejaVuSans.ttf')
-        if not os.path.exists(font_path):
-            # Return useful error instead of raising to keep response predictable
-            return HttpResponse(f"Font not found at: {font_path}", status=500)
-
-        pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
-        # --------------------------------------------
-
-        context = {
-            'grouped_manifest': grouped,
-            'selected_date': target_date,
-        }
+            # Same manifest as PassengerManifestView (shared cache)
+            grouped = ManifestService.build(request.user, target_date, route_id)['grouped']
+
+        # Шрифт зареєстровано при старті (BookingConfig.ready); тут лише перевіряємо
+        if not register_fonts():
+            return HttpResponse(f"Font not found at: {FONT_PATH}", status=500)
 
-        template = get_template('booking/passenger_manifest_pdf.html')
-        html = template.render(context, request=request)
+        response = StreamingHttpResponse(manifest_pdf_chunks(grouped, target_date), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="manifest_{target_date:%Y-%m-%d}.pdf"'
+        return response
 
-        # For now return rendered HTML so the view is complete and predictable.
-        # If PDF generation is desired, replace this with PDF generator logic.
-        return HttpResponse(html, content_type='text/html')
+
+class ExportManifestArchiveView(LoginRequiredMixin, View):
+    """ZIP з відомостями (CSV та/або PDF) за діапазон дат — для планування рейсів на тиждень/місяць."""
+    MAX_DAYS = 62
+
+    def get(self, request, *args, **kwargs):
+        try:
+            date_from = datetime.strptime(request.GET.get('date_from', ''), '%Y-%m-%d').date()
+            date_to = datetime.strptime(request.GET.get('date_to', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return HttpResponse("Invalid 'date_from'/'date_to', expected YYYY-MM-DD", status=400)
+        if date_to < date_from or (date_to - date_from).days >= self.MAX_DAYS:
+            return HttpResponse(f"Date range must be 1-{self.MAX_DAYS} days", status=400)
+
+        route_id = request.GET.get('route')
+        try:
+            route_id = int(route_id) if route_id and route_id.strip() else None
+        except ValueError:
+            return HttpResponse("Invalid 'route' parameter", status=400)
+
+        formats = tuple(f for f in request.GET.getlist('format') or ['csv', 'pdf'] if f in ('csv', 'pdf'))
+        if not formats:
+            return HttpResponse("Unknown 'format', expected csv and/or pdf", status=400)
+        if 'pdf' in formats and not register_fonts():
+            return HttpResponse(f"Font not found at: {FONT_PATH}", status=500)
+
+        chunks = manifest_zip_chunks(request.user, date_from, date_to, route_id, formats)
+        response = StreamingHttpResponse(chunks, content_type='application/zip')
+        response['Content-Disposition'] = (
+            f'attachment; filename="manifests_{date_from:%Y-%m-%d}_{date_to:%Y-%m-%d}.zip"'
+        )
+        return response
 
 
 def confirm_booking(request, booking_id):
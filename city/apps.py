@@ -5,3 +5,6 @@ class CityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'city'
     verbose_name = "Міста / Країни"
+
+    def ready(self):
+        from . import signals  # noqa: F401
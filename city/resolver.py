@@ -0,0 +1,221 @@
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from unidecode import unidecode
+
+# Ключ у кеші Django, за яким процеси дізнаються, що довідник міст змінився.
+# Інші процеси побачать зміну лише через спільний кеш (CACHES у config/settings.py):
+# з LocMemCache кожен воркер має власну версію і скидає лише свій індекс
+VERSION_CACHE_KEY = 'city_resolver_version'
+# Як часто (секунд) процес звіряє свою версію індексу з кешем; у межах процесу скидання миттєве
+VERSION_CHECK_INTERVAL = getattr(settings, 'CITY_RESOLVER_VERSION_CHECK_INTERVAL', 5)
+
+MAX_PREFIX = 20
+NGRAM = 2
+
+_SPLIT_RE = re.compile(r"[\s\-–—/,.()]+")
+_APOSTROPHES_RE = re.compile(r"['`’ʼ\"]")
+
+
+def normalize(text):
+    """Нормалізована форма назви: без апострофів, у нижньому регістрі (працює з кирилицею)."""
+    return _APOSTROPHES_RE.sub('', text or '').casefold().strip()
+
+
+def variants(text):
+    """Оригінальна нормалізована форма та транслітерація (Київ -> kiyiv)."""
+    native = normalize(text)
+    latin = normalize(unidecode(native))
+    return {native, latin} - {''}
+
+
+def ngrams(text, n=NGRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class CityIndex:
+    """Незмінний знімок довідника міст з префіксним та n-грамним індексами."""
+
+    def __init__(self, rows):
+        # id -> (name, slug, country_name, country_code)
+        self.entries = {}
+        self.slugs = {}
+        self.exact = {}
+        self.sort_keys = {}
+        self.keys = {}
+        self.country_keys = {}
+        self.prefixes = {}
+        self.word_prefixes = {}
+        self.grams = {}
+        self.country_grams = {}
+
+        for city_id, name, slug, country_name, country_code in sorted(rows):
+            self.entries[city_id] = (name, slug, country_name, country_code)
+            self.sort_keys[city_id] = (normalize(name), city_id)
+            self.keys[city_id] = variants(name)
+            self.country_keys[city_id] = variants(country_name)
+            if slug:
+                self.slugs[slug] = city_id
+
+            for key in self.keys[city_id]:
+                # При збігу назв у різних країнах перемагає місто з меншим id (детерміновано)
+                self.exact.setdefault(key, city_id)
+                self.exact.setdefault(f"{key},{normalize(country_code)}", city_id)
+                for i in range(1, min(len(key), MAX_PREFIX) + 1):
+                    self.prefixes.setdefault(key[:i], set()).add(city_id)
+                for word in _SPLIT_RE.split(key)[1:]:
+                    for i in range(1, min(len(word), MAX_PREFIX) + 1):
+                        self.word_prefixes.setdefault(word[:i], set()).add(city_id)
+                for gram in ngrams(key):
+                    self.grams.setdefault(gram, set()).add(city_id)
+
+            for key in self.country_keys[city_id]:
+                for gram in ngrams(key):
+                    self.country_grams.setdefault(gram, set()).add(city_id)
+
+    def _lookup_prefix(self, index, term):
+        # Довші терміни знайде пошук за підрядком
+        return index.get(term, set()) if len(term) <= MAX_PREFIX else set()
+
+    def _lookup_substring(self, term, keys, grams, candidates_all):
+        if len(term) >= NGRAM:
+            sets = [grams.get(g, set()) for g in ngrams(term)]
+            candidates = set.intersection(*sets) if sets else set()
+        else:
+            # Для одного символу n-грам немає — перевіряємо всі записи (все в пам'яті)
+            candidates = candidates_all
+        return {c for c in candidates if any(term in k for k in keys[c])}
+
+    def search(self, term, limit=10, include_country=False):
+        """
+        Повертає id міст, що відповідають терміну, у порядку релевантності:
+        спочатку збіг з початку назви, далі з початку слова, далі будь-який підрядок.
+        """
+        terms = variants(term)
+        if not terms:
+            return []
+
+        prefix, word, substring = set(), set(), set()
+        for t in terms:
+            prefix |= self._lookup_prefix(self.prefixes, t)
+            word |= self._lookup_prefix(self.word_prefixes, t)
+            substring |= self._lookup_substring(t, self.keys, self.grams, self.entries.keys())
+            if include_country:
+                substring |= self._lookup_substring(t, self.country_keys, self.country_grams, self.entries.keys())
+
+        ranked = []
+        for group in (prefix, word - prefix, substring - prefix - word):
+            ranked.extend(sorted(group, key=self.sort_keys.__getitem__))
+            if limit and len(ranked) >= limit:
+                return ranked[:limit]
+        return ranked
+
+    def resolve_id(self, value):
+        """
+        Канонічне визначення міста: id -> slug -> точна нормалізована назва
+        (також у форматі "Київ, UA"). Без точного збігу — None.
+        """
+        value = str(value or '').strip()
+        if not value:
+            return None
+        if value.isdigit():
+            return int(value) if int(value) in self.entries else None
+        if value.lower() in self.slugs:
+            return self.slugs[value.lower()]
+
+        name, _, code = value.rpartition(',')
+        for key in variants(value):
+            if key in self.exact:
+                return self.exact[key]
+        if name and code:
+            for key in variants(name):
+                city_id = self.exact.get(f"{key},{normalize(code)}")
+                if city_id:
+                    return city_id
+        # Неточний текст не вгадуємо: «Київська» не повинна тихо стати іншим містом — вирішує форма
+        return None
+
+    def names(self, city_ids):
+        return [(city_id, self.entries[city_id][0]) for city_id in city_ids]
+
+
+class CityResolver:
+    """
+    Процесний резолвер назв міст. Індекс будується один раз при першому зверненні
+    та скидається сигналами збереження/видалення City та Country.
+    Індекс замінюється цілим знімком: хто працює з кількома викликами (пошук, потім назви),
+    бере один знімок city_resolver.index і звертається лише до нього.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        self._index = None
+        try:
+            cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(VERSION_CACHE_KEY, 1, None)
+
+    def _load(self):
+        from .models import City
+
+        rows = City.objects.values_list('id', 'name', 'slug', 'country__name', 'country__code')
+        return CityIndex(rows)
+
+    @property
+    def index(self):
+        index = self._index
+        if index is not None and time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL:
+            # Версію з кешу не перечитуємо на кожне натискання клавіші в автодоповненні
+            return index
+
+        version = cache.get(VERSION_CACHE_KEY)
+        if index is None or version != self._version:
+            with self._lock:
+                if self._index is None or version != self._version:
+                    self._index = self._load()
+                    self._version = version
+                index = self._index
+        self._checked_at = time.monotonic()
+        return index
+
+    def search(self, term, limit=10, include_country=False):
+        return self.index.search(term, limit=limit, include_country=include_country)
+
+    def resolve_id(self, *values):
+        """Повертає id першого значення (id, slug або назва), яке вдалося визначити."""
+        index = self.index
+        for value in values:
+            city_id = index.resolve_id(value)
+            if city_id:
+                return city_id
+        return None
+
+    def resolve(self, *values):
+        """Як resolve_id, але повертає об'єкт City (один запит за первинним ключем)."""
+        from .models import City
+
+        city_id = self.resolve_id(*values)
+        if city_id is None:
+            return None
+        return City.objects.select_related('country').filter(pk=city_id).first()
+
+    def choices(self):
+        """Пари (назва, slug) усіх міст, відсортовані за назвою — для автодоповнення у формах."""
+        index = self.index
+        ordered = sorted(index.entries, key=index.sort_keys.__getitem__)
+        return [(index.entries[city_id][0], index.entries[city_id][1]) for city_id in ordered]
+
+    def names(self, city_ids):
+        """Пари (id, назва). Лише для id з поточного знімка — інакше беріть index.names."""
+        return self.index.names(city_ids)
+
+
+city_resolver = CityResolver()
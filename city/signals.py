@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import City, Country
+from .resolver import city_resolver
+from trips.sitemaps import invalidate_sitemaps
+
+
+@receiver([post_save, post_delete], sender=City)
+@receiver([post_save, post_delete], sender=Country)
+def invalidate_city_resolver(sender, **kwargs):
+    city_resolver.invalidate()
+    # Назви й slug міст є в адресах sitemap
+    invalidate_sitemaps()
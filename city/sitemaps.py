@@ -11,7 +11,7 @@ class CitySitemap(Sitemap):
 
     def items(self):
         # Повертаємо всі міста, у яких заповнений slug
-        return City.objects.exclude(slug__isnull=True).exclude(slug="")
+        return City.objects.exclude(slug__isnull=True).exclude(slug="").order_by("id")
 
     def location(self, obj):
         # 'city' — це app_name, 'city_detail' — назва path у urls.py
@@ -1,3 +1,98 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .models import City, Country
+from .resolver import VERSION_CACHE_KEY, CityIndex, city_resolver, normalize, variants
+
+ROWS = [
+    (1, "Київ", 'ua-kiyiv', "Україна", 'UA'),
+    (2, "Біла Церква", 'ua-bila-tserkva', "Україна", 'UA'),
+    (3, "Кам'янець-Подільський", 'ua-kamianets-podilskyi', "Україна", 'UA'),
+    (4, "Львів", 'ua-lviv', "Україна", 'UA'),
+    (5, "Варшава", 'pl-varshava', "Польща", 'PL'),
+    (6, "Київ", 'md-kiyiv', "Молдова", 'MD'),
+]
+
+
+class CityIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = CityIndex(ROWS)
+
+    def test_normalize_and_transliteration(self):
+        self.assertEqual(normalize(" Кам'янець "), "камянець")
+        self.assertEqual(variants("Київ"), {"київ", "kiyiv"})
+
+    def test_search_ranks_name_prefix_then_word_prefix_then_substring(self):
+        self.assertEqual(self.index.search("ц"), [2, 3])
+        self.assertEqual(self.index.search("це"), [2])
+        self.assertEqual(self.index.search("по"), [3])
+        self.assertEqual(self.index.search("льв"), [4])
+        # Назва з початку — раніше за збіг у середині; «в» шукається і як «v» (Bila Tserkva)
+        self.assertEqual(self.index.search("в"), [5, 2, 1, 6, 4])
+
+    def test_search_by_transliteration_and_country(self):
+        self.assertEqual(self.index.search("lviv"), [4])
+        self.assertEqual(self.index.search("польща"), [])
+        self.assertEqual(self.index.search("польща", include_country=True), [5])
+
+    def test_search_limit(self):
+        self.assertEqual(len(self.index.search("а", limit=2)), 2)
+        self.assertEqual(self.index.search("а", limit=None), [2, 5, 3])
+
+    def test_resolve_id_is_exact(self):
+        self.assertEqual(self.index.resolve_id('4'), 4)
+        self.assertIsNone(self.index.resolve_id('99'))
+        self.assertEqual(self.index.resolve_id('UA-LVIV'), 4)
+        self.assertEqual(self.index.resolve_id(" київ "), 1)
+        self.assertEqual(self.index.resolve_id("kiyiv"), 1)
+        self.assertEqual(self.index.resolve_id("Київ, MD"), 6)
+        # Частина назви — не місто: автодоповнення знайшло б «Київ», резолвер — ні
+        self.assertIsNone(self.index.resolve_id("Киї"))
+        self.assertIsNone(self.index.resolve_id("Київська"))
+        self.assertIsNone(self.index.resolve_id(''))
+
+    def test_names(self):
+        self.assertEqual(self.index.names([4, 1]), [(4, "Львів"), (1, "Київ")])
+
+
+class CityResolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ukraine = Country.objects.create(name="Україна", code="UA")
+        cls.kyiv = City.objects.create(name="Київ", country=ukraine)
+        cls.lviv = City.objects.create(name="Львів", country=ukraine)
+
+    def setUp(self):
+        # Відкат транзакції тесту сигналів не надсилає — індекс міг лишитися з містами попереднього тесту
+        city_resolver.invalidate()
+
+    def test_city_changes_rebuild_index(self):
+        self.assertEqual(city_resolver.search("одеса"), [])
+        odesa = City.objects.create(name="Одеса", country=self.kyiv.country)
+        self.assertEqual(city_resolver.search("одеса"), [odesa.pk])
+
+    def test_version_bump_from_another_process_is_picked_up(self):
+        city_resolver.index
+        # Інший воркер додав місто і підняв версію у спільному кеші; сигнали тут не спрацюють
+        City.objects.bulk_create([City(name="Одеса", country=self.kyiv.country, slug='ua-odesa')])
+        cache.incr(VERSION_CACHE_KEY) if cache.get(VERSION_CACHE_KEY) else cache.set(VERSION_CACHE_KEY, 1, None)
+
+        self.assertEqual(city_resolver.search("одеса"), [])
+        with mock.patch('city.resolver.VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(len(city_resolver.search("одеса")), 1)
+
+    def test_autocomplete_uses_one_snapshot(self):
+        stale = city_resolver.index
+        with mock.patch.object(type(city_resolver), 'index', new_callable=mock.PropertyMock) as index:
+            # Перебудова після першого звернення не впливає на вже взятий знімок
+            index.side_effect = [stale, CityIndex([])]
+            response = self.client.get(reverse('city:city_autocomplete'), {'term': 'льв'})
+        self.assertEqual(response.json(), {'results': [{'id': self.lviv.pk, 'text': "Львів"}]})
+        self.assertEqual(index.call_count, 1)
+
+    def test_city_list_search(self):
+        response = self.client.get(reverse('city:city_list'), {'q': 'україна'})
+        self.assertEqual([city.pk for city in response.context['page_obj']], [self.kyiv.pk, self.lviv.pk])
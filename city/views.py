@@ -1,50 +1,45 @@
-from django.db.models import Q
-from django.db.models.functions import Lower
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404
 from .models import City
+from .resolver import city_resolver
 
 def city_autocomplete(request):
-    term = request.GET.get('term', '').strip().lower()
+    term = request.GET.get('term', '').strip()
 
     if not term:
         return JsonResponse({'results': []})
 
-    all_cities = City.objects.all()
+    # Пошук по індексу в пам'яті (кирилиця + транслітерація), без запитів до БД.
+    # Один знімок на запит: якщо між пошуком і назвами індекс перебудується, id не загубляться
+    index = city_resolver.index
+    city_ids = index.search(term, limit=10)
 
-    # Фільтрація засобами Python (працює з кирилицею)
-    filtered = [
-        c for c in all_cities
-        if term in c.name.lower()
-    ][:10]
-
-    results = [{'id': c.id, 'text': c.name} for c in filtered]
+    results = [{'id': city_id, 'text': name} for city_id, name in index.names(city_ids)]
     return JsonResponse({'results': results})
 
 def city_list_view(request):
     q = request.GET.get('q', '').strip().lower()
-    # Отримуємо QuerySet (ще не список)
-    city_qs = City.objects.select_related('country').all()
 
     if q:
-        # ПЕРЕТВОРЮЄМО НА СПИСОК І ФІЛЬТРУЄМО ЧЕРЕЗ PYTHON
-        # Це єдиний спосіб для SQLite обійти проблему кириличного регістру
-        city_list = [
-            c for c in city_qs
-            if q in c.name.lower() or q in c.country.name.lower()
-        ]
-        # Сортуємо список за назвою міста
-        city_list.sort(key=lambda x: x.name.lower())
+        # Фільтруємо та сортуємо лише id міст через резолвер (назва міста або країни),
+        # а з БД дістаємо тільки міста поточної сторінки
+        index = city_resolver.index
+        city_list = index.search(q, limit=None, include_country=True)
+        city_list.sort(key=index.sort_keys.__getitem__)
     else:
         # Якщо пошуку немає, просто сортуємо QuerySet за допомогою БД (це вона вміє)
-        city_list = city_qs.order_by('name')
+        city_list = City.objects.select_related('country').order_by('name')
 
     # Paginator в Django чудово працює і зі списками []
     paginator = Paginator(city_list, 12)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
+    if q:
+        cities = City.objects.select_related('country').in_bulk(page_obj.object_list)
+        page_obj.object_list = [cities[city_id] for city_id in page_obj.object_list if city_id in cities]
+
     return render(request, 'city/city_list.html', {
         'page_obj': page_obj,
         'search_query': q,
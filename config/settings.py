@@ -31,6 +31,8 @@ AUTH_USER_MODEL = 'accounts.User'
 LOGIN_REDIRECT_URL = 'home'  # або назва вашої View
 LOGOUT_REDIRECT_URL = 'login'
 MIDDLEWARE = [
+    # Першим: бачить SQL усіх наступних middleware (сесії, автентифікація)
+    'ukrbus.profiling.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,3 +87,48 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Спільний для всіх процесів кеш. Через нього воркери дізнаються про зміни: версії маніфестів
+# (ManifestService), видачі пошуку (trips/search_cache.py), популярних напрямків і довідника міст
+# (city/resolver.py). LocMemCache живе в одному процесі — годиться для runserver і тестів;
+# з кількома воркерами (gunicorn) задайте REDIS_URL (потрібен пакет redis), інакше кожен воркер
+# бачитиме лише власні скидання і віддаватиме застарілі сторінки до кінця TTL.
+# З вимкненим DEBUG без REDIS_URL manage.py check попереджає (ukrbus.W001, ukrbus/checks.py).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Маршрутизатор OSRM для розрахунку відстаней (можна вказати локальний сервер)
+OSRM_URL = os.environ.get('OSRM_URL', 'http://router.project-osrm.org')
+
+# Telegram-сповіщення перевізникам (відправляє manage.py send_notifications)
+# Лише з оточення: без токена обробник черги (send_notifications) не запускається, сповіщення чекають у черзі
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Профілювання SQL по в'юхах (ukrbus/profiling.py); зведення для персоналу — /_profiling/queries/.
+# Лише на вимогу (QUERY_PROFILING=True): обгортка кожного запиту додає накладні витрати і спотворює заміри
+QUERY_PROFILING = os.environ.get('QUERY_PROFILING') == 'True'
+# Бюджет SQL-запитів на сторінку: при ввімкненому профілюванні перевищення пишеться в лог;
+# тести в'юх перевіряють його через assert_query_budget (accounts/tests.py)
+QUERY_BUDGETS = {
+    'home': 3,
+    'booking_route_list': 12,
+    'carrier-bookings': 8,
+    'passenger-bookings': 6,
+    'passenger_manifest': 8,
+    'profile': 6,
+    'statistics': 9,
+    'parcel_quote': 6,
+    'parcel_quote_batch': 6,
+}
@@ -4,8 +4,8 @@ from django.contrib import admin
 from django.urls import path, include
 
 # 1. Імпортуйте ваші класи Sitemap
-from django.contrib.sitemaps.views import sitemap
-from trips.sitemaps import StaticViewSitemap, RouteSitemap
+from django.contrib.sitemaps import views as sitemap_views
+from trips.sitemaps import StaticViewSitemap, RouteSitemap, cached_sitemap
 from city.sitemaps import CitySitemap  # Додайте цей імпорт
 
 # 2. Визначте повний словник sitemaps
@@ -24,8 +24,10 @@ urlpatterns = [
     path('news/', include('news.urls')),
     path('citys/', include('city.urls')),
 
-    # Sitemap
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    # Sitemap: індекс + сторінки секцій (?p=2 ...), відрендерені сторінки кешуються до змін маршрутів/міст
+    path('sitemap.xml', cached_sitemap(sitemap_views.index), {'sitemaps': sitemaps}),
+    path('sitemap-<section>.xml', cached_sitemap(sitemap_views.sitemap), {'sitemaps': sitemaps},
+         name='django.contrib.sitemaps.views.sitemap'),
 ]
 
 if settings.DEBUG:
@@ -1,5 +1,7 @@
 
 from .models import Route, RouteStop , DistanceCache
+from .services import rebuild_route_segments
+from booking.services import SeatInventoryService
 from django.contrib import admin
 
 
@@ -33,6 +35,12 @@ class RouteAdmin(admin.ModelAdmin):
             obj.carrier = request.user
         super().save_model(request, obj, form, change)
 
+    # Після збереження зупинок перебудовуємо індекс пошуку маршруту
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        rebuild_route_segments(form.instance)
+        SeatInventoryService.sync_capacity(form.instance)
+
 
 
 
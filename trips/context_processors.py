@@ -1,25 +1,85 @@
-from .models import Route
+from datetime import timedelta
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Sum
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 
-def popular_directions(request):
-    # Отримуємо всі активні маршрути з попереднім завантаженням зупинок та міст для швидкості
-    routes = Route.objects.filter(is_active=True).prefetch_related('stops__city')[:10]
+from .models import Route, RouteSegment, RouteStop
+
+POPULAR_DIRECTIONS_LIMIT = 10
+# Версія змінюється при зміні маршрутів, зупинок і бронювань (trips/signals.py, booking/signals.py)
+POPULAR_DIRECTIONS_VERSION_KEY = 'popular_directions_version'
+POPULAR_DIRECTIONS_TTL = getattr(settings, 'POPULAR_DIRECTIONS_TTL', 60 * 60)
+# За який період рахуємо популярність
+POPULAR_DIRECTIONS_WINDOW = timedelta(days=90)
+
+
+def invalidate_popular_directions():
+    try:
+        cache.incr(POPULAR_DIRECTIONS_VERSION_KEY)
+    except ValueError:
+        cache.set(POPULAR_DIRECTIONS_VERSION_KEY, 1, None)
+
+
+def _direction(start_city, end_city):
+    return {'start_name': start_city[0], 'start_slug': start_city[1] or '',
+            'end_name': end_city[0], 'end_slug': end_city[1] or ''}
 
-    dynamic_directions = []
 
-    for route in routes:
-        # Використовуємо метод order_by('order'), щоб точно знати, де початок і кінець
-        all_stops = route.stops.all().order_by('order')
-        if all_stops.exists():
-            start_stop = all_stops.first()
-            end_stop = all_stops.last()
+def _by_bookings(limit):
+    """Пари міст з найбільшою кількістю заброньованих місць, які ще обслуговує активний маршрут."""
+    from booking.models import Booking
 
-            if start_stop.city and end_stop.city:
-                dynamic_directions.append({
-                    'start_name': start_stop.city.name,
-                    'end_name': end_stop.city.name,
-                })
+    served = RouteSegment.objects.filter(
+        route__is_active=True, from_city=OuterRef('departure_city'), to_city=OuterRef('arrival_city'),
+    )
+    rows = (
+        Booking.objects.exclude(status='cancelled')
+        .filter(Exists(served), created_at__gte=timezone.now() - POPULAR_DIRECTIONS_WINDOW)
+        .values('departure_city__name', 'departure_city__slug', 'arrival_city__name', 'arrival_city__slug')
+        .annotate(seats=Sum('seats_count'))
+        .order_by('-seats')[:limit]
+    )
+    return [
+        _direction((row['departure_city__name'], row['departure_city__slug']),
+                   (row['arrival_city__name'], row['arrival_city__slug']))
+        for row in rows
+    ]
 
+
+def _by_routes(limit):
+    """Початок і кінець активних маршрутів (як раніше) — коли бронювань ще мало."""
+    route_ids = list(Route.objects.filter(is_active=True).values_list('id', flat=True)[:limit])
+    stops = {}
+    for route_id, name, slug in (
+        RouteStop.objects.filter(route_id__in=route_ids)
+        .order_by('route_id', 'order', 'id').values_list('route_id', 'city__name', 'city__slug')
+    ):
+        stops.setdefault(route_id, []).append((name, slug))
+    return [_direction(stops[pk][0], stops[pk][-1]) for pk in route_ids if pk in stops]
+
+
+def get_popular_directions(limit=POPULAR_DIRECTIONS_LIMIT):
+    version = cache.get(POPULAR_DIRECTIONS_VERSION_KEY, 0)
+    key = f"popular_directions:{version}:{limit}"
+    directions = cache.get(key)
+    if directions is None:
+        directions = _by_bookings(limit)
+        seen = {(d['start_name'], d['end_name']) for d in directions}
+        for direction in _by_routes(limit):
+            if len(directions) >= limit:
+                break
+            if (direction['start_name'], direction['end_name']) not in seen:
+                seen.add((direction['start_name'], direction['end_name']))
+                directions.append(direction)
+        cache.set(key, directions, POPULAR_DIRECTIONS_TTL)
+    return directions
+
+
+def popular_directions(request):
+    # Лінивий список: сторінки, які не показують популярні напрямки, не роблять жодного запиту
     return {
-        'popular_directions_list': dynamic_directions
-    }
\ No newline at end of file
+        'popular_directions_list': SimpleLazyObject(get_popular_directions)
+    }
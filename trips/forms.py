@@ -21,9 +21,10 @@ class RouteForm(forms.ModelForm):
         # Поля, які користувач заповнює в адмінці або на сайті
         fields = [
             'title', 'is_active', 'boost_days',
-            'is_passenger', 'is_parcel',
+            'is_passenger', 'is_parcel', 'capacity',
             'min_trip_price', 'price_per_km',
-            'min_parcel_price', 'price_per_kg'
+            'min_parcel_price', 'price_per_kg',
+            'symmetric_distance',
         ]
         # Стилізація віджетів під Bootstrap/Glassmorphism дизайн
         widgets = {
@@ -32,9 +33,11 @@ class RouteForm(forms.ModelForm):
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input', 'role': 'switch'}),
             'is_passenger': forms.CheckboxInput(attrs={'class': 'form-check-input', 'role': 'switch'}),
             'is_parcel': forms.CheckboxInput(attrs={'class': 'form-check-input', 'role': 'switch'}),
+            'symmetric_distance': forms.CheckboxInput(attrs={'class': 'form-check-input', 'role': 'switch'}),
             # step='0.01' дозволяє вводити копійки в числові поля
             'min_trip_price': forms.NumberInput(attrs={'class': 'form-control glass-input text-white', 'step': '0.01'}),
             'price_per_km': forms.NumberInput(attrs={'class': 'form-control glass-input text-white', 'step': '0.01'}),
+            'capacity': forms.NumberInput(attrs={'class': 'form-control glass-input text-white', 'min': 1}),
             'min_parcel_price': forms.NumberInput(
                 attrs={'class': 'form-control glass-input text-white', 'step': '0.01'}),
             'price_per_kg': forms.NumberInput(attrs={'class': 'form-control glass-input text-white', 'step': '0.01'}),
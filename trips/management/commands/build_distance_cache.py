@@ -0,0 +1,177 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.core.management.base import BaseCommand
+
+from booking.utils import ROAD_FACTOR, get_osrm_table, haversine_km, invalidate_distances
+from city.models import City
+from trips.models import DistanceCache, Route
+
+
+class Command(BaseCommand):
+    help = (
+        "Заповнює DistanceCache для всіх впорядкованих пар зупинок активних маршрутів "
+        "через OSRM table endpoint (пакетно, паралельно, з можливістю продовження). "
+        "Якщо маршрутизатор недоступний або не знайшов маршруту — зберігає оцінку за прямою (haversine), "
+        "яку можна уточнити пізніше через --refine-estimates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--osrm-url', help="Адреса OSRM (за замовчуванням settings.OSRM_URL)")
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help="Максимум координат в одному запиті до OSRM (публічний сервер — до 100)")
+        parser.add_argument('--concurrency', type=int, default=2, help="Кількість одночасних запитів до OSRM")
+        parser.add_argument('--retries', type=int, default=2, help="Повторні спроби для одного пакета")
+        parser.add_argument('--offline', action='store_true', help="Не звертатися до OSRM, лише haversine")
+        parser.add_argument('--no-fallback', action='store_true',
+                            help="Не зберігати haversine-оцінку, якщо OSRM не відповів або не знайшов маршруту "
+                                 "(такі пари запитуватимуться знову при кожному запуску)")
+        parser.add_argument('--road-factor', type=float, default=ROAD_FACTOR,
+                            help="Коефіцієнт для haversine-оцінки")
+        parser.add_argument('--refine-estimates', action='store_true',
+                            help="Повторно запитати OSRM для пар, збережених як оцінка")
+
+    def handle(self, *args, **options):
+        pending = self.collect_pending_pairs(options['refine_estimates'])
+        if not pending:
+            self.stdout.write(self.style.SUCCESS("Усі пари вже в кеші."))
+            return
+
+        cities = City.objects.in_bulk({city_id for pair in pending for city_id in pair})
+        located = {pair for pair in pending if all(self.has_coords(cities[c]) for c in pair)}
+        skipped = len(pending) - len(located)
+        self.stdout.write(f"Пар до розрахунку: {len(located)} (без координат пропущено: {skipped})")
+
+        if options['offline']:
+            saved = self.save(self.estimate(located, cities, options['road_factor']), estimate=True)
+            invalidate_distances()
+            self.stdout.write(self.style.SUCCESS(f"Збережено оцінок: {saved}"))
+            return
+
+        routed = estimated = unroutable = 0
+        jobs = self.make_batches(located, cities, max(options['batch_size'], 2))
+        with requests.Session() as session:
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=options['concurrency'])
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                futures = {
+                    executor.submit(self.fetch, job, session, options['osrm_url'], options['retries']): job
+                    for job in jobs
+                }
+                # Кожен пакет записується одразу — перерваний запуск продовжиться з того ж місця
+                for future in as_completed(futures):
+                    sources, destinations, pairs = futures[future]
+                    try:
+                        distances = future.result()
+                    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                        self.stderr.write(f"OSRM недоступний для пакета ({len(pairs)} пар): {e}")
+                        if not options['no_fallback']:
+                            estimated += self.save(self.estimate(pairs, cities, options['road_factor']), estimate=True)
+                        continue
+
+                    found = {pair: distances.get(pair) for pair in pairs if distances.get(pair)}
+                    routed += self.save(found, estimate=False)
+                    # Пари, між якими OSRM маршруту не знайшов, зберігаємо оцінкою — інакше кожен запуск
+                    # запитував би їх знову; --refine-estimates перевірить їх ще раз
+                    missing = pairs - found.keys()
+                    unroutable += len(missing)
+                    if missing and not options['no_fallback']:
+                        estimated += self.save(self.estimate(missing, cities, options['road_factor']), estimate=True)
+
+        # bulk_create сигналів не надсилає — веб-процеси дізнаються про нові відстані з версії в кеші
+        invalidate_distances()
+        self.stdout.write(self.style.SUCCESS(
+            f"Збережено з OSRM: {routed}, оцінок: {estimated} (без маршруту в OSRM: {unroutable})"
+        ))
+
+    @staticmethod
+    def has_coords(city):
+        return city.latitude is not None and city.longitude is not None
+
+    @staticmethod
+    def collect_pending_pairs(refine_estimates=False):
+        """Усі впорядковані пари міст активних маршрутів, яких ще немає в кеші."""
+        pairs = set()
+        routes = Route.objects.filter(is_active=True).prefetch_related('stops')
+        for route in routes:
+            city_ids = [stop.city_id for stop in sorted(route.stops.all(), key=lambda s: (s.order or 0, s.id))]
+            for i, from_city in enumerate(city_ids):
+                pairs.update((from_city, to_city) for to_city in city_ids[i + 1:] if to_city != from_city)
+
+        cached = DistanceCache.objects.all()
+        if refine_estimates:
+            cached = cached.filter(is_estimate=False)
+        return pairs - set(cached.values_list('city_from_id', 'city_to_id'))
+
+    @staticmethod
+    def make_batches(pairs, cities, batch_size):
+        """
+        Групує пари в запити до OSRM: кілька джерел × кілька призначень,
+        щоб загальна кількість координат не перевищувала batch_size.
+        """
+        by_source = {}
+        for from_city, to_city in pairs:
+            by_source.setdefault(from_city, set()).add(to_city)
+
+        jobs = []
+        source_ids = sorted(by_source)
+        step = max(batch_size // 2, 1)
+        for i in range(0, len(source_ids), step):
+            chunk = source_ids[i:i + step]
+            destination_ids = sorted(set().union(*(by_source[s] for s in chunk)))
+            dest_step = max(batch_size - len(chunk), 1)
+            for j in range(0, len(destination_ids), dest_step):
+                dest_chunk = destination_ids[j:j + dest_step]
+                job_pairs = {(s, d) for s in chunk for d in dest_chunk if d in by_source[s]}
+                if job_pairs:
+                    jobs.append(([cities[s] for s in chunk], [cities[d] for d in dest_chunk], job_pairs))
+        return jobs
+
+    @staticmethod
+    def fetch(job, session, base_url, retries):
+        sources, destinations, _ = job
+        for attempt in range(retries + 1):
+            try:
+                return get_osrm_table(sources, destinations, base_url=base_url, session=session)
+            except requests.exceptions.RequestException:
+                if attempt == retries:
+                    raise
+                time.sleep(2 ** attempt)
+
+    @staticmethod
+    def estimate(pairs, cities, road_factor):
+        result = {}
+        for from_city, to_city in pairs:
+            km = haversine_km(cities[from_city], cities[to_city], road_factor=road_factor)
+            if km:
+                result[(from_city, to_city)] = km
+        return result
+
+    @staticmethod
+    def save(distances, estimate):
+        """Записує відстані, яких ще немає в DistanceCache. Повертає кількість справді доданих рядків."""
+        if not distances:
+            return 0
+        stored = DistanceCache.objects.filter(
+            city_from_id__in={from_city for from_city, _ in distances}
+        ).values_list('id', 'city_from_id', 'city_to_id', 'is_estimate')
+        existing = {(f, t): (pk, is_estimate) for pk, f, t, is_estimate in stored if (f, t) in distances}
+        if not estimate:
+            # Точні значення OSRM замінюють раніше збережені оцінки
+            stale = [pk for pk, is_estimate in existing.values() if is_estimate]
+            DistanceCache.objects.filter(id__in=stale).delete()
+            existing = {pair: row for pair, row in existing.items() if not row[1]}
+
+        new = {pair: km for pair, km in distances.items() if pair not in existing}
+        # ignore_conflicts — на випадок паралельного запуску, що встиг записати ту саму пару
+        DistanceCache.objects.bulk_create(
+            [
+                DistanceCache(city_from_id=from_city, city_to_id=to_city, distance_km=km, is_estimate=estimate)
+                for (from_city, to_city), km in new.items()
+            ],
+            ignore_conflicts=True,
+        )
+        return len(new)
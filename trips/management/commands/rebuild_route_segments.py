@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from trips.models import Route
+from trips.services import rebuild_route_segments
+
+
+class Command(BaseCommand):
+    help = "Перебудовує індекс пошуку (RouteSegment) для всіх або вказаних маршрутів"
+
+    def add_arguments(self, parser):
+        parser.add_argument('route_ids', nargs='*', type=int, help="id маршрутів (за замовчуванням — усі)")
+
+    def handle(self, *args, **options):
+        routes = Route.objects.all()
+        if options['route_ids']:
+            routes = routes.filter(pk__in=options['route_ids'])
+
+        count = 0
+        for route in routes.iterator():
+            rebuild_route_segments(route)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Індекс перебудовано для маршрутів: {count}"))
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-18 14:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_segments(apps, schema_editor):
+    Route = apps.get_model('trips', 'Route')
+    RouteSegment = apps.get_model('trips', 'RouteSegment')
+
+    segments = []
+    for route in Route.objects.all():
+        rows = route.stops.order_by('order', 'id').values_list('city_id', 'day_of_week', 'order')
+        stops = [(city_id, day, order or index) for index, (city_id, day, order) in enumerate(rows, start=1)]
+        seen = set()
+        for i, (from_city, day, from_order) in enumerate(stops):
+            for to_city, _, to_order in stops[i + 1:]:
+                key = (from_city, to_city, day)
+                if to_city == from_city or key in seen:
+                    continue
+                seen.add(key)
+                segments.append(RouteSegment(
+                    route_id=route.pk, from_city_id=from_city, to_city_id=to_city,
+                    day_of_week=day, from_order=from_order, to_order=to_order,
+                ))
+    RouteSegment.objects.bulk_create(segments, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('city', '0002_city_slug'),
+        ('trips', '0008_distancecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_of_week', models.IntegerField(choices=[(1, 'Понеділок'), (2, 'Вівторок'), (3, 'Середа'), (4, 'Четвер'), (5, "П'ятниця"), (6, 'Субота'), (7, 'Неділя')], verbose_name='День тижня')),
+                ('from_order', models.PositiveIntegerField(verbose_name='Порядок посадки')),
+                ('to_order', models.PositiveIntegerField(verbose_name='Порядок висадки')),
+                ('from_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments_from', to='city.city')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='trips.route')),
+                ('to_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments_to', to='city.city')),
+            ],
+            options={
+                'verbose_name': 'Сегмент маршруту',
+                'verbose_name_plural': 'Сегменти маршрутів',
+                'indexes': [models.Index(fields=['from_city', 'to_city', 'day_of_week'], name='trips_segment_search_idx')],
+                'unique_together': {('route', 'from_city', 'to_city', 'day_of_week')},
+            },
+        ),
+        migrations.RunPython(build_segments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_routesegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='distancecache',
+            name='is_estimate',
+            field=models.BooleanField(default=False, verbose_name='Оцінка'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0010_distancecache_is_estimate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='symmetric_distance',
+            field=models.BooleanField(default=True, help_text='Дозволяє брати відстань Б→А з кешу для напрямку А→Б', verbose_name='Однакова відстань в обидва боки'),
+        ),
+    ]
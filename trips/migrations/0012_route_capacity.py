@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0011_route_symmetric_distance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='capacity',
+            field=models.PositiveIntegerField(default=50, help_text='Скільки пасажирів автобус може везти на кожній ділянці маршруту', verbose_name='Кількість місць'),
+        ),
+    ]
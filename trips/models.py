@@ -23,6 +23,17 @@ class Route(models.Model):
         help_text="Чи приймає цей маршрут посилки для передачі"
     )
 
+    capacity = models.PositiveIntegerField(
+        default=50,
+        verbose_name="Кількість місць",
+        help_text="Скільки пасажирів автобус може везти на кожній ділянці маршруту"
+    )
+    symmetric_distance = models.BooleanField(
+        default=True,
+        verbose_name="Однакова відстань в обидва боки",
+        help_text="Дозволяє брати відстань Б→А з кешу для напрямку А→Б"
+    )
+
     # --- Поля для цін (залишаються як були) ---
     min_trip_price = models.DecimalField(max_digits=10, decimal_places=2, default=0,
                                          verbose_name="Мінімальна ціна поїздки")
@@ -31,6 +42,9 @@ class Route(models.Model):
                                            verbose_name="Мінімальна ціна посилки")
     price_per_kg = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Ціна за 1 кг")
 
+    # Оновлюється при кожному збереженні маршруту (і його зупинок через форму) — lastmod у sitemap
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Оновлено")
+
     class Meta:
         verbose_name = "Маршрут"
         verbose_name_plural = "Маршрути"
@@ -48,7 +62,12 @@ class Route(models.Model):
     # === ВСТАВЛЯЙТЕ СЮДИ (всередині класу Route) ===
     def get_schedule_days(self):
         # Отримуємо всі унікальні номери днів із зупинок цього маршруту
-        day_numbers = self.stops.values_list('day_of_week', flat=True).distinct().order_by('day_of_week')
+        prefetched = getattr(self, '_prefetched_objects_cache', {}).get('stops')
+        if prefetched is not None:
+            # Зупинки вже завантажені prefetch_related — без окремого запиту на кожен маршрут
+            day_numbers = sorted({stop.day_of_week for stop in prefetched})
+        else:
+            day_numbers = self.stops.values_list('day_of_week', flat=True).distinct().order_by('day_of_week')
 
         # Словник для перетворення цифр у назви
         days_map = {
@@ -94,13 +113,40 @@ class RouteStop(models.Model):
     def __str__(self):
         return f"{self.get_day_of_week_display()} {self.departure_time} - {self.city.name}"
 
+
 class DistanceCache(models.Model):
     city_from = models.ForeignKey(City, on_delete=models.CASCADE, related_name='from_distances')
     city_to = models.ForeignKey(City, on_delete=models.CASCADE, related_name='to_distances')
     distance_km = models.DecimalField(max_digits=10, decimal_places=2)
+    # True — відстань оцінена за прямою (haversine), коли маршрутизатор був недоступний
+    is_estimate = models.BooleanField(default=False, verbose_name="Оцінка")
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('city_from', 'city_to')
         verbose_name = "Кеш відстані"
-        verbose_name_plural = "Кеш відстаней"
\ No newline at end of file
+        verbose_name_plural = "Кеш відстаней"
+
+class RouteSegment(models.Model):
+    """
+    Денормалізований індекс пошуку: одна впорядкована пара зупинок маршруту
+    (звідки → куди) для дня відправлення з першої зупинки пари.
+    Перебудовується з RouteStop при кожному збереженні маршруту.
+    """
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='segments')
+    from_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='segments_from')
+    to_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='segments_to')
+    day_of_week = models.IntegerField(choices=RouteStop.DAYS_OF_WEEK, verbose_name="День тижня")
+    from_order = models.PositiveIntegerField(verbose_name="Порядок посадки")
+    to_order = models.PositiveIntegerField(verbose_name="Порядок висадки")
+
+    class Meta:
+        verbose_name = "Сегмент маршруту"
+        verbose_name_plural = "Сегменти маршрутів"
+        unique_together = ('route', 'from_city', 'to_city', 'day_of_week')
+        indexes = [
+            models.Index(fields=['from_city', 'to_city', 'day_of_week'], name='trips_segment_search_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.route_id}: {self.from_city_id} → {self.to_city_id} ({self.day_of_week})"
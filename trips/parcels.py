@@ -0,0 +1,147 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.utils import timezone
+
+from booking.utils import get_stored_distances
+from city.resolver import city_resolver
+
+from . import pricing
+from .models import Route, RouteSegment
+from .services import carrier_display_name, route_card_stops
+
+# Обмеження, щоб один запит не міг зайняти воркер надовго
+MAX_BATCH_SIZE = 200
+MAX_WEIGHT_KG = Decimal('1000')
+MAX_OFFERS = 20
+DEFAULT_OFFERS = 5
+
+
+class ParcelQuoteError(ValueError):
+    """Некоректні дані відправлення — текст помилки віддається клієнту."""
+
+
+class ParcelQuoteService:
+    """
+    Пропозиції доставки посилок маршрутами з is_parcel.
+    Маршрути шукаються за індексом сегментів (trips.RouteSegment), ціни — пакетом через trips.pricing,
+    відстань береться лише з кешу відстаней (без OSRM), тож відповідь не залежить від зовнішніх сервісів.
+    Пакет будь-якого розміру — це кілька запитів до БД: сегменти, маршрути, зупинки і відстані, яких немає в кеші.
+    """
+
+    @staticmethod
+    def parse(data):
+        """Перевіряє одне відправлення: from/to (назва, slug або id), weight (кг), date (необов'язково)."""
+        origin = city_resolver.resolve_id(data.get('from_slug'), data.get('from'))
+        destination = city_resolver.resolve_id(data.get('to_slug'), data.get('to'))
+        if not origin or not destination:
+            raise ParcelQuoteError("Не вдалося визначити місто відправлення або призначення.")
+        if origin == destination:
+            raise ParcelQuoteError("Місто відправлення і призначення збігаються.")
+
+        try:
+            weight = Decimal(str(data.get('weight', '')).replace(',', '.'))
+        except InvalidOperation:
+            raise ParcelQuoteError("Вкажіть вагу посилки в кілограмах.")
+        if not weight.is_finite() or not Decimal('0') < weight <= MAX_WEIGHT_KG:
+            raise ParcelQuoteError(f"Вага посилки має бути від 0 до {MAX_WEIGHT_KG} кг.")
+
+        trip_date = None
+        if data.get('date'):
+            try:
+                trip_date = datetime.strptime(str(data['date']), '%Y-%m-%d').date()
+            except ValueError:
+                raise ParcelQuoteError("Дата має бути у форматі РРРР-ММ-ДД.")
+
+        try:
+            limit = min(max(int(data.get('limit') or DEFAULT_OFFERS), 1), MAX_OFFERS)
+        except (TypeError, ValueError):
+            limit = DEFAULT_OFFERS
+
+        return {'origin': origin, 'destination': destination, 'weight': weight,
+                'date': trip_date, 'limit': limit}
+
+    @staticmethod
+    def _candidates(shipments):
+        """{(from, to): {день тижня: {route_id, ...}}} для всіх напрямків пакета одним запитом."""
+        pairs = {(s['origin'], s['destination']) for s in shipments}
+        condition = Q()
+        for origin, destination in pairs:
+            condition |= Q(from_city_id=origin, to_city_id=destination)
+
+        corridors = {}
+        for from_id, to_id, day, route_id in (
+            RouteSegment.objects.filter(condition, route__is_active=True, route__is_parcel=True)
+            .values_list('from_city_id', 'to_city_id', 'day_of_week', 'route_id')
+        ):
+            corridors.setdefault((from_id, to_id), {}).setdefault(day, set()).add(route_id)
+        return corridors
+
+    @staticmethod
+    def _distances(shipments):
+        """Відстані з кешу для напрямків пакета (і зворотних — для симетричних маршрутів), без OSRM."""
+        pairs = {(s['origin'], s['destination']) for s in shipments}
+        return get_stored_distances(pairs | {(to_id, from_id) for from_id, to_id in pairs})
+
+    @staticmethod
+    def quote(shipments):
+        """
+        Ранжовані пропозиції для кожного відправлення (результат parse): дешевші вище,
+        за однакової ціни — маршрути з активним ТОПом, далі — раніший виїзд.
+        """
+        if not shipments:
+            return []
+        corridors = ParcelQuoteService._candidates(shipments)
+        today = timezone.localdate().isoweekday()
+
+        matches = []
+        for shipment in shipments:
+            days = corridors.get((shipment['origin'], shipment['destination']), {})
+            if shipment['date']:
+                days = {day: days[day] for day in (shipment['date'].isoweekday(),) if day in days}
+            # Маршрут, що їде кілька днів на тиждень, пропонуємо один раз — на найближчий від сьогодні день
+            found = {}
+            for day in sorted(days, key=lambda d: (d - today) % 7):
+                for route_id in days[day]:
+                    found.setdefault(route_id, day)
+            matches.append(found)
+
+        route_ids = set().union(*matches)
+        routes = Route.objects.select_related('carrier__carrier_profile').prefetch_related(
+            route_card_stops()
+        ).in_bulk(route_ids) if route_ids else {}
+        distances = ParcelQuoteService._distances(shipments) if routes else {}
+
+        # Ціни для всіх пар (відправлення, маршрут) — одним пакетним викликом
+        flat = [(index, routes[route_id]) for index, found in enumerate(matches) for route_id in found
+                if route_id in routes]
+        prices = pricing.quote([route for _, route in flat], [shipments[index]['weight'] for index, _ in flat],
+                               kind='parcel')
+
+        offers = [[] for _ in shipments]
+        for (index, route), price in zip(flat, prices):
+            shipment = shipments[index]
+            day = matches[index][route.pk]
+            stop = next((s for s in route.stops.all()
+                         if s.city_id == shipment['origin'] and s.day_of_week == day), None)
+            distance = distances.get((shipment['origin'], shipment['destination']))
+            if distance is None and route.symmetric_distance:
+                distance = distances.get((shipment['destination'], shipment['origin']))
+            offers[index].append({
+                'route_id': route.pk,
+                'title': route.title,
+                'carrier': carrier_display_name(route.carrier),
+                'price': str(price),
+                'currency': 'UAH',
+                'day_of_week': day,
+                'departure_time': stop.departure_time.strftime('%H:%M') if stop else None,
+                'distance_km': str(distance) if distance is not None else None,
+                'is_boosted': route.is_boosted,
+            })
+
+        for shipment, shipment_offers in zip(shipments, offers):
+            shipment_offers.sort(key=lambda o: (Decimal(o['price']), not o['is_boosted'],
+                                                o['departure_time'] or '99:99', o['route_id']))
+            del shipment_offers[shipment['limit']:]
+        return offers
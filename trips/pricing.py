@@ -0,0 +1,88 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необов'язковий: без нього рахуємо чистим Python
+    np = None
+
+# Тариф = (ставка за одиницю, мінімальна ціна) — поля Route
+TARIFFS = {
+    'passenger': ('price_per_km', 'min_trip_price'),
+    'parcel': ('price_per_kg', 'min_parcel_price'),
+}
+
+# Кількість (км, кг) зберігаємо в тисячних частках одиниці, гроші — в копійках
+QUANTITY_SCALE = 1000
+# З якого розміру пакета має сенс NumPy (на малих видачах накладні витрати більші за виграш)
+NUMPY_MIN_BATCH = getattr(settings, 'PRICING_NUMPY_MIN_BATCH', 256)
+# Межа, за якої добуток ставки і кількості ще гарантовано вміщується в int64
+INT64_SAFE = 2 ** 62
+
+
+def to_kopiykas(value):
+    """Decimal/int/str у цілі копійки (половина копійки округлюється вгору)."""
+    return int((Decimal(str(value or 0)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_kopiykas(kopiykas):
+    return Decimal(int(kopiykas)).scaleb(-2)
+
+
+def _to_quantity(value):
+    return int((Decimal(str(value or 0)) * QUANTITY_SCALE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _quote_python(rates, minimums, quantities):
+    prices = []
+    for rate, minimum, quantity in zip(rates, minimums, quantities):
+        if rate > 0 and quantity > 0:
+            # Ціле ділення з округленням: (a + b/2) // b
+            price = (rate * quantity + QUANTITY_SCALE // 2) // QUANTITY_SCALE
+            prices.append(max(price, minimum))
+        else:
+            prices.append(minimum)
+    return prices
+
+
+def _quote_numpy(rates, minimums, quantities):
+    rates = np.asarray(rates, dtype=np.int64)
+    minimums = np.asarray(minimums, dtype=np.int64)
+    quantities = np.asarray(quantities, dtype=np.int64)
+    raw = (rates * quantities + QUANTITY_SCALE // 2) // QUANTITY_SCALE
+    prices = np.where((rates > 0) & (quantities > 0), np.maximum(raw, minimums), minimums)
+    return prices.tolist()
+
+
+def quote_kopiykas(rates, minimums, quantities):
+    """
+    Пакетний розрахунок у цілих числах: max(кількість × ставка, мінімум), або мінімум,
+    якщо ставки чи кількості немає. rates/minimums — копійки, quantities — тисячні одиниці.
+    """
+    if not rates:
+        return []
+    use_numpy = (
+        np is not None and len(rates) >= NUMPY_MIN_BATCH
+        and max(rates) * max(quantities) < INT64_SAFE and max(minimums) < INT64_SAFE
+    )
+    return (_quote_numpy if use_numpy else _quote_python)(rates, minimums, quantities)
+
+
+def quote(routes, quantities, kind='passenger'):
+    """
+    Ціни для цілого набору маршрутів одним викликом, точно в Decimal (грн з копійками).
+    quantities — відстань (км) для пасажирів або вага (кг) для посилок:
+    одне значення для всіх маршрутів або послідовність тієї ж довжини, що й routes.
+    """
+    rate_field, minimum_field = TARIFFS[kind]
+    routes = list(routes)
+    if not isinstance(quantities, (list, tuple)):
+        quantities = [quantities] * len(routes)
+
+    prices = quote_kopiykas(
+        [to_kopiykas(getattr(route, rate_field)) for route in routes],
+        [to_kopiykas(getattr(route, minimum_field)) for route in routes],
+        [_to_quantity(quantity) for quantity in quantities],
+    )
+    return [from_kopiykas(price) for price in prices]
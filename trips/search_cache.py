@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+# Навіть без змін готова видача живе не довше за цей час (відстані, ціни з кешу відстаней)
+SEARCH_CACHE_TTL = getattr(settings, 'SEARCH_CACHE_TTL', 60 * 10)
+SEARCH_CACHE_STATS_KEYS = {'hits': 'search_cache:hits', 'misses': 'search_cache:misses'}
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _route_key(route_id):
+    return f"search_cache:route:{route_id}"
+
+
+def _city_key(city_id):
+    return f"search_cache:city:{city_id}"
+
+
+def invalidate_search_route(route_id, city_ids=()):
+    """
+    Скидає видачі, у яких є маршрут (версія маршруту), і видачі за напрямками
+    з його містами, куди маршрут міг щойно потрапити (версії міст).
+    Версії змінюються після коміту, щоб паралельний пошук не закешував старий стан.
+    """
+    keys = [_route_key(route_id)] + [_city_key(city_id) for city_id in set(city_ids)]
+
+    def bump():
+        for key in keys:
+            _bump(key)
+
+    transaction.on_commit(bump)
+
+
+def _count(name):
+    try:
+        cache.incr(SEARCH_CACHE_STATS_KEYS[name])
+    except ValueError:
+        cache.add(SEARCH_CACHE_STATS_KEYS[name], 1, None)
+
+
+def search_cache_stats():
+    values = cache.get_many(SEARCH_CACHE_STATS_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in SEARCH_CACHE_STATS_KEYS.items()}
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else None
+    return stats
+
+
+class SearchResultCache:
+    """
+    Готова (відрендерена) видача пошуку за нормалізованим напрямком:
+    канонічні міста, дата поїздки (або будь-який день) і варіант сторінки.
+    Запис дійсний, поки не змінились версії обох міст і всіх маршрутів у видачі;
+    ТОП, що закінчується раніше за SEARCH_CACHE_TTL, скорочує час життя запису.
+    Версії й записи лежать у кеші Django за замовчуванням: з кількома воркерами він має бути
+    спільним (REDIS_URL, див. CACHES у config/settings.py). З LocMemCache бронювання в одному
+    процесі не скидає видачу інших, і вони показують старі вільні місця до SEARCH_CACHE_TTL.
+    """
+
+    def __init__(self, start_city_id, end_city_id, trip_date=None, variant=''):
+        day = trip_date.isoformat() if trip_date else 'any'
+        self.key = f"search_cache:result:{start_city_id}:{end_city_id}:{day}:{variant}"
+        self.city_keys = [_city_key(start_city_id), _city_key(end_city_id)]
+        self.city_versions = None
+
+    def get(self):
+        found = cache.get_many([self.key, *self.city_keys])
+        # Версії міст запам'ятовуємо до пошуку: зміна під час рендеру дасть промах наступного разу
+        self.city_versions = [found.get(key, 0) for key in self.city_keys]
+        entry = found.get(self.key)
+        if entry is not None and entry['city_versions'] == self.city_versions:
+            route_keys = [_route_key(pk) for pk in entry['routes']]
+            versions = cache.get_many(route_keys)
+            if [versions.get(key, 0) for key in route_keys] == entry['route_versions']:
+                _count('hits')
+                return entry
+        _count('misses')
+        return None
+
+    def route_versions(self, routes):
+        """Версії маршрутів видачі — читаються одразу після запиту, до розрахунків і рендеру."""
+        route_keys = [_route_key(route.pk) for route in routes]
+        versions = cache.get_many(route_keys)
+        return [versions.get(key, 0) for key in route_keys]
+
+    def set(self, routes, route_versions, html, **extra):
+        now = timezone.now()
+        timeout = SEARCH_CACHE_TTL
+        boosts = [route.top_until for route in routes if route.top_until and route.top_until > now]
+        if boosts:
+            # Після закінчення ТОПу змінюється порядок і бейдж — запис має зникнути разом з ним
+            timeout = max(1, min(timeout, int((min(boosts) - now).total_seconds()) + 1))
+        cache.set(self.key, {
+            'city_versions': self.city_versions,
+            'routes': [route.pk for route in routes],
+            'route_versions': route_versions,
+            'html': html,
+            **extra,
+        }, timeout)
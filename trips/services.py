@@ -0,0 +1,81 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import RouteSegment, RouteStop
+
+
+def build_segment_rows(stops):
+    """
+    Перетворює впорядковані зупинки маршруту на пари (звідки → куди).
+    stops — послідовність (city_id, day_of_week, order), відсортована за order.
+    Для кожної пари міст і дня лишається перше входження (найраніша посадка).
+    """
+    segments = {}
+    for i, (from_city, day, from_order) in enumerate(stops):
+        for to_city, _, to_order in stops[i + 1:]:
+            if to_city == from_city:
+                continue
+            segments.setdefault((from_city, to_city, day), (from_order, to_order))
+    return segments
+
+
+@transaction.atomic
+def rebuild_route_segments(route):
+    """Повністю перебудовує індекс пошуку для одного маршруту."""
+    rows = route.stops.order_by('order', 'id').values_list('city_id', 'day_of_week', 'order')
+    # Порожній order трапляється у старих даних — тоді беремо позицію в списку
+    stops = [(city_id, day, order or index) for index, (city_id, day, order) in enumerate(rows, start=1)]
+
+    RouteSegment.objects.filter(route=route).delete()
+    RouteSegment.objects.bulk_create([
+        RouteSegment(
+            route=route,
+            from_city_id=from_city,
+            to_city_id=to_city,
+            day_of_week=day,
+            from_order=from_order,
+            to_order=to_order,
+        )
+        for (from_city, to_city, day), (from_order, to_order) in build_segment_rows(stops).items()
+    ])
+
+
+def find_route_ids(start_city_id, end_city_id, day=None):
+    """
+    Підзапит з id маршрутів, що везуть зі start_city_id до end_city_id.
+    day — номер дня тижня (1-7) посадки; без нього шукаємо на будь-який день.
+    """
+    segments = RouteSegment.objects.filter(from_city=start_city_id, to_city=end_city_id)
+    if day:
+        segments = segments.filter(day_of_week=day)
+    return segments.values('route')
+
+
+def route_card_stops():
+    """Prefetch зупинок у порядку маршруту разом із містами — для карток у видачі пошуку."""
+    return Prefetch('stops', queryset=RouteStop.objects.select_related('city').order_by('order', 'id'))
+
+
+def carrier_display_name(carrier):
+    try:
+        company_name = carrier.carrier_profile.company_name
+    except ObjectDoesNotExist:
+        company_name = None
+    return company_name or carrier.username
+
+
+def prepare_route_cards(routes):
+    """
+    Готує для кожного маршруту дані картки: першу й останню зупинку, назви міст,
+    дні графіка та назву перевізника. Очікує маршрути з route_card_stops()
+    і select_related('carrier__carrier_profile'), тож нових запитів не робить.
+    """
+    for route in routes:
+        stops = list(route.stops.all())
+        route.first_stop = stops[0] if stops else None
+        route.last_stop = stops[-1] if stops else None
+        route.stop_names = [stop.city.name for stop in stops]
+        route.schedule_days = route.get_schedule_days()
+        route.carrier_name = carrier_display_name(route.carrier)
+    return routes
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .context_processors import invalidate_popular_directions
+from .models import Route, RouteStop
+from .search_cache import invalidate_search_route
+from .sitemaps import invalidate_sitemaps
+
+
+@receiver([post_save, post_delete], sender=Route)
+@receiver([post_save, post_delete], sender=RouteStop)
+def invalidate_route_caches(sender, **kwargs):
+    invalidate_sitemaps()
+    invalidate_popular_directions()
+
+
+@receiver(post_save, sender=Route)
+def invalidate_route_search(sender, instance, **kwargs):
+    # Маршрут міг стати активним — тоді він з'являється у видачах за всіма своїми містами
+    city_ids = instance.stops.values_list('city_id', flat=True) if instance.is_active else ()
+    invalidate_search_route(instance.pk, list(city_ids))
+
+
+@receiver(post_delete, sender=Route)
+def forget_route_search(sender, instance, **kwargs):
+    invalidate_search_route(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=RouteStop)
+def invalidate_stop_search(sender, instance, **kwargs):
+    invalidate_search_route(instance.route_id, [instance.city_id])
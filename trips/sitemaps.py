@@ -1,14 +1,58 @@
-from .models import Route
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.sitemaps import Sitemap
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse
 from django.urls import reverse
 
-class StaticViewSitemap(Sitemap):
-    priority = 1.0
-    changefreq = 'monthly'
-    def items(self):
-        return ['home']
-    def location(self, item):
-        return reverse(item)
+from .models import Route, RouteSegment
+
+# Ключ версії: змінюється при збереженні маршрутів, зупинок і міст (trips/signals.py, city/signals.py)
+SITEMAP_VERSION_KEY = 'sitemap_version'
+# Навіть без змін готовий sitemap перебудовується не рідше ніж раз на добу
+SITEMAP_CACHE_TTL = getattr(settings, 'SITEMAP_CACHE_TTL', 60 * 60 * 24)
+CACHED_HEADERS = ('Content-Type', 'Last-Modified', 'X-Robots-Tag')
+
+
+def invalidate_sitemaps():
+    try:
+        cache.incr(SITEMAP_VERSION_KEY)
+    except ValueError:
+        cache.set(SITEMAP_VERSION_KEY, 1, None)
+
+
+def cached_sitemap(view):
+    """
+    Зберігає відрендерений sitemap (індекс або сторінку секції) у кеші до зміни версії,
+    тож запити пошукових роботів не звертаються до БД.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        version = cache.get(SITEMAP_VERSION_KEY, 0)
+        # Лише шлях і номер сторінки — довільні параметри не повинні засмічувати кеш
+        key = f"sitemap:{version}:{request.get_host()}:{request.path}:{request.GET.get('p', '1')}"
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for name, value in headers.items():
+                response[name] = value
+            return response
+
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code == 200:
+            headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+            cache.set(key, (response.content, headers), SITEMAP_CACHE_TTL)
+        return response
+
+    return wrapper
+
+
 class StaticViewSitemap(Sitemap):
     priority = 1.0
     changefreq = 'monthly'
@@ -21,44 +65,32 @@ class StaticViewSitemap(Sitemap):
         return reverse(item)
 
 
-
-
-
 class RouteSitemap(Sitemap):
+    """
+    Сторінки пошуку для кожної унікальної пари міст (посадка → висадка) активних маршрутів.
+    Пари беруться з індексу RouteSegment (вже розкладеного при збереженні маршруту)
+    і дедуплікуються в БД, тож тут немає квадратичного перебору зупинок.
+    """
     priority = 0.7
     changefreq = 'daily'
+    # Кожна сторінка секції — не більше 10 000 адрес (ліміт протоколу — 50 000)
+    limit = 10000
 
     def items(self):
-        # Отримуємо маршрути, у яких 2 або більше зупинок
-        return Route.objects.filter(is_active=True).prefetch_related('stops__city')
-
-    def location(self, obj):
-        # Цей метод за замовчуванням повертає одне посилання.
-        # Але ми використаємо хитрість: повернемо головну пару,
-        # а для інших комбінацій краще створити окрему логіку.
-        stops = obj.stops.all().order_by('order')
-        if stops.count() >= 2:
-            return f"/booking/?start_city={stops.first().city.name}&end_city={stops.last().city.name}"
-        return "/booking/"
-
-    # Щоб проіндексувати ВСІ зупинки, краще перевизначити логіку:
-    def get_urls(self, site=None, **kwargs):
-        urls = []
-        for route in self.items():
-            stops = list(route.stops.all().order_by('order'))
-            # Генеруємо всі можливі пари міст (зберігаючи черговість)
-            for i in range(len(stops)):
-                for j in range(i + 1, len(stops)):
-                    start = stops[i].city.name
-                    end = stops[j].city.name
-
-                    url_info = {
-                        'item': route,
-                        'location': f"https://{site.domain}/booking/?start_city={start}&end_city={end}",
-                        'lastmod': None,  # Можна додати дату оновлення маршруту
-                        'changefreq': self.changefreq,
-                        'priority': self.priority
-                    }
-                    urls.append(url_info)
-        return urls
+        return (
+            RouteSegment.objects.filter(route__is_active=True)
+            .values('from_city__name', 'to_city__name')
+            .annotate(lastmod=Max('route__updated_at'))
+            .order_by('from_city__name', 'to_city__name')
+        )
+
+    def location(self, item):
+        query = urlencode({'start_city': item['from_city__name'], 'end_city': item['to_city__name']})
+        return f"{reverse('booking_route_list')}?{query}"
+
+    def lastmod(self, item):
+        return item['lastmod']
 
+    def get_latest_lastmod(self):
+        # Для індексу: без перебору всіх пар
+        return Route.objects.filter(is_active=True).aggregate(latest=Max('updated_at'))['latest']
@@ -1,3 +1,618 @@
-from django.test import TestCase
+import json
+import random
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from urllib.parse import urlencode
+from unittest import mock, skipIf
 
-# Create your tests here.
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CarrierProfile
+from booking.utils import distance_lru
+from booking.models import Booking
+from city.models import City, Country
+
+from . import context_processors, pricing
+from .models import DistanceCache, Route, RouteSegment, RouteStop
+from .parcels import MAX_BATCH_SIZE, MAX_OFFERS, ParcelQuoteError, ParcelQuoteService
+from .pricing import NUMPY_MIN_BATCH, from_kopiykas, quote, quote_kopiykas, to_kopiykas
+from .services import (
+    build_segment_rows, find_route_ids, prepare_route_cards, rebuild_route_segments, route_card_stops,
+)
+
+
+class KopiykasTests(SimpleTestCase):
+    def test_to_kopiykas_rounds_half_up(self):
+        self.assertEqual(to_kopiykas(Decimal('12.34')), 1234)
+        self.assertEqual(to_kopiykas('0.005'), 1)
+        self.assertEqual(to_kopiykas('0.004'), 0)
+        self.assertEqual(to_kopiykas(7), 700)
+        self.assertEqual(to_kopiykas(None), 0)
+        # float іде через str — без хвоста двійкового подання
+        self.assertEqual(to_kopiykas(0.1 + 0.2), 30)
+
+    def test_from_kopiykas_is_exact_decimal(self):
+        self.assertEqual(from_kopiykas(1234), Decimal('12.34'))
+        self.assertEqual(str(from_kopiykas(5)), '0.05')
+        self.assertEqual(from_kopiykas(to_kopiykas('999999.99')), Decimal('999999.99'))
+
+
+class QuoteKopiykasTests(SimpleTestCase):
+    def test_rate_times_quantity_with_minimum(self):
+        # 2.50 грн/км × 123.456 км = 308.64 грн; 1.00 грн/км × 10 км не дотягує до мінімуму 50 грн
+        self.assertEqual(quote_kopiykas([250, 100], [0, 5000], [123456, 10000]), [30864, 5000])
+
+    def test_missing_rate_or_quantity_gives_minimum(self):
+        self.assertEqual(quote_kopiykas([0, 250, 0], [4000, 4000, 0], [10000, 0, 0]), [4000, 4000, 0])
+        self.assertEqual(quote_kopiykas([], [], []), [])
+
+    def test_half_kopiyka_rounds_up(self):
+        # 0.01 грн/км × 0.5 км = 0.005 грн → 0.01 грн
+        self.assertEqual(quote_kopiykas([1], [0], [500]), [1])
+        self.assertEqual(quote_kopiykas([1], [0], [499]), [0])
+
+    @skipIf(pricing.np is None, "NumPy не встановлено")
+    def test_numpy_matches_python(self):
+        rnd = random.Random(19)
+        size = NUMPY_MIN_BATCH * 2
+        rates = [rnd.choice([0, rnd.randint(1, 10 ** 6)]) for _ in range(size)]
+        minimums = [rnd.randint(0, 10 ** 5) for _ in range(size)]
+        quantities = [rnd.choice([0, rnd.randint(1, 10 ** 7)]) for _ in range(size)]
+
+        with mock.patch.object(pricing, '_quote_python', wraps=pricing._quote_python) as python:
+            prices = quote_kopiykas(rates, minimums, quantities)
+        python.assert_not_called()
+        self.assertEqual(prices, pricing._quote_python(rates, minimums, quantities))
+        self.assertTrue(all(type(price) is int for price in prices))
+
+    def test_small_batch_and_missing_numpy_use_python(self):
+        with mock.patch.object(pricing, '_quote_numpy') as numpy_quote:
+            self.assertEqual(quote_kopiykas([250], [0], [1000]), [250])
+            with mock.patch.object(pricing, 'np', None):
+                size = NUMPY_MIN_BATCH
+                self.assertEqual(quote_kopiykas([250] * size, [0] * size, [1000] * size), [250] * size)
+        numpy_quote.assert_not_called()
+
+    @skipIf(pricing.np is None, "NumPy не встановлено")
+    def test_int64_overflow_falls_back_to_python(self):
+        size = NUMPY_MIN_BATCH
+        rates, quantities = [2 ** 40] * size, [2 ** 30] * size
+        with mock.patch.object(pricing, '_quote_numpy') as numpy_quote:
+            prices = quote_kopiykas(rates, [0] * size, quantities)
+        numpy_quote.assert_not_called()
+        self.assertEqual(prices[0], (2 ** 70 + 500) // 1000)
+
+
+class QuoteTests(SimpleTestCase):
+    def setUp(self):
+        self.routes = [
+            Route(price_per_km=Decimal('1.25'), min_trip_price=Decimal('100.00'),
+                  price_per_kg=Decimal('20.00'), min_parcel_price=Decimal('50.00')),
+            Route(price_per_km=Decimal('0.00'), min_trip_price=Decimal('350.00'),
+                  price_per_kg=Decimal('0.00'), min_parcel_price=Decimal('0.00')),
+        ]
+
+    def test_passenger_prices_for_common_distance(self):
+        self.assertEqual(quote(self.routes, Decimal('540.3')), [Decimal('675.38'), Decimal('350.00')])
+        self.assertEqual(quote(self.routes, 10), [Decimal('100.00'), Decimal('350.00')])
+
+    def test_parcel_prices_per_route_weight(self):
+        self.assertEqual(quote(self.routes, [Decimal('1.5'), 30], kind='parcel'),
+                         [Decimal('50.00'), Decimal('0.00')])
+        self.assertEqual(quote(self.routes, [3, 30], kind='parcel'), [Decimal('60.00'), Decimal('0.00')])
+
+    def test_unknown_distance_gives_minimum(self):
+        self.assertEqual(quote(self.routes, None), [Decimal('100.00'), Decimal('350.00')])
+
+    def test_large_batch_is_identical_with_and_without_numpy(self):
+        routes = self.routes * NUMPY_MIN_BATCH
+        distances = [Decimal(km) / 2 for km in range(len(routes))]
+        expected = quote(routes, distances)
+        with mock.patch.object(pricing, 'np', None):
+            self.assertEqual(quote(routes, distances), expected)
+        self.assertEqual(expected[2 * 100], Decimal('125.00'))
+        self.assertEqual(expected[2 * 10], Decimal('100.00'))
+        self.assertEqual(expected[2 * 100 + 1], Decimal('350.00'))
+
+
+class BuildSegmentRowsTests(SimpleTestCase):
+    def test_every_ordered_pair_with_boarding_day(self):
+        # Нічний рейс: посадка в п'ятницю, наступні зупинки вже в суботу
+        self.assertEqual(build_segment_rows([(1, 5, 1), (2, 6, 2), (3, 6, 3)]), {
+            (1, 2, 5): (1, 2), (1, 3, 5): (1, 3), (2, 3, 6): (2, 3),
+        })
+
+    def test_loop_keeps_earliest_boarding_and_skips_same_city(self):
+        # Кільце 1 → 2 → 1 → 3: пара 1→3 лишається з першої посадки, 1→1 не індексується
+        self.assertEqual(build_segment_rows([(1, 1, 1), (2, 1, 2), (1, 1, 3), (3, 1, 4)]), {
+            (1, 2, 1): (1, 2), (1, 3, 1): (1, 4), (2, 1, 1): (2, 3), (2, 3, 1): (2, 4),
+        })
+        self.assertEqual(build_segment_rows([(1, 1, 1)]), {})
+
+
+class SegmentIndexTests(TestCase):
+    """Нічний маршрут Київ (пт) → Рівне (сб) → Львів (сб) та неактивний Київ → Львів у п'ятницю."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Україна", code="UA")
+        cls.kyiv, cls.zhytomyr, cls.rivne, cls.lviv = [
+            City.objects.create(name=name, country=country) for name in ("Київ", "Житомир", "Рівне", "Львів")
+        ]
+        carrier = get_user_model().objects.create_user('carrier', is_carrier=True)
+        cls.night = Route.objects.create(carrier=carrier, title="Нічний Київ — Львів")
+        for order, (city, day, hour) in enumerate(((cls.kyiv, 5, 22), (cls.rivne, 6, 3), (cls.lviv, 6, 6)),
+                                                  start=1):
+            RouteStop.objects.create(route=cls.night, city=city, order=order, day_of_week=day,
+                                     departure_time=time(hour))
+        rebuild_route_segments(cls.night)
+        cls.inactive = Route.objects.create(carrier=carrier, title="Закритий Київ — Львів", is_active=False)
+        for order, city in enumerate((cls.kyiv, cls.lviv), start=1):
+            RouteStop.objects.create(route=cls.inactive, city=city, order=order, day_of_week=5,
+                                     departure_time=time(8))
+        rebuild_route_segments(cls.inactive)
+
+    def found(self, start, end, day=None):
+        return set(Route.objects.filter(pk__in=find_route_ids(start.pk, end.pk, day)).values_list('pk', flat=True))
+
+    def segments(self, route):
+        return set(RouteSegment.objects.filter(route=route).values_list(
+            'from_city_id', 'to_city_id', 'day_of_week', 'from_order', 'to_order'
+        ))
+
+    def test_index_follows_stop_order_and_boarding_day(self):
+        self.assertEqual(self.segments(self.night), {
+            (self.kyiv.pk, self.rivne.pk, 5, 1, 2), (self.kyiv.pk, self.lviv.pk, 5, 1, 3),
+            (self.rivne.pk, self.lviv.pk, 6, 2, 3),
+        })
+        self.assertEqual(self.found(self.kyiv, self.lviv, day=5), {self.night.pk, self.inactive.pk})
+        # День — це день посадки: у суботу з Києва рейсу немає, а з Рівного є
+        self.assertEqual(self.found(self.kyiv, self.lviv, day=6), set())
+        self.assertEqual(self.found(self.rivne, self.lviv, day=6), {self.night.pk})
+        self.assertEqual(self.found(self.rivne, self.lviv), {self.night.pk})
+        # Лише в напрямку руху
+        self.assertEqual(self.found(self.lviv, self.kyiv), set())
+
+    def test_inactive_route_is_indexed_but_not_offered_in_search(self):
+        cache.clear()
+        response = self.client.get(reverse('booking_route_list'), {
+            'start_city': "Київ", 'end_city': "Львів", 'date': next_weekday(5).isoformat(),
+        })
+        self.assertEqual([route.pk for route in response.context['routes']], [self.night.pk])
+
+    def test_rebuild_after_stop_edit(self):
+        # Рівне замінили на Житомир, а Львів став першою зупинкою суботнього зворотного рейсу
+        for city, order in ((self.lviv, 1), (self.kyiv, 2), (self.rivne, 3)):
+            self.night.stops.filter(city=city).update(order=order)
+        self.night.stops.filter(city=self.rivne).update(city=self.zhytomyr)
+        rebuild_route_segments(self.night)
+        self.assertEqual(self.segments(self.night), {
+            (self.lviv.pk, self.kyiv.pk, 6, 1, 2), (self.lviv.pk, self.zhytomyr.pk, 6, 1, 3),
+            (self.kyiv.pk, self.zhytomyr.pk, 5, 2, 3),
+        })
+        self.assertEqual(self.found(self.rivne, self.lviv), set())
+        self.assertEqual(self.found(self.lviv, self.zhytomyr, day=6), {self.night.pk})
+
+    def test_rebuild_command(self):
+        RouteSegment.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_route_segments', str(self.night.pk), stdout=out)
+        self.assertIn("Індекс перебудовано для маршрутів: 1", out.getvalue())
+        self.assertEqual(len(self.segments(self.night)), 3)
+        self.assertEqual(self.segments(self.inactive), set())
+
+
+class BuildDistanceCacheTests(TestCase):
+    """build_distance_cache з підміненим OSRM (get_osrm_table) — без мережі."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Україна", code="UA")
+        coords = {"Київ": (50.45, 30.52), "Житомир": (50.25, 28.66), "Рівне": (50.62, 26.25), "Львів": (49.84, 24.03)}
+        cls.kyiv, cls.zhytomyr, cls.rivne, cls.lviv = [
+            City.objects.create(name=name, country=country, latitude=lat, longitude=lon)
+            for name, (lat, lon) in coords.items()
+        ]
+        carrier = get_user_model().objects.create_user('carrier', is_carrier=True)
+        active = Route.objects.create(carrier=carrier, title="Київ — Рівне")
+        inactive = Route.objects.create(carrier=carrier, title="Рівне — Львів", is_active=False)
+        for route, cities in ((active, (cls.kyiv, cls.zhytomyr, cls.rivne)), (inactive, (cls.rivne, cls.lviv))):
+            for order, city in enumerate(cities, start=1):
+                RouteStop.objects.create(route=route, city=city, order=order, day_of_week=1,
+                                         departure_time=time(8 + order))
+
+    def setUp(self):
+        self.road = {(self.kyiv.pk, self.zhytomyr.pk): 140.2, (self.kyiv.pk, self.rivne.pk): 330.5,
+                     (self.zhytomyr.pk, self.rivne.pk): 190.0}
+        self.calls = []
+        self.failures = 0
+        table = mock.patch('trips.management.commands.build_distance_cache.get_osrm_table', side_effect=self.table)
+        table.start()
+        self.addCleanup(table.stop)
+        sleep = mock.patch('trips.management.commands.build_distance_cache.time.sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def table(self, sources, destinations, base_url=None, session=None, timeout=30):
+        self.calls.append({city.pk for city in sources} | {city.pk for city in destinations})
+        if self.failures:
+            self.failures -= 1
+            raise requests.exceptions.ConnectionError("OSRM недоступний")
+        return {(source.pk, destination.pk): self.road.get((source.pk, destination.pk))
+                for source in sources for destination in destinations}
+
+    def run_command(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('build_distance_cache', '--concurrency=1', *args, stdout=out, stderr=err)
+        return out.getvalue() + err.getvalue()
+
+    def stored(self):
+        return {(row.city_from_id, row.city_to_id): (row.distance_km, row.is_estimate)
+                for row in DistanceCache.objects.all()}
+
+    def test_osrm_distances_for_active_route_pairs(self):
+        output = self.run_command()
+        self.assertIn("Збережено з OSRM: 3, оцінок: 0", output)
+        self.assertEqual(self.stored(), {pair: (Decimal(str(km)), False) for pair, km in self.road.items()})
+        self.assertIn("Усі пари вже в кеші.", self.run_command())
+
+    def test_batches_respect_coordinate_limit(self):
+        self.run_command('--batch-size=2')
+        self.assertEqual(len(self.calls), 3)
+        self.assertTrue(all(len(cities) <= 2 for cities in self.calls))
+        self.assertEqual(len(self.stored()), 3)
+
+    def test_unroutable_pair_is_stored_as_estimate(self):
+        del self.road[(self.zhytomyr.pk, self.rivne.pk)]
+        self.assertIn("Збережено з OSRM: 2, оцінок: 1 (без маршруту в OSRM: 1)", self.run_command())
+        self.assertTrue(self.stored()[(self.zhytomyr.pk, self.rivne.pk)][1])
+        # Наступний запуск пару вже не запитує
+        self.calls.clear()
+        self.run_command()
+        self.assertEqual(self.calls, [])
+
+    def test_unroutable_pair_without_fallback_is_retried_next_run(self):
+        del self.road[(self.zhytomyr.pk, self.rivne.pk)]
+        self.run_command('--no-fallback')
+        self.assertNotIn((self.zhytomyr.pk, self.rivne.pk), self.stored())
+        self.assertIn("Пар до розрахунку: 1", self.run_command('--no-fallback'))
+
+    def test_retries_then_succeeds(self):
+        self.failures = 2
+        self.assertIn("Збережено з OSRM: 3", self.run_command('--retries=2'))
+        self.assertEqual(len(self.calls), 3)
+
+    def test_exhausted_retries_fall_back_to_estimates(self):
+        self.failures = 2
+        output = self.run_command('--retries=1')
+        self.assertIn("OSRM недоступний для пакета (3 пар)", output)
+        self.assertIn("Збережено з OSRM: 0, оцінок: 3", output)
+        self.assertTrue(all(is_estimate for _, is_estimate in self.stored().values()))
+
+    def test_offline_then_refine_estimates(self):
+        self.assertIn("Збережено оцінок: 3", self.run_command('--offline'))
+        self.assertEqual(self.calls, [])
+        self.assertIn("Збережено оцінок: 0", self.run_command('--offline', '--refine-estimates'))
+
+        del self.road[(self.zhytomyr.pk, self.rivne.pk)]
+        # Уточнені пари замінюють оцінки; пара без маршруту лишається оцінкою і не рахується вдруге
+        self.assertIn("Збережено з OSRM: 2, оцінок: 0 (без маршруту в OSRM: 1)",
+                      self.run_command('--refine-estimates'))
+        stored = self.stored()
+        self.assertEqual(stored[(self.kyiv.pk, self.rivne.pk)], (Decimal('330.50'), False))
+        self.assertTrue(stored[(self.zhytomyr.pk, self.rivne.pk)][1])
+        self.assertEqual(len(stored), 3)
+
+
+def next_weekday(day):
+    """Найближча дата (з завтрашньої) з isoweekday() == day."""
+    tomorrow = date.today() + timedelta(days=1)
+    return tomorrow + timedelta(days=(day - tomorrow.isoweekday()) % 7)
+
+
+@override_settings(DISTANCE_CACHE_ALIAS='default')
+class ParcelQuoteTests(TestCase):
+    """
+    Київ → Львів: у вівторок дешевий маршрут і такий самий за ціною в ТОПі,
+    у четвер — дорожчий через Житомир; маршрути без посилок і неактивні в пропозиції не потрапляють.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Україна", code="UA")
+        cls.kyiv, cls.zhytomyr, cls.lviv = [
+            City.objects.create(name=name, country=country) for name in ("Київ", "Житомир", "Львів")
+        ]
+        carrier = get_user_model().objects.create_user('carrier', is_carrier=True)
+        CarrierProfile.objects.create(user=carrier, company_name="Автолюкс", contact_person="Іван",
+                                      phone='+380501234567')
+
+        def route(title, day, hour, cities=None, **fields):
+            route = Route.objects.create(carrier=carrier, title=title, **fields)
+            for order, city in enumerate(cities or (cls.kyiv, cls.lviv), start=1):
+                RouteStop.objects.create(route=route, city=city, order=order, day_of_week=day,
+                                         departure_time=time(hour + order - 1))
+            rebuild_route_segments(route)
+            return route
+
+        parcel = {'price_per_kg': Decimal('5.00'), 'min_parcel_price': Decimal('0.00')}
+        cls.cheap = route("Дешевий", 2, 8, symmetric_distance=False, **parcel)
+        cls.boosted = route("У ТОПі", 2, 10, top_until=timezone.now() + timedelta(days=1), **parcel)
+        cls.pricey = route("Через Житомир", 4, 9, (cls.kyiv, cls.zhytomyr, cls.lviv),
+                           price_per_kg=Decimal('20.00'), min_parcel_price=Decimal('50.00'))
+        route("Без посилок", 2, 6, is_parcel=False, **parcel)
+        route("Неактивний", 2, 7, is_active=False, **parcel)
+        # Відстань є лише у зворотному напрямку — її бачать тільки симетричні маршрути
+        DistanceCache.objects.create(city_from=cls.lviv, city_to=cls.kyiv, distance_km=Decimal('540.30'))
+
+    def setUp(self):
+        # LRU відстаней живе в процесі між тестами, а id міст після відкату можуть повторитися
+        cache.clear()
+        distance_lru.clear()
+
+    def shipment(self, **data):
+        return ParcelQuoteService.parse({'from': "Київ", 'to': "Львів", 'weight': '3', **data})
+
+    def assertParseError(self, message, **data):
+        with self.assertRaisesMessage(ParcelQuoteError, message):
+            self.shipment(**data)
+
+    def test_parse_resolves_cities_and_normalises_values(self):
+        shipment = self.shipment(weight='2,5', date='2026-10-20', limit='7')
+        self.assertEqual(shipment, {'origin': self.kyiv.pk, 'destination': self.lviv.pk, 'weight': Decimal('2.5'),
+                                    'date': date(2026, 10, 20), 'limit': 7})
+        shipment = ParcelQuoteService.parse({'from_slug': self.kyiv.slug, 'to': str(self.lviv.pk), 'weight': 1000})
+        self.assertEqual((shipment['origin'], shipment['destination'], shipment['date']),
+                         (self.kyiv.pk, self.lviv.pk, None))
+
+    def test_parse_rejects_bad_shipments(self):
+        self.assertParseError("Не вдалося визначити місто", to="Одеса")
+        self.assertParseError("збігаються", to="київ")
+        for weight in ('', 'важка'):
+            with self.subTest(weight=weight):
+                self.assertParseError("в кілограмах", weight=weight)
+        for weight in ('0', '-1', '1000.01', 'NaN', 'Infinity'):
+            with self.subTest(weight=weight):
+                self.assertParseError("від 0 до 1000 кг", weight=weight)
+        self.assertParseError("РРРР-ММ-ДД", date='20.10.2026')
+
+    def test_parse_clamps_limit(self):
+        limits = {None: 5, '0': 1, '-3': 1, '100': MAX_OFFERS, 'багато': 5}
+        self.assertEqual({limit: self.shipment(limit=limit)['limit'] for limit in limits}, limits)
+
+    def test_offers_ranked_by_price_then_top_then_departure(self):
+        offers = ParcelQuoteService.quote([self.shipment()])[0]
+        self.assertEqual([(o['title'], o['price'], o['day_of_week'], o['departure_time']) for o in offers], [
+            ("У ТОПі", '15.00', 2, '10:00'),
+            ("Дешевий", '15.00', 2, '08:00'),
+            ("Через Житомир", '60.00', 4, '09:00'),
+        ])
+        self.assertEqual({o['title']: o['distance_km'] for o in offers},
+                         {"У ТОПі": '540.30', "Дешевий": None, "Через Житомир": '540.30'})
+        self.assertEqual({(o['carrier'], o['currency']) for o in offers}, {("Автолюкс", 'UAH')})
+
+        Route.objects.filter(pk=self.boosted.pk).update(top_until=None)
+        offers = ParcelQuoteService.quote([self.shipment(limit='2')])[0]
+        self.assertEqual([o['title'] for o in offers], ["Дешевий", "У ТОПі"])
+
+    def test_date_keeps_only_routes_of_that_weekday(self):
+        thursday = next_weekday(4).isoformat()
+        self.assertEqual([o['route_id'] for o in ParcelQuoteService.quote([self.shipment(date=thursday)])[0]],
+                         [self.pricey.pk])
+        saturday = next_weekday(6).isoformat()
+        self.assertEqual(ParcelQuoteService.quote([self.shipment(date=saturday)]), [[]])
+        # Проміжна зупинка теж є точкою відправлення
+        self.assertEqual([o['route_id'] for o in ParcelQuoteService.quote([self.shipment(to="Житомир")])[0]],
+                         [self.pricey.pk])
+
+    def test_quote_view(self):
+        response = self.client.get(reverse('parcel_quote'), {'from': "Київ", 'to': "Львів", 'weight': '3'})
+        self.assertEqual(len(response.json()['offers']), 3)
+
+        response = self.client.get(reverse('parcel_quote'), {'from': "Київ", 'to': "Львів", 'weight': '0'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("кг", response.json()['error'])
+
+    def test_batch_reports_errors_per_shipment(self):
+        def post(payload):
+            return self.client.post(reverse('parcel_quote_batch'), json.dumps(payload),
+                                    content_type='application/json')
+
+        response = post({'shipments': [
+            {'id': 'a', 'from': "Київ", 'to': "Львів", 'weight': '3', 'limit': 1},
+            {'id': 'b', 'from': "Київ", 'to': "Київ", 'weight': '3'},
+            {'id': 'c', 'from': "Львів", 'to': "Київ", 'weight': '3'},
+            {'id': 'd', 'from': "Київ", 'to': "Житомир", 'weight': '10'},
+        ]})
+        results = response.json()['results']
+        self.assertEqual([result['id'] for result in results], ['a', 'b', 'c', 'd'])
+        self.assertEqual([o['title'] for o in results[0]['offers']], ["У ТОПі"])
+        self.assertEqual(set(results[1]), {'id', 'error'})
+        self.assertEqual(results[2]['offers'], [])
+        self.assertEqual([o['price'] for o in results[3]['offers']], ['200.00'])
+
+        self.assertEqual(post({'shipments': 'Київ'}).status_code, 400)
+        self.assertEqual(post({'shipments': [{}] * (MAX_BATCH_SIZE + 1)}).status_code, 400)
+        response = self.client.post(reverse('parcel_quote_batch'), 'не json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SitemapCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Україна", code="UA")
+        cls.kyiv, cls.rivne, cls.lviv = [
+            City.objects.create(name=name, country=country) for name in ("Київ", "Рівне", "Львів")
+        ]
+        carrier = get_user_model().objects.create_user('carrier', is_carrier=True)
+        cls.route = Route.objects.create(carrier=carrier, title="Київ — Рівне")
+        for order, city in enumerate((cls.kyiv, cls.rivne), start=1):
+            RouteStop.objects.create(route=cls.route, city=city, order=order, day_of_week=1,
+                                     departure_time=time(8 + order))
+        rebuild_route_segments(cls.route)
+
+    def setUp(self):
+        cache.clear()
+
+    def to_lviv(self):
+        return urlencode({'end_city': "Львів"})
+
+    def test_section_is_served_from_cache_until_routes_change(self):
+        first = self.client.get('/sitemap-routes.xml')
+        self.assertContains(first, urlencode({'start_city': "Київ"}))
+        self.assertNotContains(first, self.to_lviv())
+        with self.assertNumQueries(0):
+            cached = self.client.get('/sitemap-routes.xml')
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached['Content-Type'], first['Content-Type'])
+
+        RouteStop.objects.create(route=self.route, city=self.lviv, order=3, day_of_week=1, departure_time=time(12))
+        rebuild_route_segments(self.route)
+        self.assertContains(self.client.get('/sitemap-routes.xml'), self.to_lviv())
+
+        self.route.is_active = False
+        self.route.save()
+        self.assertNotContains(self.client.get('/sitemap-routes.xml'), self.to_lviv())
+
+    def test_index_is_cached_and_errors_are_not(self):
+        self.assertContains(self.client.get('/sitemap.xml'), 'sitemap-routes.xml')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get('/sitemap.xml'), 'sitemap-routes.xml')
+        # Неіснуюча сторінка секції не кешується; сторонні параметри не створюють нових записів
+        self.assertEqual(self.client.get('/sitemap-routes.xml', {'p': 9}).status_code, 404)
+        self.assertEqual(self.client.get('/sitemap-routes.xml', {'p': 9}).status_code, 404)
+        self.client.get('/sitemap-routes.xml')
+        with self.assertNumQueries(0):
+            self.client.get('/sitemap-routes.xml', {'utm_source': 'bot'})
+
+
+class PopularDirectionsTests(TestCase):
+    """Активні Київ → Рівне і Київ → Львів та неактивний Рівне → Львів."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Україна", code="UA")
+        cls.kyiv, cls.rivne, cls.lviv = [
+            City.objects.create(name=name, country=country) for name in ("Київ", "Рівне", "Львів")
+        ]
+        carrier = get_user_model().objects.create_user('carrier', is_carrier=True)
+        cls.passenger = get_user_model().objects.create_user('passenger', is_passenger=True)
+        cls.routes = {}
+        for cities, is_active in (((cls.kyiv, cls.rivne), True), ((cls.kyiv, cls.lviv), True),
+                                  ((cls.rivne, cls.lviv), False)):
+            route = Route.objects.create(carrier=carrier, title=" — ".join(c.name for c in cities),
+                                         is_active=is_active)
+            for order, city in enumerate(cities, start=1):
+                RouteStop.objects.create(route=route, city=city, order=order, day_of_week=1,
+                                         departure_time=time(8 + order))
+            rebuild_route_segments(route)
+            cls.routes[cities] = route
+
+    def setUp(self):
+        cache.clear()
+
+    def directions(self):
+        return [(d['start_name'], d['end_name']) for d in context_processors.get_popular_directions()]
+
+    def book(self, start, end, seats=1, status='confirmed'):
+        return Booking.objects.create(
+            passenger=self.passenger, route=self.routes[(start, end)], trip_date=date.today(), seats_count=seats,
+            status=status, departure_point=start.name, arrival_point=end.name,
+            departure_city=start, arrival_city=end, total_price=Decimal('100.00'),
+        )
+
+    def test_ranked_by_booked_seats_and_refreshed_by_bookings(self):
+        # Без бронювань — кінцеві зупинки активних маршрутів, новіші першими
+        self.assertEqual(self.directions(), [("Київ", "Львів"), ("Київ", "Рівне")])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.directions(), [("Київ", "Львів"), ("Київ", "Рівне")])
+
+        self.book(self.kyiv, self.rivne, seats=2)
+        self.assertEqual(self.directions(), [("Київ", "Рівне"), ("Київ", "Львів")])
+        # Скасовані бронювання і напрямки без активного маршруту не рахуються
+        self.book(self.kyiv, self.lviv, seats=5, status='cancelled')
+        self.book(self.rivne, self.lviv, seats=5)
+        self.assertEqual(self.directions(), [("Київ", "Рівне"), ("Київ", "Львів")])
+
+    def test_route_changes_refresh_directions(self):
+        self.directions()
+        route = self.routes[(self.kyiv, self.lviv)]
+        route.is_active = False
+        route.save()
+        self.assertEqual(self.directions(), [("Київ", "Рівне")])
+
+    def test_lazy_context_queries_only_where_rendered(self):
+        with mock.patch.object(context_processors, 'get_popular_directions', return_value=[]) as popular:
+            self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+            popular.assert_not_called()
+            self.client.get(reverse('booking_route_list'))
+            popular.assert_called_once()
+
+
+class RouteCardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Україна", code="UA")
+        cls.kyiv, cls.rivne, cls.lviv = [
+            City.objects.create(name=name, country=country) for name in ("Київ", "Рівне", "Львів")
+        ]
+        cls.company = get_user_model().objects.create_user('company', is_carrier=True)
+        CarrierProfile.objects.create(user=cls.company, company_name="Автолюкс", contact_person="Іван",
+                                      phone='+380501234567')
+        cls.driver = get_user_model().objects.create_user('driver', is_carrier=True)
+        cls.route = cls.create_route(cls.company, days=(1, 3))
+
+    @classmethod
+    def create_route(cls, carrier, days=(1,)):
+        route = Route.objects.create(carrier=carrier, title="Київ — Львів")
+        order = 0
+        for day in days:
+            for city in (cls.kyiv, cls.rivne, cls.lviv):
+                order += 1
+                RouteStop.objects.create(route=route, city=city, order=order, day_of_week=day,
+                                         departure_time=time(8))
+        rebuild_route_segments(route)
+        return route
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('booking_route_list'), {'start_city': "Київ", 'end_city': "Рівне"})
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_cards_are_prepared_without_extra_queries(self):
+        self.create_route(self.driver)
+        routes = Route.objects.select_related('carrier__carrier_profile').prefetch_related(route_card_stops())
+        with self.assertNumQueries(2):
+            cards = {route.pk: route for route in prepare_route_cards(list(routes))}
+        card = cards[self.route.pk]
+        self.assertEqual((card.first_stop.city, card.last_stop.city), (self.kyiv, self.lviv))
+        self.assertEqual(card.stop_names, ["Київ", "Рівне", "Львів"] * 2)
+        self.assertEqual(card.schedule_days, "Пн, Ср")
+        self.assertEqual(card.carrier_name, "Автолюкс")
+        self.assertEqual([route.carrier_name for pk, route in cards.items() if pk != self.route.pk], ['driver'])
+
+    def test_search_queries_do_not_grow_with_results(self):
+        # Прогрів кешів процесу (довідник міст, LRU відстаней) — далі рахуємо лише запити видачі
+        self.search()
+        cache.clear()
+        response, single = self.search()
+        self.assertEqual(len(response.context['routes']), 1)
+        for carrier in (self.company, self.driver, self.driver):
+            self.create_route(carrier, days=(1, 5))
+        cache.clear()
+        response, several = self.search()
+        self.assertEqual(len(response.context['routes']), 4)
+        self.assertEqual(several, single)
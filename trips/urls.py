@@ -1,10 +1,12 @@
 from django.urls import path
 
-from .views import RouteCreateView, RouteUpdateView
+from .views import RouteCreateView, RouteUpdateView, parcel_quote_batch_view, parcel_quote_view
 
 
 
 urlpatterns = [
     path('add/', RouteCreateView.as_view(), name='route_add'),
     path('<int:pk>/edit/', RouteUpdateView.as_view(), name='route_edit'),
+    path('api/parcels/quote/', parcel_quote_view, name='parcel_quote'),
+    path('api/parcels/quote/batch/', parcel_quote_batch_view, name='parcel_quote_batch'),
 ]
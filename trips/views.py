@@ -1,3 +1,5 @@
+import json
+
 from django.views.generic import ListView, UpdateView, CreateView
 from django.urls import reverse_lazy
 from django.shortcuts import redirect
@@ -5,11 +7,17 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
 from django.contrib import messages
 from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 
 from .forms import RouteForm, RouteStopFormSet
 from .models import Route, RouteStop
+from .parcels import MAX_BATCH_SIZE, ParcelQuoteError, ParcelQuoteService
+from .services import rebuild_route_segments
 from billing.models import TopPlan
 from billing.services import BillingService
+from booking.services import SeatInventoryService, StopEditError
 
 
 class RouteBaseView(LoginRequiredMixin):
@@ -71,18 +79,26 @@ class RouteBaseView(LoginRequiredMixin):
 
                     # Зберігаємо фінальний стан маршруту
                     self.object.save()
+                    # Порядки зупинок до редагування — за ними лежать майбутні бронювання і залишки місць
+                    previous_stops = SeatInventoryService.stop_positions(self.object.pk)
 
                     # 3. ЗБЕРЕЖЕННЯ ЗУПИНОК З ПЕРЕРАХУНКОМ ПОРЯДКУ
                     # commit=False дозволяє нам змінити поле 'order' перед записом у БД
-                    instances = stops.save(commit=False)
+                    stops.save(commit=False)
 
                     # Спочатку видаляємо ті, що користувач позначив на видалення
                     for obj in stops.deleted_objects:
                         obj.delete()
 
-                    # Проходимо по кожній зупинці в тому порядку, в якому вони прийшли з форми
-                    # Це гарантує правильний порядок: 1, 2, 3...
-                    for index, stop_instance in enumerate(instances, start=1):
+                    # Нумеруємо всі зупинки, що лишилися (і незмінені теж), у порядку з форми —
+                    # поле order заповнює JS після перетягування. Це гарантує правильний порядок: 1, 2, 3...
+                    kept = [
+                        stop_form for stop_form in stops.forms
+                        if stop_form not in stops.deleted_forms and (stop_form.instance.pk or stop_form.has_changed())
+                    ]
+                    kept.sort(key=lambda stop_form: stop_form.cleaned_data.get('order') or 0)
+                    for index, stop_form in enumerate(kept, start=1):
+                        stop_instance = stop_form.instance
                         stop_instance.route = self.object
                         stop_instance.order = index  # Примусово записуємо правильний номер
                         stop_instance.save()
@@ -90,7 +106,15 @@ class RouteBaseView(LoginRequiredMixin):
                     # Зберігаємо зв'язки many-to-many, якщо вони є (для City тощо)
                     stops.save_m2m()
 
+                    # 4. Оновлюємо індекс пошуку (пари зупинок) для цього маршруту
+                    rebuild_route_segments(self.object)
+                    SeatInventoryService.remap_stops(self.object, previous_stops)
+                    SeatInventoryService.sync_capacity(self.object)
+
                 return redirect(self.success_url)
+            except StopEditError as e:
+                messages.error(self.request, str(e))
+                return self.form_invalid(form)
             except Exception as e:
                 messages.error(self.request, f"Критична помилка збереження: {str(e)}")
                 return self.form_invalid(form)
@@ -106,3 +130,45 @@ class RouteCreateView(RouteBaseView, CreateView): pass
 
 
 class RouteUpdateView(RouteBaseView, UpdateView): pass
+
+
+# --- API розрахунку доставки посилок ---
+
+@require_GET
+def parcel_quote_view(request):
+    """Пропозиції для однієї посилки: ?from=&to=&weight=&date= (або from_slug / to_slug)."""
+    try:
+        shipment = ParcelQuoteService.parse(request.GET)
+    except ParcelQuoteError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'offers': ParcelQuoteService.quote([shipment])[0]})
+
+
+@csrf_exempt  # Лише розрахунок, без зміни даних — відправники викликають API без сесії
+@require_POST
+def parcel_quote_batch_view(request):
+    """
+    Пакетний розрахунок: {"shipments": [{"id": ..., "from": ..., "to": ..., "weight": ..., "date": ...}, ...]}.
+    Помилка в одному відправленні не зриває весь пакет — вона повертається в його результаті.
+    """
+    try:
+        shipments = json.loads(request.body).get('shipments')
+    except (ValueError, AttributeError):
+        shipments = None
+    if not isinstance(shipments, list) or not all(isinstance(item, dict) for item in shipments):
+        return JsonResponse({'error': "Очікується JSON з полем shipments (список відправлень)."}, status=400)
+    if len(shipments) > MAX_BATCH_SIZE:
+        return JsonResponse({'error': f"Не більше {MAX_BATCH_SIZE} відправлень за один запит."}, status=400)
+
+    results, valid = [], []
+    for item in shipments:
+        result = {'id': item.get('id')}
+        try:
+            valid.append((result, ParcelQuoteService.parse(item)))
+        except ParcelQuoteError as e:
+            result['error'] = str(e)
+        results.append(result)
+
+    for (result, _), offers in zip(valid, ParcelQuoteService.quote([shipment for _, shipment in valid])):
+        result['offers'] = offers
+    return JsonResponse({'results': results})
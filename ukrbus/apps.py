@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UkrbusConfig(AppConfig):
     name = 'ukrbus'
+
+    def ready(self):
+        from . import checks  # noqa: F401
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версії маніфестів, видачі пошуку, популярних напрямків і відстаней живуть у кеші:
+    без спільного кешу (REDIS_URL) кожен воркер бачить лише власні скидання.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        f"Кеш 'default' ({backend}) не спільний між процесами, а DEBUG вимкнено.",
+        hint="Задайте REDIS_URL: інакше воркери віддаватимуть застарілі маніфести, пошук і відстані до кінця TTL.",
+        id='ukrbus.W001',
+    )]
@@ -0,0 +1,201 @@
+import json
+import random
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.runner import DiscoverRunner
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from trips.models import RouteSegment
+from ukrbus.synthetic import SyntheticDataset
+
+STEPS = ('home', 'search', 'booking_form', 'booking_submit', 'my_bookings')
+PERCENTILES = (50, 95, 99)
+BENCH_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-funnel'}}
+
+
+def percentile(values, p):
+    """Перцентиль за найближчим рангом (без інтерполяції)."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк воронки бронювання: головна -> пошук -> форма бронювання (GET/POST) -> мої бронювання. "
+        "Створює тимчасову тестову базу, наповнює її синтетичними даними (ukrbus/synthetic.py), "
+        "проганяє запити тестовим клієнтом і показує p50/p95/p99 та кількість SQL-запитів на крок. "
+        "Може зберегти результат як базовий і порівнювати з ним наступні запуски."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1, help="Seed генератора даних і сценарію")
+        parser.add_argument('--cities', type=int, default=1000)
+        parser.add_argument('--carriers', type=int, default=200)
+        parser.add_argument('--passengers', type=int, default=5000)
+        parser.add_argument('--routes', type=int, default=5000)
+        parser.add_argument('--bookings', type=int, default=100000)
+        parser.add_argument('--transactions', type=int, default=20000)
+        parser.add_argument('--iterations', type=int, default=200, help="Скільки разів пройти воронку")
+        parser.add_argument('--warmup', type=int, default=10, help="Прогони без запису (прогрів кешів)")
+        parser.add_argument('--baseline', help="JSON з попереднім результатом для порівняння")
+        parser.add_argument('--save-baseline', help="Зберегти результат у JSON як новий базовий")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Допустиме погіршення p95 відносно базового (0.25 = +25%%)")
+        parser.add_argument('--min-delta', type=float, default=10.0,
+                            help="Менше погіршення p95 (мс) вважається шумом вимірювання")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Не видаляти тестову базу (повторний запуск з тим самим seed не наповнює її знову)")
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(keepdb=options['keepdb'], verbosity=0, interactive=False)
+        setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            # Окремий кеш у пам'яті: id з тестової бази не повинні потрапити в спільний кеш сайту,
+            # а OSRM недоступний — усі відстані беруться з DistanceCache синтетичного набору.
+            # Профілювання запитів вимкнене: його middleware додає власні запити і накладні витрати до замірів
+            with override_settings(CACHES=BENCH_CACHES, DISTANCE_CACHE_ALIAS=None, OSRM_URL='http://127.0.0.1:9',
+                                   QUERY_PROFILING=False):
+                self.seed(options)
+                results = self.run_funnel(options)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        self.report(results)
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as f:
+                json.dump({'params': self.params(options), 'steps': results}, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Базовий результат збережено: {options['save_baseline']}")
+        if options['baseline']:
+            self.compare(results, options)
+
+    def params(self, options):
+        return {name: options[name] for name in ('seed', 'cities', 'carriers', 'passengers', 'routes',
+                                                  'bookings', 'transactions', 'iterations')}
+
+    def seed(self, options):
+        dataset = SyntheticDataset(seed=options['seed'], log=self.stdout.write)
+        if get_user_model().objects.filter(username__startswith=f"{dataset.prefix}-").exists():
+            self.stdout.write("Синтетичні дані вже є в тестовій базі (--keepdb).")
+            return
+        started = time.perf_counter()
+        dataset.build(cities=options['cities'], carriers=options['carriers'], passengers=options['passengers'],
+                      routes=options['routes'], bookings=options['bookings'],
+                      transactions=options['transactions'])
+        self.stdout.write(f"Дані згенеровано за {time.perf_counter() - started:.1f} с")
+
+    def scenarios(self, options):
+        """Напрямки для сценарію: випадкові пари міст з індексу пошуку та найближча дата їхнього рейсу."""
+        rnd = random.Random(options['seed'])
+        count = options['iterations'] + options['warmup']
+        segment_ids = list(RouteSegment.objects.filter(route__is_active=True).order_by('id').values_list('id', flat=True))
+        if not segment_ids:
+            raise CommandError("У базі немає активних маршрутів для сценарію.")
+        chosen = [rnd.choice(segment_ids) for _ in range(count)]
+        segments = RouteSegment.objects.select_related('from_city', 'to_city').in_bulk(set(chosen))
+        today = timezone.localdate()
+        passengers = list(get_user_model().objects.filter(is_passenger=True).order_by('id')
+                          .values_list('id', flat=True)[:1000])
+
+        scenarios = []
+        for segment_id in chosen:
+            segment = segments[segment_id]
+            trip_date = today + timedelta(days=(segment.day_of_week - today.isoweekday()) % 7 or 7)
+            query = {'start_city': segment.from_city.name, 'end_city': segment.to_city.name,
+                     'start_city_slug': segment.from_city.slug, 'end_city_slug': segment.to_city.slug,
+                     'date': trip_date.isoformat()}
+            scenarios.append({
+                'passenger': rnd.choice(passengers),
+                'query': urlencode(query),
+                'route': segment.route_id,
+                'form': {'trip_date': trip_date.isoformat(), 'seats_count': 1,
+                         'departure_point': segment.from_city.name, 'arrival_point': segment.to_city.name},
+            })
+        return scenarios
+
+    def run_funnel(self, options):
+        User = get_user_model()
+        client = Client()
+        timings = {step: [] for step in STEPS}
+        queries = {step: [] for step in STEPS}
+        errors = {step: 0 for step in STEPS}
+
+        def measure(step, record, method, url, **kwargs):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, **kwargs)
+                elapsed = (time.perf_counter() - started) * 1000
+            if record:
+                timings[step].append(elapsed)
+                queries[step].append(len(captured.captured_queries))
+                # POST бронювання успішний, коли перенаправляє на список (200 — помилка форми, напр. немає місць)
+                if response.status_code != (302 if step == 'booking_submit' else 200):
+                    errors[step] += 1
+
+        search_url = reverse('booking_route_list')
+        my_bookings_url = reverse('passenger-bookings')
+        for number, scenario in enumerate(self.scenarios(options)):
+            record = number >= options['warmup']
+            client.force_login(User.objects.get(pk=scenario['passenger']))
+            reserve_url = f"{reverse('make_booking', args=[scenario['route']])}?{scenario['query']}"
+
+            measure('home', record, 'get', '/')
+            measure('search', record, 'get', f"{search_url}?{scenario['query']}")
+            measure('booking_form', record, 'get', reserve_url)
+            measure('booking_submit', record, 'post', reserve_url, data=scenario['form'])
+            measure('my_bookings', record, 'get', my_bookings_url)
+
+        return {
+            step: {
+                'requests': len(timings[step]),
+                **{f"p{p}": round(percentile(timings[step], p), 2) for p in PERCENTILES},
+                'avg_queries': round(sum(queries[step]) / len(queries[step]), 1),
+                'max_queries': max(queries[step]),
+                'errors': errors[step],
+            }
+            for step in STEPS if timings[step]
+        }
+
+    def report(self, results):
+        self.stdout.write(f"{'Крок':<16}{'запитів':>9}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}"
+                          f"{'SQL сер.':>10}{'SQL макс.':>11}{'помилок':>9}")
+        for step, row in results.items():
+            self.stdout.write(f"{step:<16}{row['requests']:>9}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}"
+                              f"{row['avg_queries']:>10}{row['max_queries']:>11}{row['errors']:>9}")
+
+    def compare(self, results, options):
+        with open(options['baseline'], encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != self.params(options):
+            self.stdout.write(self.style.WARNING(
+                f"Параметри відрізняються від базових ({baseline.get('params')}) — порівняння приблизне."
+            ))
+
+        regressions = []
+        for step, row in results.items():
+            base = baseline['steps'].get(step)
+            if not base:
+                continue
+            if (row['p95'] > base['p95'] * (1 + options['tolerance'])
+                    and row['p95'] - base['p95'] > options['min_delta']):
+                regressions.append(f"{step}: p95 {row['p95']} мс проти {base['p95']} мс")
+            # Кількість SQL не залежить від заліза — будь-яке зростання вважаємо регресією
+            if row['max_queries'] > base['max_queries']:
+                regressions.append(f"{step}: до {row['max_queries']} SQL-запитів проти {base['max_queries']}")
+            if row['errors'] > base['errors']:
+                regressions.append(f"{step}: помилок {row['errors']} проти {base['errors']}")
+
+        if regressions:
+            raise CommandError("Регресія відносно базового результату:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("Регресій відносно базового результату немає."))
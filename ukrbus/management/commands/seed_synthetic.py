@@ -0,0 +1,60 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ukrbus.synthetic import SyntheticDataset
+
+# Розмір набору при --scale 1; кожну величину можна перевизначити окремим параметром
+DEFAULT_SIZES = {
+    'cities': 1000,
+    'carriers': 200,
+    'passengers': 5000,
+    'routes': 5000,
+    'bookings': 100000,
+    'transactions': 20000,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Наповнює базу синтетичними даними для навантажувальних тестів і профілювання: міста й країни, "
+        "маршрути із зупинками та розкладом, бронювання, транзакції і баланси перевізників, кеш відстаней. "
+        "Пише пакетами через bulk_create, без звернень до мережі; той самий --seed і --base-date дають той самий набір."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1, help="Seed генератора (префікс імен synthetic-<seed>)")
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help="Множник усіх розмірів (10 = близько мільйона бронювань)")
+        for name, size in DEFAULT_SIZES.items():
+            parser.add_argument(f'--{name}', type=int, help=f"Кількість ({size} × scale за замовчуванням)")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Розмір пакета bulk_create")
+        parser.add_argument('--base-date', type=date.fromisoformat,
+                            help="Дата «сьогодні» для набору (РРРР-ММ-ДД), за замовчуванням — поточна")
+        parser.add_argument('--force', action='store_true', help="Дозволити запуск при DEBUG=False")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG=False: схоже на робочу базу. Додайте --force, якщо це справді потрібно.")
+        if options['scale'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError("--scale і --batch-size мають бути додатними.")
+
+        sizes = {
+            name: options[name] if options[name] is not None else max(1, round(size * options['scale']))
+            for name, size in DEFAULT_SIZES.items()
+        }
+        dataset = SyntheticDataset(seed=options['seed'], batch_size=options['batch_size'],
+                                   base_date=options['base_date'], log=self.stdout.write)
+        started = time.perf_counter()
+        try:
+            # Усе або нічого: перерваний запуск не лишає напівнаповнену базу
+            with transaction.atomic():
+                dataset.build(**sizes)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Набір synthetic-{options['seed']} згенеровано за {time.perf_counter() - started:.1f} с"
+        ))
@@ -0,0 +1,84 @@
+import base64
+import binascii
+
+from django.utils.dateparse import parse_datetime
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """
+    Посторінковий вивід від новіших до старіших за (created_at, id) без OFFSET і COUNT:
+    кожна сторінка — один запит per_page + 1 рядків по індексу (..., created_at, id),
+    тож час сторінки не залежить ні від її номера, ні від розміру історії.
+    Курсори: ?after=<останній рядок> — старіші, ?before=<перший рядок> — новіші.
+    """
+
+    def __init__(self, per_page, field='created_at'):
+        self.per_page = per_page
+        self.field = field
+
+    def encode(self, obj):
+        raw = f"{getattr(obj, self.field).isoformat()}|{obj.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        """(значення, id) з курсора або None, якщо курсор пошкоджений."""
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            value, pk = raw.rsplit('|', 1)
+            value = parse_datetime(value)
+            return (value, int(pk)) if value else None
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+
+    def page(self, queryset, params):
+        field = self.field
+        after, before = self.decode(params.get('after')), self.decode(params.get('before'))
+
+        if before:
+            # Новіші за курсор: читаємо у зворотному порядку від курсора і розвертаємо
+            value, pk = before
+            rows = list(
+                queryset.filter(**{f'{field}__gte': value}).exclude(**{field: value, 'pk__lte': pk})
+                .order_by(field, 'pk')[:self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return KeysetPage(
+                rows,
+                next_cursor=self.encode(rows[-1]) if rows else None,
+                previous_cursor=self.encode(rows[0]) if rows and has_more else None,
+            )
+
+        if after:
+            # Умова value <= курсор задає межу сканування індексу, exclude відкидає вже показані рядки
+            value, pk = after
+            queryset = queryset.filter(**{f'{field}__lte': value}).exclude(**{field: value, 'pk__gte': pk})
+        rows = list(queryset.order_by(f'-{field}', '-pk')[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode(rows[-1]) if rows and has_more else None,
+            previous_cursor=self.encode(rows[0]) if rows and after else None,
+        )
@@ -0,0 +1,197 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+# Скільки останніх запитів зберігати для кожної в'юхи
+SAMPLES_PER_VIEW = getattr(settings, 'QUERY_PROFILING_SAMPLES', 100)
+# Скільки найчастіших дублікатів показувати в одному записі
+TOP_DUPLICATES = 5
+# Задекларовані бюджети: {view_name: максимум SQL-запитів на один HTTP-запит}
+QUERY_BUDGETS = getattr(settings, 'QUERY_BUDGETS', {})
+
+_IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Запит без конкретних значень: однакові N+1 запити з різними id дають один відбиток."""
+    return _SPACES_RE.sub(' ', _IN_LIST_RE.sub('IN (...)', sql)).strip()
+
+
+class QueryRecorder:
+    """Обгортка для connection.execute_wrapper: рахує запити, їхній час і повтори."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.exact = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+            try:
+                self.exact[(sql, repr(params))] += 1
+            except Exception:  # repr параметрів не повинен ламати запит
+                pass
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def duplicates(self, limit=TOP_DUPLICATES):
+        """Відбитки, що виконувались більше одного разу (кандидати на N+1), найчастіші першими."""
+        return [(sql, count) for sql, count in self.fingerprints.most_common(limit) if count > 1]
+
+    @property
+    def exact_duplicates(self):
+        """Скільки запитів повністю повторили попередній (той самий SQL і параметри)."""
+        return sum(count - 1 for count in self.exact.values())
+
+
+class QueryProfileStore:
+    """Кільцеве сховище профілів у пам'яті процесу: останні SAMPLES_PER_VIEW записів на в'юху."""
+
+    def __init__(self, maxlen=SAMPLES_PER_VIEW):
+        self.maxlen = maxlen
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, view_name, sample):
+        with self._lock:
+            self._samples.setdefault(view_name, deque(maxlen=self.maxlen)).append(sample)
+
+    def samples(self, view_name):
+        with self._lock:
+            return list(self._samples.get(view_name, ()))
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """Зведення по в'юхах: середні й максимальні значення та найчастіші дублікати."""
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+
+        result = {}
+        for name, samples in sorted(snapshot.items()):
+            duplicates = Counter()
+            for sample in samples:
+                for sql, count in sample['duplicates']:
+                    duplicates[sql] = max(duplicates[sql], count)
+            queries = [s['queries'] for s in samples]
+            result[name] = {
+                'requests': len(samples),
+                'budget': QUERY_BUDGETS.get(name),
+                'avg_queries': round(sum(queries) / len(samples), 1),
+                'max_queries': max(queries),
+                'avg_sql_ms': round(sum(s['sql_ms'] for s in samples) / len(samples), 2),
+                'avg_render_ms': round(sum(s['render_ms'] or 0 for s in samples) / len(samples), 2),
+                'avg_total_ms': round(sum(s['total_ms'] for s in samples) / len(samples), 2),
+                'duplicates': duplicates.most_common(TOP_DUPLICATES),
+            }
+        return result
+
+
+profile_store = QueryProfileStore()
+
+
+class QueryProfilingMiddleware:
+    """
+    Профіль кожного запиту за іменем в'юхи: кількість SQL, сумарний час SQL, дублікати
+    і час рендеру шаблону. Вмикається лише явно: settings.QUERY_PROFILING = True.
+    Має стояти першим у MIDDLEWARE, щоб бачити й запити сесій та автентифікації.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+        view_name = match.view_name
+        render = getattr(request, '_profiling_render', None)
+        profile_store.add(view_name, {
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 2),
+            'render_ms': round(render[1] - render[0], 2) if render and len(render) == 2 else None,
+            'total_ms': round(total * 1000, 2),
+            'exact_duplicates': recorder.exact_duplicates,
+            'duplicates': recorder.duplicates(),
+            'at': time.time(),
+        })
+
+        budget = QUERY_BUDGETS.get(view_name)
+        if budget is not None and recorder.count > budget:
+            logger.warning("%s: %s SQL-запитів при бюджеті %s (%s)", view_name, recorder.count, budget, request.path)
+        response['X-Query-Count'] = str(recorder.count)
+        return response
+
+    def process_template_response(self, request, response):
+        # TemplateResponse рендериться після цього хука — засікаємо початок і кінець рендеру
+        request._profiling_render = [time.perf_counter() * 1000]
+        response.add_post_render_callback(lambda r: request._profiling_render.append(time.perf_counter() * 1000))
+        return response
+
+
+@contextmanager
+def query_budget(budget, label=''):
+    """
+    Для тестів: падає з AssertionError, якщо код у блоці виконав більше budget SQL-запитів.
+    У повідомленні — найчастіші дублікати, щоб одразу було видно N+1.
+    """
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    if recorder.count > budget:
+        details = '\n'.join(f"  {count}× {sql}" for sql, count in recorder.duplicates())
+        raise AssertionError(
+            f"{label or 'Блок'}: {recorder.count} SQL-запитів при бюджеті {budget}"
+            + (f"\nДублікати:\n{details}" if details else '')
+        )
+
+
+def assert_query_budget(client, url, budget=None, method='get', **kwargs):
+    """
+    Виконує запит тестовим клієнтом і перевіряє бюджет запитів в'юхи.
+    Без budget береться задекларований у settings.QUERY_BUDGETS для цієї в'юхи.
+    """
+    view_name = resolve(url.split('?', 1)[0]).view_name
+    if budget is None:
+        if view_name not in QUERY_BUDGETS:
+            raise AssertionError(f"Для {view_name} не задекларовано бюджет у QUERY_BUDGETS")
+        budget = QUERY_BUDGETS[view_name]
+    with query_budget(budget, label=f"{view_name} ({url})"):
+        response = getattr(client, method)(url, **kwargs)
+    return response
@@ -0,0 +1,431 @@
+"""
+Генератор синтетичних даних для навантажувальних тестів і профілювання.
+Все пишеться через bulk_create пакетами, без сигналів, тому після генерації похідні дані
+(сегменти пошуку, залишки місць, денні підсумки, знімки балансів, пошуковий індекс бронювань)
+будуються тут же, а кеші скидаються явно. Результат детермінований для того самого seed і base_date.
+"""
+import math
+import random
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.template.defaultfilters import slugify
+from django.utils import timezone
+from unidecode import unidecode
+
+from accounts.models import CarrierProfile, PassengerProfile
+from billing.models import Transaction
+from billing.services import LedgerService
+from booking.models import Booking, SeatInventory
+from booking.search import BookingSearchService
+from booking.services import BookingRollupService
+from city.models import City, Country
+from city.resolver import city_resolver
+from trips.context_processors import invalidate_popular_directions
+from trips.models import DistanceCache, Route, RouteSegment, RouteStop
+from trips.services import build_segment_rows
+from trips.sitemaps import invalidate_sitemaps
+
+# (назва, ISO-код, (мін. широта, макс. широта), (мін. довгота, макс. довгота))
+COUNTRIES = [
+    ('Україна', 'UA', (45.5, 51.5), (23.0, 39.5)),
+    ('Польща', 'PL', (49.5, 54.5), (14.5, 23.5)),
+    ('Німеччина', 'DE', (47.5, 54.5), (6.5, 14.5)),
+    ('Чехія', 'CZ', (48.7, 50.9), (12.5, 18.5)),
+    ('Словаччина', 'SK', (47.8, 49.5), (17.0, 22.5)),
+    ('Угорщина', 'HU', (45.8, 48.5), (16.2, 22.8)),
+    ('Румунія', 'RO', (43.8, 48.2), (20.5, 29.5)),
+    ('Молдова', 'MD', (45.5, 48.4), (26.7, 30.0)),
+    ('Литва', 'LT', (54.0, 56.4), (21.0, 26.5)),
+    ('Австрія', 'AT', (46.5, 48.9), (9.6, 17.0)),
+    ('Італія', 'IT', (38.0, 46.5), (7.0, 18.0)),
+    ('Іспанія', 'ES', (36.5, 43.5), (-9.0, 3.0)),
+]
+# Більшість міст і маршрутів — в Україні, як і в реальному трафіку
+COUNTRY_WEIGHTS = [30, 14, 12, 6, 4, 4, 6, 4, 3, 4, 7, 6]
+
+SYLLABLES_START = ['Бер', 'Вил', 'Гор', 'Дуб', 'Жит', 'Зал', 'Кам', 'Луг', 'Мир', 'Нов', 'Оль', 'Пол',
+                   'Рів', 'Сос', 'Тер', 'Ус', 'Хол', 'Чор', 'Шир', 'Яс', 'Біл', 'Вер', 'Крас', 'Слав']
+SYLLABLES_MIDDLE = ['', '', 'о', 'е', 'ан', 'ин', 'ор', 'ів']
+SYLLABLES_END = ['ів', 'инь', 'ка', 'ськ', 'ове', 'ець', 'нів', 'ище', 'ополь', 'город', 'бург', 'ичі']
+
+# Середня швидкість автобуса для розкладу, км/год
+BUS_SPEED = 70
+ROAD_FACTOR = 1.25
+# Вікно дат бронювань відносно base_date
+BOOKING_DAYS_BACK = 120
+BOOKING_DAYS_AHEAD = 60
+STATUS_WEIGHTS = (('confirmed', 70), ('pending', 20), ('cancelled', 10))
+SEATS_WEIGHTS = ((1, 60), (2, 25), (3, 10), (4, 5))
+# День виїзду: п'ятниця й неділя — найпопулярніші, середина тижня — найменш
+DAY_WEIGHTS = ((1, 12), (2, 9), (3, 9), (4, 12), (5, 22), (6, 14), (7, 22))
+# За скільки днів до поїздки бронюють: у середньому за тиждень, не раніше ніж за 60 днів
+BOOKING_LEAD_DAYS = 7
+BOOKING_LEAD_MAX = 60
+# Журнал перевізника: (тип, вага); ТОП купують за тарифами (днів, ціна)
+TRANSACTION_WEIGHTS = (('deposit', 25), ('withdrawal', 65), ('refund', 10))
+TOP_PLANS = ((1, Decimal('30')), (3, Decimal('80')), (7, Decimal('150')), (30, Decimal('500')))
+TRANSACTION_DAYS_BACK = 180
+
+
+def _km(a, b):
+    """Оцінка відстані по дорогах між (lat, lon), як booking.utils.haversine_km."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h)) * ROAD_FACTOR
+
+
+class SyntheticDataset:
+    """
+    Будує набір: країни, міста, перевізники й пасажири з профілями, маршрути із зупинками
+    (міста вздовж лінії між кінцевими, час за відстанню, перехід через північ змінює день),
+    сегменти пошуку, кеш відстаней, бронювання з популярністю маршрутів за степеневим законом,
+    залишки місць на майбутні дати і денні підсумки, журнал транзакцій перевізників
+    з балансами, що з ним збігаються, і активними ТОПами.
+    Весь час (created_at) — до початку base_date, тож набір не залежить від моменту запуску.
+    """
+
+    def __init__(self, seed=1, batch_size=5000, base_date=None, log=None):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.base_date = base_date or timezone.localdate()
+        self.now = timezone.make_aware(datetime.combine(self.base_date, dt_time.min))
+        self.log = log or (lambda message: None)
+        self.prefix = f"synthetic-{seed}"
+        self.cities = []  # (id, name, (lat, lon))
+        self.carrier_ids = []
+        self.passenger_ids = []
+        self.routes = []  # (id, price_per_km, min_trip_price, capacity, [(order, city_index, day), ...])
+
+    def _bulk(self, model, objects):
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        if created and created[0].pk is None:
+            raise RuntimeError("База даних не повертає id з bulk_create — потрібні PostgreSQL або SQLite 3.35+.")
+        return created
+
+    def _bulk_with_timestamps(self, model, objects, field_name='created_at'):
+        """
+        bulk_create для моделі з auto_now_add: при вставці поле отримує поточний час, тому
+        згенерований час записується другим кроком через bulk_update (auto_now_add він не застосовує).
+        Метадані поля не змінюються — вони спільні для всіх потоків процесу.
+        """
+        moments = [getattr(obj, field_name) for obj in objects]
+        created = self._bulk(model, objects)
+        for obj, moment in zip(created, moments):
+            setattr(obj, field_name, moment)
+        model.objects.bulk_update(created, [field_name], batch_size=self.batch_size)
+        return created
+
+    def _moment(self, days_back):
+        """Випадковий момент за останні days_back днів до base_date."""
+        return self.now - timedelta(seconds=self.random.randrange(max(1, int(days_back * 86400))))
+
+    def build(self, cities=1000, carriers=200, passengers=5000, routes=5000, bookings=100000, transactions=20000):
+        if get_user_model().objects.filter(username__startswith=f"{self.prefix}-").exists():
+            raise RuntimeError(f"Набір із seed={self.seed} уже згенеровано в цій базі.")
+        self.build_cities(cities)
+        self.build_users(carriers, passengers)
+        self.build_routes(routes)
+        self.build_bookings(bookings)
+        self.build_transactions(transactions)
+        self.finish()
+
+    # --- Міста ---
+
+    def _city_name(self, taken):
+        rnd = self.random
+        base = rnd.choice(SYLLABLES_START) + rnd.choice(SYLLABLES_MIDDLE) + rnd.choice(SYLLABLES_END)
+        name, number = base, 2
+        while name.casefold() in taken:
+            name = f"{base}-{number}"
+            number += 1
+        taken.add(name.casefold())
+        return name
+
+    def build_cities(self, count):
+        countries = {}
+        for name, code, _, _ in COUNTRIES:
+            countries[code] = Country.objects.filter(code=code).first() or Country.objects.create(name=name, code=code)
+
+        taken = {name.casefold() for name in City.objects.values_list('name', flat=True)}
+        slugs = set(City.objects.exclude(slug=None).values_list('slug', flat=True))
+        objects = []
+        for _ in range(count):
+            _, code, lat_range, lon_range = self.random.choices(COUNTRIES, weights=COUNTRY_WEIGHTS)[0]
+            name = self._city_name(taken)
+            slug = slugify(unidecode(f"{code} {name}"))
+            if slug in slugs:
+                slug = f"{slug}-{self.seed}-{len(objects)}"
+            slugs.add(slug)
+            objects.append(City(
+                name=name, country=countries[code], slug=slug,
+                latitude=round(self.random.uniform(*lat_range), 5),
+                longitude=round(self.random.uniform(*lon_range), 5),
+            ))
+        self.cities = [(city.pk, city.name, (city.latitude, city.longitude)) for city in self._bulk(City, objects)]
+        self.log(f"Міст: {len(self.cities)}")
+
+    # --- Користувачі ---
+
+    def build_users(self, carriers, passengers):
+        User = get_user_model()
+        # Без пароля (unusable): синтетичні акаунти не повинні давати вхід
+        users = self._bulk(User, [
+            User(username=f"{self.prefix}-carrier-{i:06d}", is_carrier=True, password='!')
+            for i in range(carriers)
+        ] + [
+            User(username=f"{self.prefix}-passenger-{i:07d}", is_passenger=True, password='!')
+            for i in range(passengers)
+        ])
+        self.carrier_ids = [user.pk for user in users[:carriers]]
+        self.passenger_ids = [user.pk for user in users[carriers:]]
+
+        self._bulk(CarrierProfile, [
+            CarrierProfile(user_id=pk, company_name=f"Перевізник {i + 1}", contact_person="Диспетчер",
+                           phone=f"+380{self.random.randint(500000000, 999999999)}")
+            for i, pk in enumerate(self.carrier_ids)
+        ])
+        self._bulk(PassengerProfile, [
+            PassengerProfile(user_id=pk, phone=f"+380{self.random.randint(500000000, 999999999)}")
+            for pk in self.passenger_ids
+        ])
+        self.log(f"Перевізників: {carriers}, пасажирів: {passengers}")
+
+    # --- Маршрути ---
+
+    def _stop_sequence(self):
+        """Індекси міст маршруту: кінцеві 150–1500 км одна від одної, проміжні — поблизу лінії між ними."""
+        rnd, cities = self.random, self.cities
+        start = rnd.randrange(len(cities))
+        end = start
+        for _ in range(20):
+            end = rnd.randrange(len(cities))
+            if end != start and 150 <= _km(cities[start][2], cities[end][2]) <= 1500:
+                break
+        if end == start:
+            end = (start + 1) % len(cities)
+
+        (lat1, lon1), (lat2, lon2) = cities[start][2], cities[end][2]
+        dx, dy = lon2 - lon1, lat2 - lat1
+        length = dx * dx + dy * dy or 1
+        wanted = rnd.randint(0, 8)
+        middle = []
+        for index in rnd.sample(range(len(cities)), min(len(cities), 60)):
+            if index in (start, end) or len(middle) >= wanted:
+                continue
+            lat, lon = cities[index][2]
+            t = ((lon - lon1) * dx + (lat - lat1) * dy) / length
+            distance = abs((lon - lon1) * dy - (lat - lat1) * dx) / math.sqrt(length)
+            if 0.05 < t < 0.95 and distance < 0.6:
+                middle.append((t, index))
+        return [start] + [index for _, index in sorted(middle)] + [end]
+
+    def build_routes(self, count):
+        rnd = self.random
+        route_objects, sequences = [], []
+        for i in range(count):
+            sequence = self._stop_sequence()
+            sequences.append(sequence)
+            first, last = self.cities[sequence[0]][1], self.cities[sequence[-1]][1]
+            route_objects.append(Route(
+                carrier_id=rnd.choice(self.carrier_ids), title=f"{first} — {last}",
+                is_active=rnd.random() < 0.95, is_parcel=rnd.random() < 0.6,
+                capacity=rnd.choice((20, 30, 45, 50, 55)),
+                min_trip_price=Decimal(rnd.randrange(200, 800, 10)),
+                price_per_km=Decimal(rnd.randrange(120, 260)) / 100,
+                min_parcel_price=Decimal(rnd.randrange(100, 400, 10)),
+                price_per_kg=Decimal(rnd.randrange(10, 60)),
+                symmetric_distance=rnd.random() < 0.8,
+            ))
+        routes = self._bulk(Route, route_objects)
+
+        stops, segments = [], []
+        days, day_weights = zip(*DAY_WEIGHTS)
+        for route, sequence in zip(routes, sequences):
+            day = rnd.choices(days, weights=day_weights)[0]
+            minutes = rnd.randrange(5 * 60, 22 * 60, 15)
+            schedule = []
+            for order, index in enumerate(sequence, start=1):
+                if order > 1:
+                    # Час у дорозі плюс стоянка; після півночі — наступний день тижня
+                    minutes += int(_km(self.cities[sequence[order - 2]][2], self.cities[index][2]) / BUS_SPEED * 60) + 15
+                    day = (day - 1 + minutes // (24 * 60)) % 7 + 1
+                    minutes %= 24 * 60
+                stops.append(RouteStop(route=route, city_id=self.cities[index][0], order=order, day_of_week=day,
+                                       departure_time=dt_time(minutes // 60, minutes % 60)))
+                schedule.append((order, index, day))
+            for (from_city, to_city, pair_day), (from_order, to_order) in build_segment_rows(
+                [(self.cities[index][0], stop_day, order) for order, index, stop_day in schedule]
+            ).items():
+                segments.append(RouteSegment(route=route, from_city_id=from_city, to_city_id=to_city,
+                                             day_of_week=pair_day, from_order=from_order, to_order=to_order))
+            self.routes.append((route.pk, route.price_per_km, route.min_trip_price, route.capacity, schedule,
+                                route.carrier_id, route.title))
+
+        self._bulk(RouteStop, stops)
+        self._bulk(RouteSegment, segments)
+        self.log(f"Маршрутів: {len(routes)}, зупинок: {len(stops)}, сегментів: {len(segments)}")
+        self.build_distances(segments)
+
+    def build_distances(self, segments):
+        """Кеш відстаней для всіх пар пошуку — як після прогріву на реальному трафіку (без OSRM)."""
+        coordinates = {city_id: point for city_id, _, point in self.cities}
+        existing = set(DistanceCache.objects.values_list('city_from_id', 'city_to_id'))
+        pairs = {(s.from_city_id, s.to_city_id) for s in segments} - existing
+        self._bulk(DistanceCache, [
+            DistanceCache(city_from_id=a, city_to_id=b, is_estimate=True,
+                          distance_km=Decimal(str(round(_km(coordinates[a], coordinates[b]), 1))))
+            for a, b in sorted(pairs)
+        ])
+        self.log(f"Відстаней у кеші: {len(pairs)}")
+
+    # --- Бронювання ---
+
+    def _trip_date(self, day):
+        """Випадкова дата у вікні бронювань, що припадає на потрібний день тижня."""
+        offset = self.random.randint(-BOOKING_DAYS_BACK, BOOKING_DAYS_AHEAD)
+        date = self.base_date + timedelta(days=offset)
+        return date + timedelta(days=(day - date.isoweekday()) % 7)
+
+    def build_bookings(self, count):
+        rnd = self.random
+        # Популярність маршрутів — степеневий закон: небагато маршрутів мають більшість пасажирів
+        weights = [1 / (rank ** 0.8) for rank in range(1, len(self.routes) + 1)]
+        rnd.shuffle(weights)
+        statuses, status_weights = zip(*STATUS_WEIGHTS)
+        seats_values, seats_weights = zip(*SEATS_WEIGHTS)
+
+        inventory = {}
+        batch, created = [], 0
+        for route_pk, price_per_km, min_price, capacity, schedule, carrier_id, _ in rnd.choices(
+            self.routes, weights=weights, k=count
+        ):
+            if len(schedule) < 2:
+                continue
+            i = rnd.randrange(len(schedule) - 1)
+            j = rnd.randrange(i + 1, len(schedule))
+            (from_order, from_index, day), (to_order, to_index, _) = schedule[i], schedule[j]
+            trip_date = self._trip_date(day)
+            seats = rnd.choices(seats_values, weights=seats_weights)[0]
+            status = rnd.choices(statuses, weights=status_weights)[0]
+
+            if status != 'cancelled' and trip_date >= self.base_date:
+                legs = [(route_pk, trip_date, order) for order, _, _ in schedule[i:j]]
+                if any(inventory.get(leg, 0) + seats > capacity for leg in legs):
+                    continue  # Автобус повний — таке бронювання в реальності не пройшло б
+                for leg in legs:
+                    inventory[leg] = inventory.get(leg, 0) + seats
+
+            # Бронюють за кілька днів до поїздки (експоненційно); майбутні поїздки — вже заброньовані до base_date
+            departure = timezone.make_aware(datetime.combine(trip_date, dt_time(12)))
+            created_at = departure - timedelta(days=min(rnd.expovariate(1 / BOOKING_LEAD_DAYS), BOOKING_LEAD_MAX))
+            if created_at >= self.now:
+                created_at = self._moment(BOOKING_LEAD_MAX - (trip_date - self.base_date).days)
+
+            distance = _km(self.cities[from_index][2], self.cities[to_index][2])
+            price = max((Decimal(str(round(distance, 1))) * price_per_km).quantize(Decimal('0.01')), min_price)
+            batch.append(Booking(
+                passenger_id=rnd.choice(self.passenger_ids), route_id=route_pk, carrier_id=carrier_id,
+                trip_date=trip_date,
+                seats_count=seats, status=status, total_price=price * seats,
+                departure_point=self.cities[from_index][1], arrival_point=self.cities[to_index][1],
+                departure_city_id=self.cities[from_index][0], arrival_city_id=self.cities[to_index][0],
+                departure_order=from_order, arrival_order=to_order, created_at=created_at,
+            ))
+            if len(batch) >= self.batch_size:
+                created += len(self._bulk_with_timestamps(Booking, batch))
+                batch = []
+                self.log(f"  бронювань: {created}")
+        if batch:
+            created += len(self._bulk_with_timestamps(Booking, batch))
+
+        capacities = {route[0]: route[3] for route in self.routes}
+        self._bulk(SeatInventory, [
+            SeatInventory(route_id=route_pk, trip_date=trip_date, segment=segment,
+                          capacity=capacities[route_pk], reserved=reserved)
+            for (route_pk, trip_date, segment), reserved in inventory.items()
+        ])
+        self.log(f"Бронювань: {created}, залишків місць: {len(inventory)}")
+
+    # --- Фінанси перевізників ---
+
+    def build_transactions(self, count):
+        """
+        Журнал поповнень, оплат ТОП і повернень за TRANSACTION_DAYS_BACK днів. Кожен перевізник
+        починає з поповнення, списання без достатнього залишку замінюється поповненням,
+        тож баланс ніколи не від'ємний і в кінці дорівнює сумі журналу (як після process_payment).
+        """
+        rnd = self.random
+        if not self.carrier_ids:
+            return
+        routes_by_carrier = {}
+        for route in self.routes:
+            routes_by_carrier.setdefault(route[5], []).append((route[0], route[6]))
+        kinds, kind_weights = zip(*TRANSACTION_WEIGHTS)
+        # Активність перевізників теж нерівномірна: кілька великих компаній і багато дрібних
+        weights = [1 / rank for rank in range(1, len(self.carrier_ids) + 1)]
+        rnd.shuffle(weights)
+        per_carrier = {carrier: 0 for carrier in self.carrier_ids}
+        for carrier in rnd.choices(self.carrier_ids, weights=weights, k=max(0, count - len(self.carrier_ids))):
+            per_carrier[carrier] += 1
+
+        rows, balances, top_until = [], {}, {}
+        for carrier, extra in per_carrier.items():
+            moments = sorted(self._moment(TRANSACTION_DAYS_BACK) for _ in range(extra + 1))
+            balance, paid = Decimal('0'), []
+            for number, moment in enumerate(moments):
+                kind = 'deposit' if number == 0 else rnd.choices(kinds, weights=kind_weights)[0]
+                routes = routes_by_carrier.get(carrier)
+                if kind == 'refund' and not paid:
+                    kind = 'withdrawal'
+                if kind == 'withdrawal':
+                    days, price = rnd.choice(TOP_PLANS)
+                    if not routes or balance < price:
+                        kind = 'deposit'
+                if kind == 'deposit':
+                    amount = Decimal(rnd.choice((200, 500, 1000, 2000, 5000)))
+                    description = "Поповнення балансу"
+                elif kind == 'withdrawal':
+                    route_pk, title = rnd.choice(routes)
+                    amount = -price
+                    description = f"ТОП {days} дн. для {title}"
+                    paid.append(price)
+                    start = max(top_until.get(route_pk, moment), moment)
+                    top_until[route_pk] = start + timedelta(days=days)
+                else:
+                    amount = paid.pop(rnd.randrange(len(paid)))
+                    description = "Повернення коштів за ТОП"
+                balance += amount
+                rows.append((moment, carrier, amount, kind, description))
+            balances[carrier] = balance
+
+        # id у журналі зростають разом із часом — на цьому тримаються знімки LedgerService
+        rows.sort(key=lambda row: row[0])
+        for start in range(0, len(rows), self.batch_size):
+            self._bulk_with_timestamps(Transaction, [
+                Transaction(user_id=carrier, amount=amount, tx_type=kind, description=description,
+                            created_at=moment)
+                for moment, carrier, amount, kind, description in rows[start:start + self.batch_size]
+            ])
+
+        profiles = list(CarrierProfile.objects.filter(user_id__in=self.carrier_ids))
+        for profile in profiles:
+            profile.balance = balances[profile.user_id]
+        CarrierProfile.objects.bulk_update(profiles, ['balance'], batch_size=self.batch_size)
+        boosted = [Route(pk=route_pk, top_until=until) for route_pk, until in top_until.items() if until > self.now]
+        Route.objects.bulk_update(boosted, ['top_until'], batch_size=self.batch_size)
+        self.log(f"Транзакцій: {len(rows)}, маршрутів у ТОПі: {len(boosted)}")
+
+    def finish(self):
+        """Похідні дані й кеші, які зазвичай оновлюють сигнали (bulk_create їх не викликає)."""
+        route_ids = [route[0] for route in self.routes]
+        for start in range(0, len(route_ids), 500):
+            BookingRollupService.rebuild(route_ids[start:start + 500])
+        LedgerService.take_snapshot()
+        if self.carrier_ids:
+            BookingSearchService.rebuild(self.carrier_ids)
+        city_resolver.invalidate()
+        invalidate_sitemaps()
+        invalidate_popular_directions()
@@ -1,3 +1,213 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import CarrierProfile
+from billing.models import Transaction
+from billing.services import LedgerService
+from booking.models import Booking
+from trips.models import Route
+
+from .checks import check_shared_cache
+from .management.commands import bench_funnel
+from .pagination import KeysetPaginator
+from .profiling import QueryProfilingMiddleware, assert_query_budget, profile_store, query_budget
+
+User = get_user_model()
+
+
+class QueryBudgetTests(TestCase):
+    def test_budget_passes_and_counts(self):
+        with query_budget(2) as recorder:
+            User.objects.count()
+            User.objects.exists()
+        self.assertEqual(recorder.count, 2)
+
+    def test_exceeded_budget_lists_duplicates(self):
+        with self.assertRaisesMessage(AssertionError, "3 SQL-запитів при бюджеті 1") as raised:
+            with query_budget(1, label="N+1"):
+                for pk in range(3):
+                    User.objects.filter(pk=pk).first()
+        self.assertIn("3× SELECT", str(raised.exception))
+
+    def test_view_without_declared_budget(self):
+        with self.assertRaisesMessage(AssertionError, "не задекларовано бюджет"):
+            assert_query_budget(self.client, reverse('query_profile'))
+
+    def test_home_page_budget(self):
+        assert_query_budget(self.client, reverse('home'))
+
+
+class QueryProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        profile_store.clear()
+
+    @override_settings(QUERY_PROFILING=False)
+    def test_disabled_unless_requested(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryProfilingMiddleware(lambda request: None)
+        response = Client().get(reverse('home'))
+        self.assertNotIn('X-Query-Count', response)
+        self.assertEqual(profile_store.samples('home'), [])
+
+    @override_settings(QUERY_PROFILING=True)
+    def test_records_profile_per_view(self):
+        response = Client().get(reverse('home'))
+        [sample] = profile_store.samples('home')
+        self.assertEqual(response['X-Query-Count'], str(sample['queries']))
+        self.assertEqual((sample['path'], sample['status']), ('/', 200))
+        self.assertIsNotNone(sample['render_ms'])
+
+        staff = User.objects.create_user('staff', is_staff=True)
+        client = Client()
+        client.force_login(staff)
+        summary = client.get(reverse('query_profile')).json()
+        self.assertEqual(summary['views']['home']['requests'], 1)
+
+
+class KeysetPaginatorTests(TestCase):
+    """Пагінатор узагальнений за полем часу — перевіряємо на date_joined користувачів."""
+
+    @classmethod
+    def setUpTestData(cls):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        # Кожні три користувачі мають однаковий час: порядок між ними задає id
+        User.objects.bulk_create([
+            User(username=f'user{number:02d}', date_joined=start + timedelta(hours=number // 3))
+            for number in range(20)
+        ])
+        cls.newest_first = list(User.objects.order_by('-date_joined', '-pk'))
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(per_page=4, field='date_joined')
+
+    def page(self, **params):
+        return self.paginator.page(User.objects.all(), params)
+
+    def test_cursor_round_trip(self):
+        user = self.newest_first[0]
+        self.assertEqual(self.paginator.decode(self.paginator.encode(user)), (user.date_joined, user.pk))
+
+    def test_corrupted_cursor_is_ignored(self):
+        for cursor in ('', 'не-base64!', 'YWJj', self.paginator.encode(self.newest_first[0])[:-3]):
+            self.assertIsNone(self.paginator.decode(cursor), cursor)
+        self.assertEqual(self.page(after='YWJj').object_list, self.newest_first[:4])
+
+    def test_first_page(self):
+        with self.assertNumQueries(1):
+            page = self.page()
+        self.assertEqual(page.object_list, self.newest_first[:4])
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_walk_forward_and_back_without_gaps_or_duplicates(self):
+        pages, page = [], self.page()
+        while True:
+            pages.append(page.object_list)
+            if not page.has_next:
+                break
+            page = self.page(after=page.next_cursor)
+        self.assertEqual([user for rows in pages for user in rows], self.newest_first)
+        self.assertEqual(len(pages), 5)
+        self.assertTrue(page.has_previous)
+
+        back = [page.object_list]
+        while page.has_previous:
+            page = self.page(before=page.previous_cursor)
+            back.append(page.object_list)
+        self.assertEqual(back[::-1], pages)
+        self.assertTrue(page.has_next)
+
+    def test_cursor_inside_tie_group(self):
+        # Курсор на середньому з трьох однакових часів: далі — третій рядок групи, не вся група заново
+        cursor = self.paginator.encode(self.newest_first[1])
+        self.assertEqual(self.page(after=cursor).object_list, self.newest_first[2:6])
+        self.assertEqual(self.page(before=self.paginator.encode(self.newest_first[2])).object_list,
+                         self.newest_first[:2])
+
+    def test_last_page_has_no_next(self):
+        page = self.page(after=self.paginator.encode(self.newest_first[-5]))
+        self.assertEqual(page.object_list, self.newest_first[-4:])
+        self.assertFalse(page.has_next)
+        self.assertEqual(self.page(after=self.paginator.encode(self.newest_first[-1])).object_list, [])
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    REDIS = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                         'LOCATION': 'redis://localhost:6379/0'}}
+
+    def test_local_cache_without_debug_warns(self):
+        with override_settings(DEBUG=False, CACHES=self.LOCMEM):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['ukrbus.W001'])
+
+    def test_debug_or_shared_cache_is_fine(self):
+        with override_settings(DEBUG=True, CACHES=self.LOCMEM):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(DEBUG=False, CACHES=self.REDIS):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class SyntheticBenchSmokeTests(TestCase):
+    """seed_synthetic у мінімальному масштабі та одна ітерація bench_funnel на тій самій тестовій базі."""
+    SIZES = ['--cities=20', '--carriers=3', '--passengers=10', '--routes=8', '--bookings=150', '--transactions=60']
+
+    def seed(self, *args):
+        out = StringIO()
+        call_command('seed_synthetic', '--seed=7', '--force', *self.SIZES, *args, stdout=out)
+        return out.getvalue()
+
+    def test_seed_builds_consistent_dataset_once(self):
+        self.assertIn("Набір synthetic-7 згенеровано", self.seed())
+        carriers = User.objects.filter(username__startswith='synthetic-7-', is_carrier=True)
+        self.assertEqual(carriers.count(), 3)
+        self.assertEqual(User.objects.filter(username__startswith='synthetic-7-', is_passenger=True).count(), 10)
+        self.assertEqual(Route.objects.count(), 8)
+        self.assertEqual(Booking.objects.count(), 150)
+        self.assertEqual(Transaction.objects.count(), 60)
+        # Баланси перевізників збігаються з журналом транзакцій
+        for profile in CarrierProfile.objects.filter(user__in=carriers):
+            self.assertEqual(profile.balance, LedgerService.balance(profile.user), profile.user.username)
+
+        with self.assertRaisesMessage(CommandError, "уже згенеровано"):
+            self.seed()
+        with self.assertRaisesMessage(CommandError, "DEBUG=False"):
+            call_command('seed_synthetic', '--seed=8', *self.SIZES, stdout=StringIO())
+
+    def test_bench_funnel_single_iteration(self):
+        # Бенчмарк сам створює тестову базу; тут він працює в базі цього тесту
+        runner = mock.patch.object(bench_funnel, 'DiscoverRunner')
+        environment = [mock.patch.object(bench_funnel, name) for name in
+                       ('setup_test_environment', 'teardown_test_environment')]
+        for patcher in (runner, *environment):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        baseline = os.path.join(directory.name, 'baseline.json')
+
+        def bench(*args):
+            out = StringIO()
+            call_command('bench_funnel', '--seed=7', *self.SIZES, '--iterations=1', '--warmup=0', *args, stdout=out)
+            return out.getvalue()
+
+        output = bench('--save-baseline', baseline)
+        with open(baseline, encoding='utf-8') as f:
+            steps = json.load(f)['steps']
+        self.assertEqual(list(steps), list(bench_funnel.STEPS))
+        for step, row in steps.items():
+            self.assertEqual((row['requests'], row['errors']), (1, 0), step)
+            self.assertIn(step, output)
+
+        # Повторний прогін на вже наповненій базі порівнюється з базовим результатом
+        self.assertIn("Синтетичні дані вже є", bench('--baseline', baseline, '--min-delta=100000'))
@@ -1,10 +1,11 @@
 from django.urls import path
 
-from ukrbus.views import HomeView
+from ukrbus.views import HomeView, query_profile_view
 
 
 urlpatterns = [
 
     path('', HomeView.as_view(), name='home'),
+    path('_profiling/queries/', query_profile_view, name='query_profile'),
 
 ]
@@ -1,10 +1,12 @@
 # views.py
-from django.http import HttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views.generic import TemplateView
 from accounts.models import CarrierProfile
 from accounts.utils import send_carrier_notification
-from city.models import City
+from city.resolver import city_resolver
+from ukrbus.profiling import profile_store
 
 
 class HomeView(TemplateView):
@@ -13,6 +15,20 @@ class HomeView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # Додаємо список міст, щоб JavaScript у формі міг їх побачити
-        context['available_cities'] = City.objects.values_list('name', flat=True).distinct().order_by('name')
+        context['available_cities'] = city_resolver.choices()
         return context
 
+
+@staff_member_required
+def query_profile_view(request):
+    """
+    Профілі SQL по в'юхах (QueryProfilingMiddleware): зведення, або останні записи однієї в'юхи
+    через ?view=<ім'я>. POST очищає сховище.
+    """
+    if request.method == 'POST':
+        profile_store.clear()
+        return JsonResponse({'cleared': True})
+    view_name = request.GET.get('view')
+    if view_name:
+        return JsonResponse({'view': view_name, 'samples': profile_store.samples(view_name)})
+    return JsonResponse({'views': profile_store.summary()})